@@ -0,0 +1,46 @@
+"""Add badge award jobs
+
+Revision ID: a7d3e9c2b4f1
+Revises: f4c2a1d8b6e3
+Create Date: 2026-10-16 23:02:41.318604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e9c2b4f1'
+down_revision = 'f4c2a1d8b6e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('badge_award_jobs',
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('dry_run', sa.Boolean(), nullable=False),
+        sa.Column('target_user_id', sa.Integer(), nullable=True),
+        sa.Column('chunk_size', sa.Integer(), nullable=False),
+        sa.Column('total_users', sa.Integer(), nullable=False),
+        sa.Column('users_processed', sa.Integer(), nullable=False),
+        sa.Column('users_with_new_badges', sa.Integer(), nullable=False),
+        sa.Column('badges_awarded', sa.Integer(), nullable=False),
+        sa.Column('last_user_id', sa.Integer(), nullable=False),
+        sa.Column('user_results', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['target_user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('job_id')
+    )
+    op.create_index(op.f('ix_badge_award_jobs_job_id'), 'badge_award_jobs', ['job_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_badge_award_jobs_job_id'), table_name='badge_award_jobs')
+    op.drop_table('badge_award_jobs')
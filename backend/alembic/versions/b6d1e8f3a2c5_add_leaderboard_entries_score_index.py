@@ -0,0 +1,28 @@
+"""Add leaderboard entries score index
+
+Revision ID: b6d1e8f3a2c5
+Revises: f9a3c7e1b2d4
+Create Date: 2026-10-17 11:02:37.184902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1e8f3a2c5'
+down_revision = 'f9a3c7e1b2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Flushes re-rank the entries within a score range, and publish the top of a board
+    op.create_index(
+        'ix_leaderboard_entries_leaderboard_id_score', 'leaderboard_entries',
+        ['leaderboard_id', 'score']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_leaderboard_entries_leaderboard_id_score', table_name='leaderboard_entries')
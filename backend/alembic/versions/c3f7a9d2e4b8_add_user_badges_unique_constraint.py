@@ -0,0 +1,34 @@
+"""Add user badges unique constraint
+
+Revision ID: c3f7a9d2e4b8
+Revises: b6d1e8f3a2c5
+Create Date: 2026-10-17 12:26:51.730418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f7a9d2e4b8'
+down_revision = 'b6d1e8f3a2c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The model declared this constraint but the table never had it, so
+    # concurrent checks could award a badge twice. Keep the earliest award.
+    op.execute("""
+        DELETE FROM user_badges a
+        USING user_badges b
+        WHERE a.user_id = b.user_id
+          AND a.badge_id = b.badge_id
+          AND a.user_badge_id > b.user_badge_id
+    """)
+    # Badge awards insert with ON CONFLICT (user_id, badge_id) DO NOTHING
+    op.create_unique_constraint('user_badges_user_id_badge_id_key', 'user_badges', ['user_id', 'badge_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('user_badges_user_id_badge_id_key', 'user_badges', type_='unique')
@@ -0,0 +1,34 @@
+"""Unique leaderboard entry per user
+
+Revision ID: c5e8f1a3d9b7
+Revises: a7d3e9c2b4f1
+Create Date: 2026-10-16 23:48:12.506221
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8f1a3d9b7'
+down_revision = 'a7d3e9c2b4f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keep the newest entry of any duplicated (leaderboard, user) pair
+    op.execute("""
+        DELETE FROM leaderboard_entries a
+        USING leaderboard_entries b
+        WHERE a.leaderboard_id = b.leaderboard_id
+          AND a.user_id = b.user_id
+          AND a.entry_id < b.entry_id
+    """)
+    op.create_unique_constraint(
+        'uq_leaderboard_entries_leaderboard_user', 'leaderboard_entries', ['leaderboard_id', 'user_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_leaderboard_entries_leaderboard_user', 'leaderboard_entries', type_='unique')
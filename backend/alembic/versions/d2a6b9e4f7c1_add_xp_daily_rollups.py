@@ -0,0 +1,44 @@
+"""Add XP daily rollups
+
+Revision ID: d2a6b9e4f7c1
+Revises: c5e8f1a3d9b7
+Create Date: 2026-10-17 00:31:05.842913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6b9e4f7c1'
+down_revision = 'c5e8f1a3d9b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('xp_daily_rollups',
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total_exp', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('course_id', 'day', 'user_id')
+    )
+    op.create_index('ix_xp_daily_rollups_day', 'xp_daily_rollups', ['day'])
+    # Backfill the buckets from the XP awarded so far
+    op.execute("""
+        INSERT INTO xp_daily_rollups (course_id, day, user_id, total_exp)
+        SELECT COALESCE(course_id, 0),
+               (COALESCE(awarded_at, now()) AT TIME ZONE 'UTC')::date,
+               user_id,
+               SUM(amount)
+        FROM experience_points
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_xp_daily_rollups_day', table_name='xp_daily_rollups')
+    op.drop_table('xp_daily_rollups')
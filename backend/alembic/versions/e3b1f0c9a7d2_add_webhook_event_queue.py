@@ -0,0 +1,39 @@
+"""Add webhook event queue
+
+Revision ID: e3b1f0c9a7d2
+Revises: d9d547d697c6
+Create Date: 2026-10-16 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b1f0c9a7d2'
+down_revision = 'd9d547d697c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('webhook_events',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('event_path', sa.String(100), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_webhook_events_status_available_at', 'webhook_events', ['status', 'available_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_events_status_available_at', table_name='webhook_events')
+    op.drop_table('webhook_events')
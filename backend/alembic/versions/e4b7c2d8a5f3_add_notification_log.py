@@ -0,0 +1,35 @@
+"""Add notification log
+
+Revision ID: e4b7c2d8a5f3
+Revises: d2a6b9e4f7c1
+Create Date: 2026-10-17 01:12:37.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c2d8a5f3'
+down_revision = 'd2a6b9e4f7c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('notification_log',
+        sa.Column('event_id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('notification', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('event_id')
+    )
+    op.create_index(op.f('ix_notification_log_created_at'), 'notification_log', ['created_at'], unique=False)
+    op.create_index('ix_notification_log_user_id_event_id', 'notification_log', ['user_id', 'event_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notification_log_user_id_event_id', table_name='notification_log')
+    op.drop_index(op.f('ix_notification_log_created_at'), table_name='notification_log')
+    op.drop_table('notification_log')
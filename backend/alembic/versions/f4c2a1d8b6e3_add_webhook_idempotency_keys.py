@@ -0,0 +1,31 @@
+"""Add webhook idempotency keys
+
+Revision ID: f4c2a1d8b6e3
+Revises: e3b1f0c9a7d2
+Create Date: 2026-10-16 11:03:17.542981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c2a1d8b6e3'
+down_revision = 'e3b1f0c9a7d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('webhook_idempotency_keys',
+        sa.Column('key', sa.String(64), nullable=False),
+        sa.Column('event_path', sa.String(100), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_webhook_idempotency_keys_created_at', 'webhook_idempotency_keys', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_idempotency_keys_created_at', table_name='webhook_idempotency_keys')
+    op.drop_table('webhook_idempotency_keys')
@@ -0,0 +1,101 @@
+"""Add hot path indexes
+
+Revision ID: f9a3c7e1b2d4
+Revises: e4b7c2d8a5f3
+Create Date: 2026-10-17 03:41:09.518304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f9a3c7e1b2d4'
+down_revision = 'e4b7c2d8a5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Users are looked up by their Moodle id on every webhook and most routes.
+    # Accounts cannot be merged automatically, so refuse to continue on duplicates.
+    duplicates = op.get_bind().execute(sa.text("""
+        SELECT moodle_user_id, array_agg(id ORDER BY id)
+        FROM users
+        WHERE moodle_user_id IS NOT NULL
+        GROUP BY moodle_user_id
+        HAVING count(*) > 1
+    """)).all()
+    if duplicates:
+        raise RuntimeError(
+            "users share a moodle_user_id, resolve them before upgrading: "
+            + ", ".join(f"{moodle_id} -> users {ids}" for moodle_id, ids in duplicates)
+        )
+    op.create_index('ix_users_moodle_user_id', 'users', ['moodle_user_id'], unique=True)
+
+    # Fold duplicated (user, course) progress rows into the oldest one
+    op.execute("""
+        UPDATE student_progress keep
+        SET total_exp = merged.total_exp,
+            quests_completed = merged.quests_completed,
+            badges_earned = merged.badges_earned,
+            study_hours = merged.study_hours,
+            streak_days = merged.streak_days,
+            last_activity = merged.last_activity
+        FROM (
+            SELECT min(progress_id) AS progress_id,
+                   sum(total_exp) AS total_exp,
+                   sum(quests_completed) AS quests_completed,
+                   sum(badges_earned) AS badges_earned,
+                   sum(study_hours) AS study_hours,
+                   max(streak_days) AS streak_days,
+                   max(last_activity) AS last_activity
+            FROM student_progress
+            GROUP BY user_id, course_id
+            HAVING count(*) > 1
+        ) merged
+        WHERE keep.progress_id = merged.progress_id
+    """)
+    op.execute("""
+        DELETE FROM student_progress a
+        USING student_progress b
+        WHERE a.user_id = b.user_id
+          AND a.course_id = b.course_id
+          AND a.progress_id > b.progress_id
+    """)
+    op.create_index('ix_student_progress_user_id_course_id', 'student_progress', ['user_id', 'course_id'], unique=True)
+
+    # Duplicate XP checks; not unique, lesson views may be awarded again after an hour
+    op.create_index(
+        'ix_experience_points_user_course_source', 'experience_points',
+        ['user_id', 'course_id', 'source_type', 'source_id']
+    )
+    # Quest analytics and completion lookups
+    op.create_index(
+        'ix_quest_progress_quest_id_status_completed_at', 'quest_progress',
+        ['quest_id', 'status', 'completed_at']
+    )
+    # Latest event of a type for a quest progress
+    op.create_index(
+        'ix_quest_engagement_events_progress_type_id', 'quest_engagement_events',
+        ['quest_progress_id', 'event_type', 'id']
+    )
+    # Date range analytics, and a user's recent activity
+    op.create_index('ix_activity_logs_timestamp_user_id', 'activity_logs', ['timestamp', 'user_id'])
+    op.create_index('ix_activity_logs_user_id_timestamp', 'activity_logs', ['user_id', 'timestamp'])
+    # Webhook quest resolution by (course, activity)
+    op.create_index(
+        'ix_quests_course_id_moodle_activity_id_is_active', 'quests',
+        ['course_id', 'moodle_activity_id', 'is_active']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_quests_course_id_moodle_activity_id_is_active', table_name='quests')
+    op.drop_index('ix_activity_logs_user_id_timestamp', table_name='activity_logs')
+    op.drop_index('ix_activity_logs_timestamp_user_id', table_name='activity_logs')
+    op.drop_index('ix_quest_engagement_events_progress_type_id', table_name='quest_engagement_events')
+    op.drop_index('ix_quest_progress_quest_id_status_completed_at', table_name='quest_progress')
+    op.drop_index('ix_experience_points_user_course_source', table_name='experience_points')
+    op.drop_index('ix_student_progress_user_id_course_id', table_name='student_progress')
+    op.drop_index('ix_users_moodle_user_id', table_name='users')
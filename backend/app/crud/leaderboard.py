@@ -8,10 +8,13 @@ from app.models.leaderboard import (
     Leaderboard, 
     LeaderboardEntry, 
     StudentProgress, 
-    ExperiencePoint
+    ExperiencePoint,
+    XPDailyRollup
 )
 from app.models.user import User
 from app.models.course import Course
+from app.services.leaderboard_ranking import leaderboard_ranking
+from app.services.xp_rollup import leaderboard_snapshots, timeframe_start_day
 from app.schemas.leaderboard import (
     LeaderboardCreate, 
     LeaderboardUpdate,
@@ -65,6 +68,8 @@ def update_leaderboard(db: Session, leaderboard_id: int, leaderboard_update: Lea
     db_leaderboard.last_updated = datetime.utcnow()
     db.commit()
     db.refresh(db_leaderboard)
+    # Scope or metric may have changed; the board is reloaded on next use
+    leaderboard_ranking.forget(leaderboard_id)
     return db_leaderboard
 
 def delete_leaderboard(db: Session, leaderboard_id: int) -> bool:
@@ -75,6 +80,7 @@ def delete_leaderboard(db: Session, leaderboard_id: int) -> bool:
     
     db.delete(db_leaderboard)
     db.commit()
+    leaderboard_ranking.forget(leaderboard_id)
     return True
 
 # Student Progress CRUD operations
@@ -168,34 +174,21 @@ def update_student_total_exp(db: Session, user_id: int, course_id: int):
 
 # Leaderboard calculation and ranking functions
 def calculate_leaderboard_rankings(db: Session, leaderboard_id: int) -> List[LeaderboardEntry]:
-    """Calculate and update leaderboard rankings based on the metric type"""
-    leaderboard = get_leaderboard(db, leaderboard_id)
+    """Recalculate a leaderboard's scores and persist its rankings.
+
+    The ranking engine keeps the board up to date between refreshes; this
+    reloads it from the source tables and reconciles the stored entries.
+    """
+    leaderboard = db.query(Leaderboard).filter(Leaderboard.leaderboard_id == leaderboard_id).first()
     if not leaderboard:
         return []
     
-    # Clear existing entries
-    db.query(LeaderboardEntry).filter(LeaderboardEntry.leaderboard_id == leaderboard_id).delete()
-    
-    # Calculate scores based on metric type and timeframe
-    scores = calculate_scores_for_leaderboard(db, leaderboard)
-    
-    # Create new entries with rankings
-    entries = []
-    for rank, (user_id, score) in enumerate(scores, 1):
-        entry = LeaderboardEntry(
-            leaderboard_id=leaderboard_id,
-            user_id=user_id,
-            score=Decimal(str(score)),
-            rank=rank
-        )
-        db.add(entry)
-        entries.append(entry)
-    
-    # Update leaderboard last_updated
-    leaderboard.last_updated = datetime.utcnow()
+    leaderboard_ranking.load(db, leaderboard)
+    leaderboard_ranking.flush(db, [leaderboard_id])
     
-    db.commit()
-    return entries
+    return db.query(LeaderboardEntry).filter(
+        LeaderboardEntry.leaderboard_id == leaderboard_id
+    ).order_by(LeaderboardEntry.rank).all()
 
 def calculate_scores_for_leaderboard(db: Session, leaderboard: Leaderboard) -> List[tuple]:
     """Calculate scores for users based on leaderboard configuration"""
@@ -294,227 +287,115 @@ def calculate_engagement_scores(db: Session, course_id: Optional[int]) -> List[t
     return [(user_id, engagement_score) for user_id, engagement_score in results if engagement_score]
 
 # Top students functions
-    """Get top students for a specific course across all metrics"""
-    # Get top students by experience points
-    exp_query = db.query(
-        StudentProgress.user_id,
-        StudentProgress.total_exp,
-        StudentProgress.quests_completed,
-        StudentProgress.badges_earned,
-        User.username,
-        User.first_name,
-        User.last_name,
-        User.profile_image_url
-    ).join(User, StudentProgress.user_id == User.id).filter(
-        StudentProgress.course_id == course_id
-    ).order_by(desc(StudentProgress.total_exp)).limit(limit)
-    
-    results = exp_query.all()
-    
-    top_students = []
-    for i, (user_id, total_exp, quests_completed, badges_earned, username, first_name, last_name, profile_image_url) in enumerate(results, 1):
-        top_students.append({
-            "user_id": user_id,
-            "username": username,
-            "first_name": first_name,
-            "last_name": last_name,
-            "profile_image_url": profile_image_url,
-            "score": Decimal(str(total_exp)) if total_exp else Decimal('0'),
-            "rank": i,
-            "total_exp": total_exp,
-            "quests_completed": quests_completed,
-            "badges_earned": badges_earned
-        })
-    
-    return top_students
-
 def get_top_students_by_course(db: Session, course_id: int, limit: int = 10, timeframe: str = "all_time") -> List[Dict[str, Any]]:
-    """Get top students for a specific course across all metrics, filtered by time frame"""
-    from datetime import datetime, timedelta
-    # Calculate date filter
-    now = datetime.utcnow()
-    if timeframe == "daily":
-        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif timeframe == "weekly":
-        start_date = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-    elif timeframe == "monthly":
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    """Get top students for a specific course by XP earned in the time frame"""
+    return _get_top_students_snapshot(db, course_id, limit, timeframe)
+
+def get_global_top_students(db: Session, limit: int = 20, timeframe: str = "all_time") -> List[Dict[str, Any]]:
+    """Get global top students across all courses by XP earned in the time frame"""
+    return _get_top_students_snapshot(db, None, limit, timeframe)
+
+def _get_top_students_snapshot(db: Session, course_id: Optional[int], limit: int, timeframe: str) -> List[Dict[str, Any]]:
+    key = (course_id, timeframe, limit)
+    top_students = leaderboard_snapshots.get(key)
+    if top_students is None:
+        generation = leaderboard_snapshots.generation
+        ranking = rank_students_by_exp(db, course_id, limit, timeframe)
+        top_students = build_top_students(db, ranking, course_id)
+        leaderboard_snapshots.set(key, top_students, generation)
+    # Callers get their own copies of the cached rows
+    return [dict(student) for student in top_students]
+
+def rank_students_by_exp(db: Session, course_id: Optional[int], limit: int, timeframe: str) -> List[tuple]:
+    """(user_id, exp) of the top students; timeframes sum the daily XP rollups"""
+    start_day = timeframe_start_day(timeframe)
+    if start_day is None:
+        # All-time XP is already totalled per course in StudentProgress
+        query = db.query(
+            StudentProgress.user_id,
+            func.sum(StudentProgress.total_exp).label('total_exp')
+        )
+        if course_id is not None:
+            query = query.filter(StudentProgress.course_id == course_id)
+        user_id_column = StudentProgress.user_id
     else:
-        start_date = None
-    # Get actual badge count from UserBadge table
+        query = db.query(
+            XPDailyRollup.user_id,
+            func.sum(XPDailyRollup.total_exp).label('total_exp')
+        ).filter(XPDailyRollup.day >= start_day)
+        if course_id is not None:
+            query = query.filter(XPDailyRollup.course_id == course_id)
+        user_id_column = XPDailyRollup.user_id
+    
+    results = query.group_by(user_id_column).order_by(desc('total_exp'), user_id_column).limit(limit).all()
+    return [(user_id, int(total_exp or 0)) for user_id, total_exp in results]
+
+def build_top_students(db: Session, ranking: List[tuple], course_id: Optional[int]) -> List[Dict[str, Any]]:
+    """Add user details, quest and badge counts to a ranking, with one query each"""
     from app.models.badge import UserBadge
     
-    exp_query = db.query(
-        StudentProgress.user_id,
-        StudentProgress.total_exp,
-        StudentProgress.quests_completed,
-        func.coalesce(func.count(UserBadge.user_badge_id), 0).label('badges_earned'),
-        StudentProgress.last_activity,
-        User.username,
-        User.first_name,
-        User.last_name,
-        User.profile_image_url
-    ).join(User, StudentProgress.user_id == User.id).outerjoin(
-        UserBadge, and_(
-            UserBadge.user_id == StudentProgress.user_id,
-            or_(
-                UserBadge.course_id == course_id,
-                UserBadge.course_id.is_(None)
-            )
-        )
-    ).filter(
-        StudentProgress.course_id == course_id
-    ).group_by(
-        StudentProgress.user_id,
-        StudentProgress.total_exp,
-        StudentProgress.quests_completed,
-        StudentProgress.last_activity,
-        User.username,
-        User.first_name,
-        User.last_name,
-        User.profile_image_url
-    )
-    if start_date:
-        exp_query = exp_query.filter(StudentProgress.last_activity >= start_date)
-    exp_query = exp_query.order_by(desc(StudentProgress.total_exp)).limit(limit)
-    results = exp_query.all()
-    top_students = []
-    for i, (user_id, total_exp, quests_completed, badges_earned, last_activity, username, first_name, last_name, profile_image_url) in enumerate(results, 1):
-        # Calculate time since last activity
-        last_active_text = "Unknown"
-        if last_activity:
-            now = datetime.utcnow()
-            time_diff = now - last_activity.replace(tzinfo=None)
-            if time_diff.days > 0:
-                last_active_text = f"{time_diff.days} days ago"
-            elif time_diff.seconds > 3600:
-                hours = time_diff.seconds // 3600
-                last_active_text = f"{hours} hours ago"
-            elif time_diff.seconds > 60:
-                minutes = time_diff.seconds // 60
-                last_active_text = f"{minutes} minutes ago"
-            else:
-                last_active_text = "Just now"
-        
-        top_students.append({
-            "user_id": user_id,
-            "username": username,
-            "first_name": first_name,
-            "last_name": last_name,
-            "profile_image_url": profile_image_url,
-            "score": Decimal(str(total_exp)) if total_exp else Decimal('0'),
-            "rank": i,
-            "total_exp": total_exp,
-            "quests_completed": quests_completed,
-            "badges_earned": badges_earned,
-            "current_ranking": i,
-            "last_active": last_active_text
-        })
-    return top_students
-    """Get global top students across all courses"""
-    query = db.query(
-        StudentProgress.user_id,
-        func.sum(StudentProgress.total_exp).label('total_exp'),
-        func.sum(StudentProgress.quests_completed).label('total_quests'),
-        func.sum(StudentProgress.badges_earned).label('total_badges'),
-        User.username,
-        User.first_name,
-        User.last_name,
-        User.profile_image_url
-    ).join(User, StudentProgress.user_id == User.id).group_by(
-        StudentProgress.user_id,
-        User.username,
-        User.first_name,
-        User.last_name,
-        User.profile_image_url
-    ).order_by(desc('total_exp')).limit(limit)
-    
-    results = query.all()
-    
-    top_students = []
-    for i, (user_id, total_exp, total_quests, total_badges, username, first_name, last_name, profile_image_url) in enumerate(results, 1):
-        top_students.append({
-            "user_id": user_id,
-            "username": username,
-            "first_name": first_name,
-            "last_name": last_name,
-            "profile_image_url": profile_image_url,
-            "score": Decimal(str(total_exp)) if total_exp else Decimal('0'),
-            "rank": i,
-            "total_exp": total_exp,
-            "quests_completed": total_quests,
-            "badges_earned": total_badges
-        })
+    user_ids = [user_id for user_id, _ in ranking]
+    if not user_ids:
+        return []
     
-    return top_students 
-def get_global_top_students(db: Session, limit: int = 20, timeframe: str = "all_time") -> List[Dict[str, Any]]:
-    """Get global top students across all courses, filtered by time frame"""
-    from datetime import datetime, timedelta
-    now = datetime.utcnow()
-    if timeframe == "daily":
-        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif timeframe == "weekly":
-        start_date = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-    elif timeframe == "monthly":
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    else:
-        start_date = None
-    # Get actual badge count from UserBadge table
-    from app.models.badge import UserBadge
+    users = {
+        row.id: row for row in db.query(
+            User.id, User.username, User.first_name, User.last_name, User.profile_image_url
+        ).filter(User.id.in_(user_ids)).all()
+    }
     
-    query = db.query(
-        StudentProgress.user_id,
-        func.sum(StudentProgress.total_exp).label('total_exp'),
-        func.sum(StudentProgress.quests_completed).label('total_quests'),
-        func.coalesce(func.count(UserBadge.user_badge_id), 0).label('total_badges'),
-        func.max(StudentProgress.last_activity).label('last_activity'),
-        User.username,
-        User.first_name,
-        User.last_name,
-        User.profile_image_url
-    ).join(User, StudentProgress.user_id == User.id).outerjoin(
-        UserBadge, UserBadge.user_id == StudentProgress.user_id
-    )
-    if start_date:
-        query = query.filter(StudentProgress.last_activity >= start_date)
-    query = query.group_by(
+    progress_query = db.query(
         StudentProgress.user_id,
-        User.username,
-        User.first_name,
-        User.last_name,
-        User.profile_image_url
-    ).order_by(desc('total_exp')).limit(limit)
-    results = query.all()
+        func.sum(StudentProgress.quests_completed),
+        func.max(StudentProgress.last_activity)
+    ).filter(StudentProgress.user_id.in_(user_ids))
+    if course_id is not None:
+        progress_query = progress_query.filter(StudentProgress.course_id == course_id)
+    progress = {
+        user_id: (quests_completed, last_activity)
+        for user_id, quests_completed, last_activity in progress_query.group_by(StudentProgress.user_id).all()
+    }
+    
+    badge_query = db.query(
+        UserBadge.user_id,
+        func.count(UserBadge.user_badge_id)
+    ).filter(UserBadge.user_id.in_(user_ids))
+    if course_id is not None:
+        badge_query = badge_query.filter(or_(UserBadge.course_id == course_id, UserBadge.course_id.is_(None)))
+    badges = dict(badge_query.group_by(UserBadge.user_id).all())
+    
     top_students = []
-    for i, (user_id, total_exp, total_quests, total_badges, last_activity, username, first_name, last_name, profile_image_url) in enumerate(results, 1):
-        # Calculate time since last activity
-        last_active_text = "Unknown"
-        if last_activity:
-            now = datetime.utcnow()
-            time_diff = now - last_activity.replace(tzinfo=None)
-            if time_diff.days > 0:
-                last_active_text = f"{time_diff.days} days ago"
-            elif time_diff.seconds > 3600:
-                hours = time_diff.seconds // 3600
-                last_active_text = f"{hours} hours ago"
-            elif time_diff.seconds > 60:
-                minutes = time_diff.seconds // 60
-                last_active_text = f"{minutes} minutes ago"
-            else:
-                last_active_text = "Just now"
-        
+    for user_id, total_exp in ranking:
+        user = users.get(user_id)
+        if not user:
+            continue
+        quests_completed, last_activity = progress.get(user_id, (0, None))
+        rank = len(top_students) + 1
         top_students.append({
             "user_id": user_id,
-            "username": username,
-            "first_name": first_name,
-            "last_name": last_name,
-            "profile_image_url": profile_image_url,
-            "score": Decimal(str(total_exp)) if total_exp else Decimal('0'),
-            "rank": i,
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "profile_image_url": user.profile_image_url,
+            "score": Decimal(str(total_exp)),
+            "rank": rank,
             "total_exp": total_exp,
-            "quests_completed": total_quests,
-            "badges_earned": total_badges,
-            "current_ranking": i,
-            "last_active": last_active_text
+            "quests_completed": int(quests_completed or 0),
+            "badges_earned": badges.get(user_id, 0),
+            "current_ranking": rank,
+            "last_active": format_last_active(last_activity)
         })
-    return top_students
\ No newline at end of file
+    return top_students
+
+def format_last_active(last_activity: Optional[datetime]) -> str:
+    """Time since last activity, such as 3 days ago"""
+    if not last_activity:
+        return "Unknown"
+    time_diff = datetime.utcnow() - last_activity.replace(tzinfo=None)
+    if time_diff.days > 0:
+        return f"{time_diff.days} days ago"
+    elif time_diff.seconds > 3600:
+        return f"{time_diff.seconds // 3600} hours ago"
+    elif time_diff.seconds > 60:
+        return f"{time_diff.seconds // 60} minutes ago"
+    return "Just now"
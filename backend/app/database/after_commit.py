@@ -0,0 +1,61 @@
+"""
+Callbacks that must only run once a session's work is durably committed.
+
+Webhook events and batches run in a unit of work: the session joins an outer
+connection transaction, so the commits handlers issue only release
+savepoints. Such sessions are held with ``hold``; callbacks registered on
+them wait until ``release`` is called after the outer transaction commits,
+and are dropped by ``discard`` if it rolls back. On any other session the
+callback runs immediately, so it must be registered after the commit.
+"""
+
+import logging
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+HELD_KEY = "after_commit_callbacks"
+
+
+def hold(db: Session):
+    """Defer callbacks registered on this session until ``release``."""
+    db.info.setdefault(HELD_KEY, [])
+
+
+def is_held(db: Session) -> bool:
+    return HELD_KEY in db.info
+
+
+def call_after_commit(db: Session, callback: Callable[[], None]):
+    """Run the callback once the session's work is committed."""
+    if is_held(db):
+        db.info[HELD_KEY].append(callback)
+    else:
+        callback()
+
+
+def release(db: Session):
+    """Run the held callbacks, once the outer transaction has committed."""
+    for callback in db.info.pop(HELD_KEY, ()):
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"After-commit callback {callback} failed: {e}")
+
+
+def mark(db: Session) -> int:
+    """Position to pass to ``discard_since`` when a savepoint is rolled back."""
+    return len(db.info.get(HELD_KEY, ()))
+
+
+def discard_since(db: Session, position: int):
+    """Drop the callbacks registered after ``mark`` returned ``position``."""
+    if is_held(db):
+        del db.info[HELD_KEY][position:]
+
+
+def discard(db: Session):
+    """Drop the held callbacks of a session whose transaction was rolled back."""
+    db.info.pop(HELD_KEY, None)
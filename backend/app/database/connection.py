@@ -1,21 +1,75 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from app.database.pool_metrics import pool_metrics
+from app.database.psycopg_dialect import async_url
+from app.database.read_replica import read_replica
+from app.database.slow_query_log import slow_query_log
+
 # Load environment variables
 load_dotenv()
 
 # Get database URL from the environment variable
 DATABASE_URL = os.getenv("DATABASE_CONNECTION_STRING")
+# Optional read replica for heavy read-only routes
+READ_DATABASE_URL = os.getenv("DATABASE_READ_CONNECTION_STRING")
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Create SQLAlchemy engine, with the pool sized by DB_POOL_SIZE and friends
+engine = create_engine(DATABASE_URL, **pool_metrics.pool_options("primary"))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine on the same database, through psycopg 3, which reads the same
+# libpq URL options as psycopg2 and, with this dialect, leaves parameters
+# untyped as psycopg2 does. It shares the primary's pool budget with engine.
+async_engine = create_async_engine(
+    async_url(DATABASE_URL), **pool_metrics.pool_options("primary_async", asynchronous=True)
+)
+
+# Engines on the read replica, configured like the primary's. Pooled connections
+# are pinged on checkout, so a replica that went away fails the session's first
+# connect (and falls back to the primary) instead of the route's first query.
+read_engine = None
+async_read_engine = None
+if READ_DATABASE_URL:
+    read_engine = create_engine(READ_DATABASE_URL, **pool_metrics.pool_options("replica", pre_ping=True))
+    async_read_engine = create_async_engine(
+        async_url(READ_DATABASE_URL),
+        **pool_metrics.pool_options("replica_async", asynchronous=True, pre_ping=True)
+    )
+    read_replica.attach(async_read_engine)
+
+# Record statements slower than SLOW_QUERY_THRESHOLD_MS, and pool checkout
+# times, on every engine
+slow_query_log.attach(engine)
+slow_query_log.attach(async_engine.sync_engine)
+pool_metrics.register("primary", engine)
+pool_metrics.register("primary_async", async_engine.sync_engine)
+if READ_DATABASE_URL:
+    slow_query_log.attach(read_engine)
+    slow_query_log.attach(async_read_engine.sync_engine)
+    pool_metrics.register("replica", read_engine)
+    pool_metrics.register("replica_async", async_read_engine.sync_engine)
+
+# Async sessions wrap sessions of SessionLocal's class, so the session event
+# listeners registered on SessionLocal (XP capture) apply to them too
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+    sync_session_class=SessionLocal.class_
+)
+
+# Replica sessions; routes only read through them, so no session listeners are needed
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 # Create base class for models
 Base = declarative_base()
 
@@ -25,4 +79,46 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async DB session, for async routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency to get a read-only DB session: on the read replica while it is
+# reachable and within READ_REPLICA_MAX_LAG_SECONDS, otherwise on the primary
+def get_read_db():
+    db = None
+    if read_replica.usable():
+        db = ReadSessionLocal()
+        try:
+            db.connection()
+        except OperationalError as e:
+            db.close()
+            db = None
+            read_replica.mark_unreachable(e)
+    read_replica.record_session(db is not None)
+    if db is None:
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Async counterpart of get_read_db, for async routes
+async def get_async_read_db():
+    db = None
+    if read_replica.usable():
+        db = AsyncReadSessionLocal()
+        try:
+            await db.connection()
+        except OperationalError as e:
+            await db.close()
+            db = None
+            read_replica.mark_unreachable(e)
+    read_replica.record_session(db is not None)
+    if db is None:
+        db = AsyncSessionLocal()
+    async with db:
+        yield db
@@ -0,0 +1,195 @@
+"""
+Connection pool settings and checkout metrics.
+
+Every engine in ``app.database.connection`` is created with
+``pool_metrics.pool_options(name)``. Each database is reached through a sync
+and an async engine, which share one budget of ``DB_POOL_SIZE`` connections
+plus up to ``DB_MAX_OVERFLOW`` more under load: the async engine gets
+``DB_ASYNC_POOL_SHARE`` of each and the sync engine the rest. Checkouts wait
+at most ``DB_POOL_TIMEOUT`` seconds for a free connection, connections older
+than ``DB_POOL_RECYCLE`` seconds are recycled and, when ``DB_POOL_PRE_PING``
+is on, pinged on checkout.
+
+The pools time every checkout (waiting for a free connection, or opening a
+new one) into a per-engine histogram and count checkouts that timed out.
+``/health/ready`` reports them with each pool's saturation, so worker count
+can be sized against Postgres ``max_connections``: each worker holds up to
+``DB_POOL_SIZE + DB_MAX_OVERFLOW`` connections per database.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Connections older than this are replaced on checkout; -1 keeps them forever
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Fraction of each database's pool budget given to its async engine
+DB_ASYNC_POOL_SHARE = float(os.getenv("DB_ASYNC_POOL_SHARE", 0.5))
+
+# Upper bounds of the checkout histogram buckets, in milliseconds
+CHECKOUT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Cumulative histogram of durations in milliseconds."""
+
+    def __init__(self, buckets_ms=CHECKOUT_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        # One count per bucket plus the overflow bucket
+        self.counts: List[int] = [0] * (len(buckets_ms) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        index = next((i for i, bound in enumerate(self.buckets_ms) if ms <= bound), len(self.buckets_ms))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of observations"""
+        if not self.count:
+            return 0.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return float(self.buckets_ms[index]) if index < len(self.buckets_ms) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative, buckets = 0, {}
+        for bound, count in zip([*map(str, self.buckets_ms), "+Inf"], self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum_ms / self.count, 2) if self.count else 0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 1),
+            "buckets": buckets,
+        }
+
+
+def share(budget: int, asynchronous: bool) -> int:
+    """An engine's part of a per-database connection budget; -1 (no limit) is kept"""
+    if budget < 0:
+        return budget
+    async_part = round(budget * DB_ASYNC_POOL_SHARE)
+    return async_part if asynchronous else budget - async_part
+
+
+class PoolMetrics:
+    """Checkout times and saturation of the engines' connection pools."""
+
+    def __init__(self):
+        self.engines: Dict[str, Engine] = {}
+        self.checkouts: Dict[str, Histogram] = {}
+        self.timeouts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def pool_options(self, name: str, asynchronous: bool = False, pre_ping: bool = DB_POOL_PRE_PING) -> Dict[str, Any]:
+        """create_engine / create_async_engine arguments for a timed pool reported as name"""
+        return {
+            "poolclass": TimedAsyncQueuePool if asynchronous else TimedQueuePool,
+            "pool_size": max(share(DB_POOL_SIZE, asynchronous), 1),
+            "max_overflow": share(DB_MAX_OVERFLOW, asynchronous),
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": pre_ping,
+            # Kept by the pool across engine.dispose(), unlike attributes set on it
+            "pool_logging_name": name,
+        }
+
+    def register(self, name: str, engine: Engine):
+        """Report the pool of an engine; for an AsyncEngine pass its sync_engine."""
+        self.engines[name] = engine
+        with self._lock:
+            self.checkouts.setdefault(name, Histogram())
+            self.timeouts.setdefault(name, 0)
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self.checkouts.setdefault(name, Histogram()).observe(seconds * 1000)
+
+    def record_timeout(self, name: str, waited: float):
+        with self._lock:
+            self.timeouts[name] = self.timeouts.get(name, 0) + 1
+        logger.warning(f"⚠️  Connection pool {name} exhausted, no connection after {waited:.1f}s")
+
+    def pool_status(self, name: str) -> Dict[str, Any]:
+        pool = self.engines[name].pool
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        with self._lock:
+            checkouts = self.checkouts[name].to_dict()
+            timeouts = self.timeouts[name]
+        return {
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "capacity": capacity,
+            "checked_out": checked_out,
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(checked_out / capacity, 2) if capacity else 0,
+            "timeouts": timeouts,
+            "checkout": checkouts,
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.pool_status(name) for name in self.engines}
+
+    def connections_per_worker(self) -> int:
+        """Most connections one worker process can hold across all its pools"""
+        return sum(
+            engine.pool.size() + max(engine.pool._max_overflow, 0)
+            for engine in self.engines.values()
+        )
+
+    def reset(self):
+        with self._lock:
+            for name in self.checkouts:
+                self.checkouts[name] = Histogram()
+                self.timeouts[name] = 0
+
+
+class _TimedCheckout:
+    """Times QueuePool._do_get: the wait for a free connection, or opening a new one."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_timeout(self.logging_name, time.perf_counter() - started)
+            raise
+        pool_metrics.observe(self.logging_name, time.perf_counter() - started)
+        return connection
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+# Global instance
+pool_metrics = PoolMetrics()
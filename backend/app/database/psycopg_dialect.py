@@ -0,0 +1,35 @@
+"""
+Async psycopg 3 dialect for the engines in ``app.database.connection``.
+
+Like psycopg2, it sends string parameters untyped, so Postgres casts them
+from context and queries written for the sync engine (e.g. a Moodle ID
+arriving as "5" compared to an integer column) behave the same. SQLAlchemy's
+psycopg dialect would otherwise render a cast on every parameter.
+
+It is registered as ``postgresql+psycopg_untyped``; ``async_url`` turns a
+sync engine's libpq URL into one for it.
+"""
+
+from sqlalchemy.dialects import registry
+from sqlalchemy.dialects.postgresql.psycopg import PGDialectAsync_psycopg
+from sqlalchemy.engine import BindTyping, URL, make_url
+
+DRIVERNAME = "postgresql+psycopg_untyped"
+
+
+class UntypedPsycopgDialect(PGDialectAsync_psycopg):
+    """psycopg 3 async dialect without bind casts."""
+
+    bind_typing = BindTyping.NONE
+
+    @classmethod
+    def get_async_dialect_cls(cls, url):
+        return cls
+
+
+registry.register("postgresql.psycopg_untyped", __name__, "UntypedPsycopgDialect")
+
+
+def async_url(url: str) -> URL:
+    """The URL of an async engine on the database a sync engine's URL points to"""
+    return make_url(url).set(drivername=DRIVERNAME)
@@ -0,0 +1,158 @@
+"""
+Read-replica routing for heavy read-only routes.
+
+With ``DATABASE_READ_CONNECTION_STRING`` set, ``app.database.connection``
+creates a second pair of engines on it, and the ``get_read_db`` /
+``get_async_read_db`` dependencies hand out sessions on the replica to the
+routes that opt in (analytics, quest analytics, top-student leaderboards,
+professor dashboards). A background check measures the replica's lag every
+``READ_REPLICA_CHECK_INTERVAL_SECONDS``; sessions fall back to the primary
+while the replica is:
+
+- lagging more than ``READ_REPLICA_MAX_LAG_SECONDS`` behind the primary
+- unreachable, by the check or by a session's first connect
+- unchecked, because the check has not run recently (or, outside the app,
+  at all), so scripts always read from the primary
+
+Without a replica configured every read session is a primary session.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Staleness tolerated for replica reads, and how often the lag is checked
+READ_REPLICA_MAX_LAG_SECONDS = float(os.getenv("READ_REPLICA_MAX_LAG_SECONDS", 10))
+READ_REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("READ_REPLICA_CHECK_INTERVAL_SECONDS", 2))
+
+# Seconds of WAL replayed behind the primary. A replica that has replayed all
+# WAL it received is current even if the primary has been idle for a while;
+# a database not in recovery (e.g. a local second Postgres) counts as current.
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReadReplica:
+    """Tracks whether the read replica is reachable and fresh enough to read from."""
+
+    def __init__(
+        self,
+        max_lag_seconds: float = READ_REPLICA_MAX_LAG_SECONDS,
+        check_interval: float = READ_REPLICA_CHECK_INTERVAL_SECONDS
+    ):
+        self.max_lag = max_lag_seconds
+        self.check_interval = check_interval
+        self.engine: Optional[AsyncEngine] = None
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._was_usable: Optional[bool] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"replica_sessions": 0, "primary_fallbacks": 0, "checks": 0, "check_errors": 0, "connect_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.engine is not None
+
+    def attach(self, engine: AsyncEngine):
+        """Check the lag of the replica behind this engine."""
+        self.engine = engine
+
+    def start(self):
+        if not self.enabled or self._task:
+            return
+        self._task = asyncio.create_task(self._check_loop())
+        logger.info(f"📖 Read replica routing started (max lag {self.max_lag}s)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def usable(self) -> bool:
+        """Whether read sessions may go to the replica right now"""
+        if self.lag is None or self.checked_at is None:
+            return False
+        # A check that stopped reporting (hung connection, stopped loop) is not trusted
+        if time.monotonic() - self.checked_at > self.check_interval * 3:
+            return False
+        return self.lag <= self.max_lag
+
+    def record_session(self, on_replica: bool):
+        if not self.enabled:
+            return
+        self.stats["replica_sessions" if on_replica else "primary_fallbacks"] += 1
+
+    def mark_unreachable(self, error: Exception):
+        """A session could not connect; read from the primary until the next successful check."""
+        self.stats["connect_errors"] += 1
+        self._unreachable(error)
+
+    async def _check_loop(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    async def check(self):
+        self.stats["checks"] += 1
+        try:
+            lag = await asyncio.wait_for(self._lag(), timeout=max(self.check_interval, 1))
+        except Exception as e:
+            self.stats["check_errors"] += 1
+            self._unreachable(e)
+            return
+        self.lag = float(lag)
+        self.checked_at = time.monotonic()
+        self.last_error = None
+        self._log_transition()
+
+    async def _lag(self) -> float:
+        async with self.engine.connect() as conn:
+            return await conn.scalar(REPLICA_LAG_QUERY)
+
+    def _unreachable(self, error: Exception):
+        self.lag = None
+        self.last_error = str(error)
+        self._log_transition()
+
+    def _log_transition(self):
+        usable = self.usable()
+        if usable == self._was_usable:
+            return
+        self._was_usable = usable
+        if usable:
+            logger.info(f"✅ Read replica in use (lag {self.lag:.1f}s)")
+        elif self.lag is not None:
+            logger.warning(f"⚠️  Read replica {self.lag:.1f}s behind, reading from the primary")
+        else:
+            logger.warning(f"⚠️  Read replica unreachable, reading from the primary: {self.last_error}")
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "usable": self.usable(),
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+            "last_error": self.last_error,
+        }
+
+
+# Global instance
+read_replica = ReadReplica()
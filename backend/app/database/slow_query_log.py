@@ -0,0 +1,231 @@
+"""
+Slow-query log with sampled EXPLAIN capture.
+
+Attached to both engines in ``app.database.connection``. Every statement
+slower than ``SLOW_QUERY_THRESHOLD_MS`` is recorded with its text,
+duration and the route of the request that ran it (set by
+``SlowQueryMiddleware``) in a bounded in-memory store, served to admins at
+``/api/debug/slow-queries``, and optionally appended to the JSONL file
+``SLOW_QUERY_LOG_FILE``. Parameters are only recorded with
+``SLOW_QUERY_LOG_PARAMETERS=true``.
+
+A ``SLOW_QUERY_EXPLAIN_SAMPLE_RATE`` share of slow SELECTs is re-run
+under ``EXPLAIN (ANALYZE, BUFFERS)`` to capture the actual plan, at most
+once per statement shape every ``SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS``.
+EXPLAIN and file writes happen on a background thread with a connection of
+their own, in a read-only transaction that is rolled back, so the request
+that ran the query is not slowed down further.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.services.loop_monitor import route_name
+from app.services.query_profiler import statement_shape
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "true").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 500))
+# Slow queries kept in memory, and the optional JSONL file they are also written to
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", 200))
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE")
+# Parameters may hold personal data or secrets; only log them when debugging locally
+SLOW_QUERY_LOG_PARAMETERS = os.getenv("SLOW_QUERY_LOG_PARAMETERS", "false").lower() == "true"
+# Share of slow SELECTs explained, and how often one statement shape may be explained
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0))
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", 300))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 10000))
+
+STATEMENT_MAX_LENGTH = 5000
+PARAMETERS_MAX_LENGTH = 1000
+
+_request_scope: ContextVar[Optional[dict]] = ContextVar("slow_query_request_scope", default=None)
+
+
+class SlowQueryLog:
+    """Records slow statements and explains a sample of them."""
+
+    def __init__(
+        self,
+        enabled: bool = SLOW_QUERY_LOG_ENABLED,
+        threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+        explain_sample_rate: float = SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        path: Optional[str] = SLOW_QUERY_LOG_FILE
+    ):
+        self.enabled = enabled
+        self.threshold = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self.path = path
+        self.records: deque = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        # Engine EXPLAIN statements run on; the first engine attached
+        self.explain_engine: Optional[Engine] = None
+        # Statement shape -> when it was last explained
+        self._explained: Dict[str, float] = {}
+        self._jobs: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=1000)
+        self._worker: Optional[threading.Thread] = None
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.stats = {"recorded": 0, "explained": 0, "explain_errors": 0, "written": 0, "write_errors": 0, "dropped": 0}
+
+    def attach(self, engine: Engine):
+        """Time the statements of an engine; for an AsyncEngine pass its sync_engine."""
+        if not self.enabled:
+            return
+        if self.explain_engine is None:
+            self.explain_engine = engine
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "slow_query_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        if duration >= self.threshold:
+            self.record(statement, parameters, duration, executemany, conn.dialect.driver)
+
+    def record(self, statement: str, parameters: Any, duration: float, executemany: bool = False, driver: str = ""):
+        scope = _request_scope.get()
+        with self._lock:
+            record_id, self._next_id = self._next_id, self._next_id + 1
+        record = {
+            "id": record_id,
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration * 1000, 1),
+            "route": route_name(None, scope) if scope is not None else None,
+            "driver": driver,
+            "statement": statement[:STATEMENT_MAX_LENGTH],
+            "parameters": repr(parameters)[:PARAMETERS_MAX_LENGTH] if SLOW_QUERY_LOG_PARAMETERS else None,
+            "plan": None,
+        }
+        self.records.append(record)
+        self.stats["recorded"] += 1
+        logger.warning(f"🐢 Slow query ({record['duration_ms']}ms) in {record['route'] or 'background'}: {statement[:120]}")
+
+        explain = not executemany and self._should_explain(statement)
+        if explain or self.path:
+            self._submit({"record": record, "statement": statement, "parameters": parameters, "explain": explain})
+
+    def _should_explain(self, statement: str) -> bool:
+        if self.explain_engine is None or random.random() >= self.explain_sample_rate:
+            return False
+        # EXPLAIN ANALYZE runs the statement again; only read-only statements qualify
+        if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return False
+        shape = statement_shape(statement)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(shape, float("-inf")) < SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS:
+                return False
+            self._explained[shape] = now
+        return True
+
+    def _submit(self, job: Dict[str, Any]):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._work, name="slow-query-log", daemon=True)
+            self._worker.start()
+        if job["explain"]:
+            job["record"]["plan"] = "pending"
+        try:
+            self._jobs.put_nowait(job)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            if job["explain"]:
+                job["record"]["plan"] = None
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            record = job["record"]
+            if job["explain"]:
+                record["plan"] = self._explain(job["statement"], job["parameters"])
+            if self.path:
+                self._write(record)
+
+    def _explain(self, statement: str, parameters: Any) -> List[str]:
+        """Plan lines of the statement run under EXPLAIN (ANALYZE, BUFFERS), or the error."""
+        connection = self.explain_engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SET TRANSACTION READ ONLY")
+            cursor.execute(f"SET LOCAL statement_timeout = {SLOW_QUERY_EXPLAIN_TIMEOUT_MS}")
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            self.stats["explained"] += 1
+            return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            self.stats["explain_errors"] += 1
+            logger.error(f"❌ Failed to explain slow query: {e}")
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            connection.rollback()
+            connection.close()
+
+    def _write(self, record: Dict[str, Any]):
+        try:
+            with open(self.path, "a", encoding="utf-8") as sink:
+                sink.write(json.dumps(record, default=str) + "\n")
+            self.stats["written"] += 1
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            logger.error(f"❌ Failed to write slow query log {self.path}: {e}")
+
+    def recent(self, limit: int = 50, route: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent slow queries first, optionally only those of one route"""
+        records = [record for record in reversed(self.records) if route is None or record["route"] == route]
+        return records[:limit]
+
+    def reset(self):
+        self.records.clear()
+        with self._lock:
+            self._explained.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold * 1000,
+            "explain_sample_rate": self.explain_sample_rate,
+            "file": self.path,
+            "stored": len(self.records),
+            "pending": self._jobs.qsize(),
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with it if the statement fails
+    if context is not None:
+        context.slow_query_started = time.perf_counter()
+
+
+class SlowQueryMiddleware:
+    """ASGI middleware making each request's route known to the slow-query log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+# Global instance
+slow_query_log = SlowQueryLog()
@@ -10,10 +10,12 @@ from app.models.course import Course
 from app.models.enrollment import CourseEnrollment
 from app.models.auth import Token, MoodleConfig
 from app.models.quest import Quest, StudentProgress, ExperiencePoints
-from app.models.leaderboard import Leaderboard, LeaderboardEntry, StudentProgress, ExperiencePoint
+from app.models.leaderboard import Leaderboard, LeaderboardEntry, StudentProgress, ExperiencePoint, XPDailyRollup
 from app.models.daily_quest import DailyQuest, UserDailyQuest, DailyQuestProgress, QuestTypeEnum, QuestStatusEnum
 from app.models.streak import UserStreak
-from app.models.badge import Badge, UserBadge
+from app.models.badge import Badge, UserBadge, BadgeAwardJob
 from app.models.virtual_pet import VirtualPet, PetAccessory
+from app.models.webhook_event import WebhookEvent, WebhookIdempotencyKey
+from app.models.notification import NotificationLog
 
 # This file ensures proper loading order of models when using relationships
\ No newline at end of file
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, JSON, Text, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, Integer, String, JSON, Text, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import INET, JSONB
 from sqlalchemy.sql import func
 from app.database.connection import Base
 
 class ActivityLog(Base):
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        # Date range analytics, and a user's recent activity
+        Index('ix_activity_logs_timestamp_user_id', 'timestamp', 'user_id'),
+        Index('ix_activity_logs_user_id_timestamp', 'user_id', 'timestamp'),
+    )
 
     log_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -47,7 +47,30 @@ class UserBadge(Base):
     course = relationship("Course", foreign_keys=[course_id])  # Which course this badge was earned in
     
     # Ensure user can only earn each badge once (matches your UNIQUE constraint)
-    __table_args__ = (UniqueConstraint('user_id', 'badge_id', name='user_badges_user_id_badge_id_key'),)
     __table_args__ = (
+        UniqueConstraint('user_id', 'badge_id', name='user_badges_user_id_badge_id_key'),
         {'extend_existing': True}
     )
+
+
+class BadgeAwardJob(Base):
+    """Resumable background job that retroactively awards badges, one chunk of users at a time"""
+    __tablename__ = "badge_award_jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, completed, failed
+    dry_run = Column(Boolean, nullable=False, default=True)
+    target_user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    chunk_size = Column(Integer, nullable=False)
+    total_users = Column(Integer, nullable=False, default=0)
+    users_processed = Column(Integer, nullable=False, default=0)
+    users_with_new_badges = Column(Integer, nullable=False, default=0)
+    badges_awarded = Column(Integer, nullable=False, default=0)
+    # Highest user ID processed; the next chunk starts after it
+    last_user_id = Column(Integer, nullable=False, default=0)
+    user_results = Column(JSONB, nullable=False, default=list)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
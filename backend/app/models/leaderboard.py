@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DECIMAL, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DECIMAL, TIMESTAMP, Date, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database.connection import Base
@@ -23,7 +23,13 @@ class Leaderboard(Base):
 
 class LeaderboardEntry(Base):
     __tablename__ = "leaderboard_entries"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Entries are upserted incrementally by the ranking engine
+        UniqueConstraint('leaderboard_id', 'user_id', name='uq_leaderboard_entries_leaderboard_user'),
+        # Re-ranking a score range after a flush
+        Index('ix_leaderboard_entries_leaderboard_id_score', 'leaderboard_id', 'score'),
+        {'extend_existing': True}
+    )
     
     entry_id = Column(Integer, primary_key=True, autoincrement=True)
     leaderboard_id = Column(Integer, ForeignKey("leaderboards.leaderboard_id"), nullable=False)
@@ -38,7 +44,11 @@ class LeaderboardEntry(Base):
 
 class StudentProgress(Base):
     __tablename__ = "student_progress"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # One progress row per user and course
+        Index('ix_student_progress_user_id_course_id', 'user_id', 'course_id', unique=True),
+        {'extend_existing': True}
+    )
     
     progress_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -58,7 +68,11 @@ class StudentProgress(Base):
 
 class ExperiencePoint(Base):
     __tablename__ = "experience_points"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Duplicate XP checks; not unique, lesson views may be awarded again after an hour
+        Index('ix_experience_points_user_course_source', 'user_id', 'course_id', 'source_type', 'source_id'),
+        {'extend_existing': True}
+    )
     
     exp_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -73,4 +87,19 @@ class ExperiencePoint(Base):
     # Relationships
     user = relationship("User", foreign_keys=[user_id])
     course = relationship("Course", foreign_keys=[course_id])
-    awarded_by_user = relationship("User", foreign_keys=[awarded_by]) 
\ No newline at end of file
+    awarded_by_user = relationship("User", foreign_keys=[awarded_by])
+
+class XPDailyRollup(Base):
+    """XP awarded to a user in a course on one UTC day, kept up to date as XP is awarded."""
+    __tablename__ = "xp_daily_rollups"
+    __table_args__ = (
+        Index('ix_xp_daily_rollups_day', 'day'),
+        {'extend_existing': True}
+    )
+    
+    # Bucket keys are in (course_id, day, user_id) order for course timeframe queries
+    course_id = Column(Integer, primary_key=True)  # 0 for XP awarded outside a course
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_exp = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.database.connection import Base
+
+
+class NotificationLog(Base):
+    """Notifications sent to users, kept for a retention window so reconnecting clients can replay them"""
+    __tablename__ = "notification_log"
+
+    # Also the SSE event ID; increases monotonically across workers
+    event_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False)
+    notification = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    __table_args__ = (
+        # Replay reads a user's events after the client's Last-Event-ID
+        Index('ix_notification_log_user_id_event_id', 'user_id', 'event_id'),
+    )
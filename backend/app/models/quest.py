@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, SmallInteger, ForeignKey, DateTime, Float, UniqueConstraint, Numeric
+from sqlalchemy import Column, Integer, String, Text, Boolean, SmallInteger, ForeignKey, DateTime, Float, UniqueConstraint, Numeric, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.database.connection import Base
@@ -24,6 +24,11 @@ class Quest(Base):
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     moodle_activity_id = Column(Integer, nullable=True, index=True)
 
+    __table_args__ = (
+        # Webhook quest resolution by (course, activity)
+        Index('ix_quests_course_id_moodle_activity_id_is_active', 'course_id', 'moodle_activity_id', 'is_active'),
+    )
+
 class QuestProgress(Base):
     __tablename__ = "quest_progress"
 
@@ -47,6 +52,7 @@ class QuestProgress(Base):
     __table_args__ = (
         # Composite unique constraint for (user_id, quest_id)
         UniqueConstraint('user_id', 'quest_id', name='uq_user_quest'),
+        Index('ix_quest_progress_quest_id_status_completed_at', 'quest_id', 'status', 'completed_at'),
     )
 
     # Relationships
@@ -87,6 +93,11 @@ class QuestEngagementEvent(Base):
     event_data = Column(JSONB, nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     engagement_points = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Latest event of a type for a quest progress
+        Index('ix_quest_engagement_events_progress_type_id', 'quest_progress_id', 'event_type', 'id'),
+    )
     
     # Relationships
     quest_progress = relationship("QuestProgress")
@@ -19,7 +19,7 @@ class User(Base):
     last_login = Column(DateTime(timezone=True), nullable=True)
     profile_image_url = Column(Text, nullable=True)
     bio = Column(Text, nullable=True)
-    moodle_user_id = Column(Integer, nullable=True)
+    moodle_user_id = Column(Integer, nullable=True, unique=True, index=True)
     settings = Column(JSONB, server_default='{}')
     user_token = Column(Text, unique=True, nullable=True)
     
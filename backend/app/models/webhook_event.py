@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.database.connection import Base
+
+
+class WebhookEvent(Base):
+    """Durable queue of Moodle webhook events waiting to be processed"""
+    __tablename__ = "webhook_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_path = Column(String(100), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, processing, done, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Workers claim the oldest available pending rows
+        Index('ix_webhook_events_status_available_at', 'status', 'available_at'),
+    )
+
+
+class WebhookIdempotencyKey(Base):
+    """Keys of webhook events already accepted, used to drop Moodle retries"""
+    __tablename__ = "webhook_idempotency_keys"
+
+    key = Column(String(64), primary_key=True)
+    event_path = Column(String(100), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from functools import lru_cache
 from functools import lru_cache
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract, case, cast, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, extract, case, cast, select, Float
 from datetime import datetime, timedelta
 from typing import List, Optional
-from app.database.connection import get_db
+from app.database.connection import get_async_read_db
 from app.models.activity_log import ActivityLog
 from app.models.badge import UserBadge
 from app.models.quest import QuestProgress, Quest, ExperiencePoints
@@ -50,7 +50,7 @@ async def get_engagement_analytics(
     time_range: str = Query("week", description="Time range: week, month, semester"),
     course_id: Optional[int] = Query(None, description="Filter by course ID"),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get engagement analytics data including active users, badges earned, and quests completed
@@ -82,7 +82,7 @@ async def get_engagement_analytics(
             base_conditions.append(ActivityLog.related_entity_id == course_id)
 
         # Get daily active users
-        daily_active_users = db.query(
+        daily_active_users = (await db.execute(select(
             func.date(ActivityLog.timestamp).label('day'),
             func.count(func.distinct(ActivityLog.user_id)).label('activeUsers')
         ).filter(
@@ -91,7 +91,7 @@ async def get_engagement_analytics(
             func.date(ActivityLog.timestamp)
         ).order_by(
             func.date(ActivityLog.timestamp)
-        ).all()
+        ))).all()
 
         # Get daily badges earned
         badge_conditions = [
@@ -101,7 +101,7 @@ async def get_engagement_analytics(
         if course_id:
             badge_conditions.append(UserBadge.course_id == course_id)
 
-        daily_badges_earned = db.query(
+        daily_badges_earned = (await db.execute(select(
             func.date(UserBadge.awarded_at).label('day'),
             func.count(UserBadge.user_badge_id).label('badgesEarned')
         ).filter(
@@ -110,7 +110,7 @@ async def get_engagement_analytics(
             func.date(UserBadge.awarded_at)
         ).order_by(
             func.date(UserBadge.awarded_at)
-        ).all()
+        ))).all()
 
         # Get daily quests completed
         quest_conditions = [
@@ -120,7 +120,7 @@ async def get_engagement_analytics(
         ]
         if course_id:
             # Join with quests table to filter by course
-            daily_quests_completed = db.query(
+            daily_quests_completed = (await db.execute(select(
                 func.date(QuestProgress.completed_at).label('day'),
                 func.count(QuestProgress.progress_id).label('questsCompleted')
             ).join(
@@ -131,9 +131,9 @@ async def get_engagement_analytics(
                 func.date(QuestProgress.completed_at)
             ).order_by(
                 func.date(QuestProgress.completed_at)
-            ).all()
+            ))).all()
         else:
-            daily_quests_completed = db.query(
+            daily_quests_completed = (await db.execute(select(
                 func.date(QuestProgress.completed_at).label('day'),
                 func.count(QuestProgress.progress_id).label('questsCompleted')
             ).filter(
@@ -142,7 +142,7 @@ async def get_engagement_analytics(
                 func.date(QuestProgress.completed_at)
             ).order_by(
                 func.date(QuestProgress.completed_at)
-            ).all()
+            ))).all()
 
         # Combine all data by day
         engagement_data = {}
@@ -190,7 +190,7 @@ async def get_engagement_summary(
     time_range: str = Query("week", description="Time range: week, month, semester"),
     course_id: Optional[int] = Query(None, description="Filter by course ID"),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get summary statistics for engagement analytics
@@ -221,9 +221,9 @@ async def get_engagement_summary(
             base_conditions.append(ActivityLog.related_entity_id == course_id)
 
         # Total active users
-        total_active_users = db.query(
+        total_active_users = await db.scalar(select(
             func.count(func.distinct(ActivityLog.user_id))
-        ).filter(and_(*base_conditions)).scalar()
+        ).filter(and_(*base_conditions)))
 
         # Total badges earned
         badge_conditions = [
@@ -233,9 +233,9 @@ async def get_engagement_summary(
         if course_id:
             badge_conditions.append(UserBadge.course_id == course_id)
 
-        total_badges_earned = db.query(
+        total_badges_earned = await db.scalar(select(
             func.count(UserBadge.user_badge_id)
-        ).filter(and_(*badge_conditions)).scalar()
+        ).filter(and_(*badge_conditions)))
 
         # Total quests completed
         quest_conditions = [
@@ -245,17 +245,17 @@ async def get_engagement_summary(
         ]
 
         if course_id:
-            total_quests_completed = db.query(
+            total_quests_completed = await db.scalar(select(
                 func.count(QuestProgress.progress_id)
             ).join(
                 Quest, QuestProgress.quest_id == Quest.quest_id
             ).filter(
                 and_(*quest_conditions, Quest.course_id == course_id)
-            ).scalar()
+            ))
         else:
-            total_quests_completed = db.query(
+            total_quests_completed = await db.scalar(select(
                 func.count(QuestProgress.progress_id)
-            ).filter(and_(*quest_conditions)).scalar()
+            ).filter(and_(*quest_conditions)))
 
         return {
             "success": True,
@@ -285,7 +285,7 @@ async def get_performance_analytics(
     time_range: str = Query("week", description="Time range: week, month, semester"),
     course_id: Optional[int] = Query(None, description="Filter by course ID"),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get performance analytics including average XP per day and completion rates per day
@@ -318,7 +318,7 @@ async def get_performance_analytics(
             base_conditions.append(Quest.course_id == course_id)
 
         # Get daily performance data
-        performance_data = db.query(
+        performance_data = (await db.execute(select(
             func.date(QuestProgress.completed_at).label('day'),
             func.avg(Quest.exp_reward).label('averageXp'),
             func.count(QuestProgress.progress_id).label('totalAttempts'),
@@ -336,7 +336,7 @@ async def get_performance_analytics(
             func.date(QuestProgress.completed_at)
         ).order_by(
             func.date(QuestProgress.completed_at)
-        ).all()
+        ))).all()
 
         # Create a complete date range and fill in missing days
         daily_data = {}
@@ -383,7 +383,7 @@ async def get_engagement_insights(
     time_range: str = Query("week", description="Time range: week, month, semester"),
     course_id: Optional[int] = Query(None, description="Filter by course ID"),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get detailed engagement insights including login patterns, activity heatmaps, 
@@ -415,7 +415,7 @@ async def get_engagement_insights(
             base_conditions.append(ActivityLog.related_entity_id == course_id)
 
         # 1. Login Patterns (by hour of day)
-        login_patterns = db.query(
+        login_patterns = (await db.execute(select(
             extract('hour', ActivityLog.timestamp).label('hour'),
             func.count(func.distinct(ActivityLog.user_id)).label('uniqueUsers')
         ).filter(
@@ -424,10 +424,10 @@ async def get_engagement_insights(
             extract('hour', ActivityLog.timestamp)
         ).order_by(
             extract('hour', ActivityLog.timestamp)
-        ).all()
+        ))).all()
 
         # 2. Activity Heatmap (by day of week and hour)
-        activity_heatmap = db.query(
+        activity_heatmap = (await db.execute(select(
             extract('dow', ActivityLog.timestamp).label('dayOfWeek'),
             extract('hour', ActivityLog.timestamp).label('hour'),
             func.count(ActivityLog.log_id).label('activityCount')
@@ -436,17 +436,17 @@ async def get_engagement_insights(
         ).group_by(
             extract('dow', ActivityLog.timestamp),
             extract('hour', ActivityLog.timestamp)
-        ).all()
+        ))).all()
 
         # 3. Engagement Intensity (users categorized by activity level)
-        user_activity_counts = db.query(
+        user_activity_counts = (await db.execute(select(
             ActivityLog.user_id,
             func.count(ActivityLog.log_id).label('activityCount')
         ).filter(
             and_(*base_conditions)
         ).group_by(
             ActivityLog.user_id
-        ).all()
+        ))).all()
 
         # Categorize users by engagement level
         engagement_levels = {
@@ -466,7 +466,7 @@ async def get_engagement_insights(
                 engagement_levels['low'] += 1
 
         # 4. Streak Analysis (consecutive days of activity)
-        daily_user_activity = db.query(
+        daily_user_activity = (await db.execute(select(
             func.date(ActivityLog.timestamp).label('date'),
             func.count(func.distinct(ActivityLog.user_id)).label('activeUsers')
         ).filter(
@@ -475,20 +475,20 @@ async def get_engagement_insights(
             func.date(ActivityLog.timestamp)
         ).order_by(
             func.date(ActivityLog.timestamp)
-        ).all()
+        ))).all()
 
         # Optimized: Calculate active_days directly from the database
-        active_days = db.query(
+        active_days = await db.scalar(select(
             func.count()
         ).select_from(
-            db.query(
+            select(
                 func.date(ActivityLog.timestamp).label('date')
             )
             .filter(and_(*base_conditions))
             .group_by(func.date(ActivityLog.timestamp))
             .having(func.count(func.distinct(ActivityLog.user_id)) > 0)
             .subquery()
-        ).scalar()
+        ))
 
         # Calculate streak metrics
         streak_data = []
@@ -508,40 +508,40 @@ async def get_engagement_insights(
         time_periods_data = []
         
         # Early Morning (12AM-6AM)
-        early_morning_count = db.query(func.count(ActivityLog.log_id)).filter(
+        early_morning_count = await db.scalar(select(func.count(ActivityLog.log_id)).filter(
             and_(*base_conditions, extract('hour', ActivityLog.timestamp) < 6)
-        ).scalar()
+        ))
         time_periods_data.append({
             'period': 'Early Morning (12AM-6AM)',
             'activityCount': early_morning_count or 0
         })
         
         # Morning (6AM-12PM)
-        morning_count = db.query(func.count(ActivityLog.log_id)).filter(
+        morning_count = await db.scalar(select(func.count(ActivityLog.log_id)).filter(
             and_(*base_conditions, 
                   extract('hour', ActivityLog.timestamp) >= 6,
                   extract('hour', ActivityLog.timestamp) < 12)
-        ).scalar()
+        ))
         time_periods_data.append({
             'period': 'Morning (6AM-12PM)',
             'activityCount': morning_count or 0
         })
         
         # Afternoon (12PM-6PM)
-        afternoon_count = db.query(func.count(ActivityLog.log_id)).filter(
+        afternoon_count = await db.scalar(select(func.count(ActivityLog.log_id)).filter(
             and_(*base_conditions,
                   extract('hour', ActivityLog.timestamp) >= 12,
                   extract('hour', ActivityLog.timestamp) < 18)
-        ).scalar()
+        ))
         time_periods_data.append({
             'period': 'Afternoon (12PM-6PM)',
             'activityCount': afternoon_count or 0
         })
         
         # Evening (6PM-12AM)
-        evening_count = db.query(func.count(ActivityLog.log_id)).filter(
+        evening_count = await db.scalar(select(func.count(ActivityLog.log_id)).filter(
             and_(*base_conditions, extract('hour', ActivityLog.timestamp) >= 18)
-        ).scalar()
+        ))
         time_periods_data.append({
             'period': 'Evening (6PM-12AM)',
             'activityCount': evening_count or 0
@@ -551,7 +551,7 @@ async def get_engagement_insights(
         time_periods = sorted(time_periods_data, key=lambda x: x['activityCount'], reverse=True)
 
         # 6. Action Type Distribution
-        action_distribution = db.query(
+        action_distribution = (await db.execute(select(
             ActivityLog.action_type,
             func.count(ActivityLog.log_id).label('count')
         ).filter(
@@ -560,7 +560,7 @@ async def get_engagement_insights(
             ActivityLog.action_type
         ).order_by(
             func.count(ActivityLog.log_id).desc()
-        ).all()
+        ))).all()
 
         # Format login patterns for frontend
         login_patterns_formatted = []
@@ -2,158 +2,88 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
 from typing import List, Optional
-from datetime import datetime
 from ..database.connection import get_db
 from ..models.user import User
-from ..models.badge import Badge, UserBadge
+from ..models.badge import Badge, UserBadge, BadgeAwardJob
 from ..models.quest import QuestProgress, StudentProgress
 from ..services.badge_service import BadgeService
-from ..services.activity_log_service import log_activity
+from ..services.badge_award_job import badge_award_jobs, BADGE_AWARD_JOB_CHUNK_SIZE
 from ..schemas.badge_schemas import BadgeCreate, Badge as BadgeSchema
 
 router = APIRouter(prefix="/badges", tags=["badges"])
 
 
-@router.post("/retroactive-award")
+@router.post("/retroactive-award", status_code=status.HTTP_202_ACCEPTED)
 async def retroactive_badge_award(
     dry_run: bool = True,
     user_id: Optional[int] = None,
+    chunk_size: int = Query(BADGE_AWARD_JOB_CHUNK_SIZE, ge=1, le=10000),
     db: Session = Depends(get_db)
 ):
     """
     Retroactively award badges to users who earned them before the badge system was implemented
     
+    Starts a background job that checks users in chunks and commits after each
+    chunk; poll GET /badges/retroactive-award/{job_id} for progress and results.
+    
     Query Parameters:
     - dry_run: If true, only shows what would be awarded (default: true)
     - user_id: If provided, only check this specific user (optional)
+    - chunk_size: Users checked and committed per chunk (optional)
     
     Example Postman requests:
     POST /badges/retroactive-award?dry_run=true                    # Preview all users
     POST /badges/retroactive-award?dry_run=false                   # Award to all users  
     POST /badges/retroactive-award?dry_run=true&user_id=16         # Preview specific user
     POST /badges/retroactive-award?dry_run=false&user_id=16        # Award to specific user
+    GET  /badges/retroactive-award/3                               # Job status and results
     """
+    if user_id and not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    
     try:
-        # Get users to check
-        if user_id:
-            users = db.query(User).filter(User.id == user_id).all()
-            if not users:
-                raise HTTPException(status_code=404, detail=f"User {user_id} not found")
-        else:
-            users = db.query(User).filter(User.is_active == True).all()
-        
-        # Get all active badges
-        badges = db.query(Badge).filter(Badge.is_active == True).all()
-        
-        total_awarded = 0
-        user_results = []
-        
-        for user in users:
-            # Get user's current badges
-            current_badges = db.query(UserBadge).filter(UserBadge.user_id == user.id).all()
-            current_badge_ids = {ub.badge_id for ub in current_badges}
-            
-            user_new_badges = []
-            
-            for badge in badges:
-                if badge.badge_id in current_badge_ids:
-                    continue  # User already has this badge
-                
-                # Check if user qualifies for this badge
-                if _check_retroactive_qualification(user, badge, db):
-                    user_new_badges.append({
-                        "badge_id": badge.badge_id,
-                        "badge_name": badge.name,
-                        "badge_description": badge.description
-                    })
-                    
-                    if not dry_run:
-                        # Actually award the badge
-                        user_badge = UserBadge(
-                            user_id=user.id,
-                            badge_id=badge.badge_id,
-                            awarded_at=datetime.utcnow(),
-                            awarded_by=None,  # System awarded
-                            course_id=None
-                        )
-                        db.add(user_badge)
-                        total_awarded += 1
-                        # Log activity
-                        log_activity(
-                            db=db,
-                            user_id=user.id,
-                            action_type="badge_awarded",
-                            action_details={
-                                "badge_id": badge.badge_id,
-                                "badge_name": badge.name,
-                                "retroactive": True
-                            },
-                            related_entity_type="badge",
-                            related_entity_id=badge.badge_id,
-                            exp_change=0
-                        )
-            
-            if user_new_badges:
-                user_results.append({
-                    "user_id": user.id,
-                    "moodle_user_id": user.moodle_user_id,
-                    "current_badges_count": len(current_badge_ids),
-                    "new_badges": user_new_badges,
-                    "new_badges_count": len(user_new_badges)
-                })
-        
-        if not dry_run:
-            db.commit()
-        
-        return {
-            "success": True,
-            "dry_run": dry_run,
-            "summary": {
-                "total_users_checked": len(users),
-                "users_with_new_badges": len(user_results),
-                "total_badges_awarded": total_awarded,
-                "target_user_id": user_id
-            },
-            "user_results": user_results,
-            "message": f"{'Preview complete' if dry_run else 'Badges awarded successfully'}: {total_awarded} badges {'would be awarded to' if dry_run else 'awarded to'} {len(user_results)} users"
-        }
-        
+        job = badge_award_jobs.create_job(db, dry_run=dry_run, user_id=user_id, chunk_size=chunk_size)
+        badge_award_jobs.start(job.job_id)
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Retroactive badge award failed: {str(e)}"
         )
+    
+    return {
+        "success": True,
+        "dry_run": dry_run,
+        "job": badge_award_jobs.to_dict(job),
+        "status_url": f"/api/badges/retroactive-award/{job.job_id}",
+        "message": f"{'Preview' if dry_run else 'Badge award'} job {job.job_id} started for {job.total_users} users"
+    }
 
 
-def _check_retroactive_qualification(user: User, badge: Badge, db: Session) -> bool:
-    """Check if user qualifies for a badge retroactively"""
-    criteria = badge.criteria
-    criterion_type = criteria.get("type")
-    
-    if criterion_type == "quest_completion":
-        target = criteria.get("target", 1)        # Count completed quests
-        completed_quests = db.query(QuestProgress).filter(
-            QuestProgress.user_id == user.id,  # Use local user ID, not moodle_user_id
-            QuestProgress.status == "completed"
-        ).count()
-        
-        return completed_quests >= target
-        
-    elif criterion_type == "total_exp":
-        target = criteria.get("target", 1000)
-        
-        # Get user's total XP - StudentProgress uses user_id (local ID)
-        student_progress = db.query(StudentProgress).filter(
-            StudentProgress.user_id == user.id  # Use local user ID, not moodle_user_id
-        ).first()
-        
-        if student_progress:
-            return student_progress.total_exp >= target
-        return False
+@router.get("/retroactive-award/{job_id}")
+async def get_retroactive_award_job(job_id: int, db: Session = Depends(get_db)):
+    """Status, progress and per-user results of a retroactive badge award job"""
+    job = db.query(BadgeAwardJob).filter(BadgeAwardJob.job_id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Badge award job {job_id} not found")
+    return badge_award_jobs.to_dict(job)
+
+
+@router.post("/retroactive-award/{job_id}/resume")
+async def resume_retroactive_award_job(job_id: int, db: Session = Depends(get_db)):
+    """Resume a failed retroactive badge award job from its last committed chunk"""
+    job = db.query(BadgeAwardJob).filter(BadgeAwardJob.job_id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Badge award job {job_id} not found")
+    if job.status == "completed":
+        raise HTTPException(status_code=400, detail=f"Badge award job {job_id} already completed")
     
-    # Add more criteria types as needed
-    return False
+    if job.status == "failed":
+        job.status = "running"
+        job.error = None
+        db.commit()
+    badge_award_jobs.start(job_id)
+    return badge_award_jobs.to_dict(job)
 
 
 @router.post("/", response_model=BadgeSchema)
@@ -0,0 +1,98 @@
+"""
+Runtime diagnostics for finding slow handlers. Admins only.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.database.pool_metrics import pool_metrics
+from app.database.read_replica import read_replica
+from app.database.slow_query_log import slow_query_log
+from app.services.loop_monitor import loop_monitor
+from app.services.query_profiler import query_profiler
+from app.utils.auth import get_role_required
+
+router = APIRouter(prefix="/debug", tags=["debug"], dependencies=[Depends(get_role_required("admin"))])
+
+
+@router.get("/loop-stalls")
+async def get_loop_stalls(limit: int = Query(20, description="Number of routes to return")):
+    """
+    Routes and background tasks that blocked the event loop, worst total first.
+
+    Each route lists its stall count, total and longest stall, and the stack
+    captured during its longest stall. Empty unless LOOP_STALL_MONITOR=true.
+    """
+    return loop_monitor.report(limit)
+
+
+@router.delete("/loop-stalls")
+async def reset_loop_stalls():
+    """Clear the stall report, e.g. before load testing a change."""
+    loop_monitor.reset()
+    return {"success": True}
+
+
+@router.get("/queries")
+async def get_query_stats(
+    limit: int = Query(20, description="Number of routes to return"),
+    n_plus_one_only: bool = Query(False, description="Only routes with N+1 candidates")
+):
+    """
+    Per-route SQL statistics, most database time first.
+
+    Each route lists its average and largest query count, average database
+    time, and the statement shapes repeated often enough in one request to
+    be N+1 candidates. Empty unless QUERY_PROFILER=true.
+    """
+    return query_profiler.report(limit, n_plus_one_only)
+
+
+@router.delete("/queries")
+async def reset_query_stats():
+    """Clear the per-route SQL statistics."""
+    query_profiler.reset()
+    return {"success": True}
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, description="Number of slow queries to return"),
+    route: Optional[str] = Query(None, description="Only queries of this route, e.g. 'GET /api/analytics/summary'")
+):
+    """
+    Most recent statements slower than SLOW_QUERY_THRESHOLD_MS, newest first.
+
+    Each entry has the statement, its duration and route, its parameters
+    with SLOW_QUERY_LOG_PARAMETERS=true, and for sampled SELECTs the
+    EXPLAIN (ANALYZE, BUFFERS) plan.
+    """
+    return {
+        **slow_query_log.get_stats(),
+        "queries": slow_query_log.recent(limit, route)
+    }
+
+
+@router.delete("/slow-queries")
+async def reset_slow_queries():
+    """Clear the in-memory slow-query log; the JSONL file is kept."""
+    slow_query_log.reset()
+    return {"success": True}
+
+
+@router.get("/read-replica")
+async def get_read_replica_status():
+    """
+    Whether read-only routes are reading from the replica, its last measured
+    lag, and how many read sessions went to the replica or fell back to the
+    primary.
+    """
+    return read_replica.get_stats()
+
+
+@router.delete("/pools")
+async def reset_pool_metrics():
+    """Clear the pool checkout histograms and timeout counts reported by /health/ready."""
+    pool_metrics.reset()
+    return {"success": True}
@@ -0,0 +1,81 @@
+"""
+Readiness probe for load balancers and orchestrators.
+"""
+
+import asyncio
+import os
+import time
+
+from fastapi import APIRouter, Response
+from sqlalchemy import text
+
+from app.database.connection import async_engine
+from app.database.pool_metrics import pool_metrics
+from app.database.read_replica import read_replica
+
+# Round trip allowed before the primary counts as unreachable
+READY_DB_TIMEOUT_SECONDS = float(os.getenv("READY_DB_TIMEOUT_SECONDS", 2))
+# Saturation of a primary pool at which this worker stops taking traffic
+READY_MAX_POOL_SATURATION = float(os.getenv("READY_MAX_POOL_SATURATION", 1.0))
+
+PRIMARY_POOLS = ("primary", "primary_async")
+
+CONNECTIONS_QUERY = text("""
+    SELECT current_setting('max_connections')::int - current_setting('superuser_reserved_connections')::int,
+           (SELECT count(*) FROM pg_stat_activity WHERE backend_type = 'client backend')
+""")
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+async def database_status() -> dict:
+    """Round-trip latency of the primary and its server-wide connection usage"""
+    async with async_engine.connect() as conn:
+        started = time.perf_counter()
+        await conn.execute(text("SELECT 1"))
+        round_trip_ms = (time.perf_counter() - started) * 1000
+        max_connections, in_use = (await conn.execute(CONNECTIONS_QUERY)).one()
+    per_worker = pool_metrics.connections_per_worker()
+    return {
+        "reachable": True,
+        "round_trip_ms": round(round_trip_ms, 2),
+        # Excluding the connections reserved for superusers
+        "max_connections": max_connections,
+        "connections_in_use": in_use,
+        "connections_per_worker": per_worker,
+        # Workers with these pool settings that fit in max_connections, across all hosts
+        "worker_capacity": max_connections // per_worker if per_worker else None,
+    }
+
+
+@router.get("/ready")
+async def readiness(response: Response):
+    """
+    Whether this worker should receive traffic.
+
+    Ready when the primary answers within READY_DB_TIMEOUT_SECONDS and no
+    primary pool is at READY_MAX_POOL_SATURATION; otherwise 503. Reports the
+    round-trip latency, every pool's saturation and checkout-time histogram,
+    and how many workers of this configuration fit in max_connections.
+    """
+    # Taken before the round trip, so the probe's own checkout is not counted
+    pools = pool_metrics.snapshot()
+    try:
+        database = await asyncio.wait_for(database_status(), timeout=READY_DB_TIMEOUT_SECONDS)
+    except Exception as e:
+        database = {"reachable": False, "error": str(e) or type(e).__name__}
+
+    saturated = [
+        name for name in PRIMARY_POOLS
+        if name in pools and pools[name]["saturation"] >= READY_MAX_POOL_SATURATION
+    ]
+    ready = database["reachable"] and not saturated
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "saturated_pools": saturated,
+        "database": database,
+        "pools": pools,
+        "read_replica": read_replica.get_stats(),
+    }
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import logging
 
-from app.database.connection import get_db
+from app.database.connection import get_db, get_async_db, get_async_read_db
 from app.utils.auth import get_current_active_user, get_role_required
+from app.models.leaderboard import Leaderboard
 from app.models.user import User
+from app.services.leaderboard_ranking import leaderboard_ranking
 from app.schemas.leaderboard import (
     LeaderboardResponse,
     LeaderboardCreate,
@@ -41,6 +44,60 @@ from app.crud.leaderboard import (
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
+# The read routes below use the async session and run the crud functions
+# through run_sync; responses are built there too, while relationships
+# such as entry.user can still be loaded.
+
+def leaderboard_response(leaderboard: Leaderboard) -> LeaderboardResponse:
+    """Response for a leaderboard, with the user details of its entries"""
+    entries = []
+    for entry in leaderboard.entries:
+        entry_response = LeaderboardEntryResponse(
+            entry_id=entry.entry_id,
+            leaderboard_id=entry.leaderboard_id,
+            user_id=entry.user_id,
+            score=entry.score,
+            rank=entry.rank,
+            last_updated=entry.last_updated,
+            username=entry.user.username if entry.user else None,
+            first_name=entry.user.first_name if entry.user else None,
+            last_name=entry.user.last_name if entry.user else None,
+            profile_image_url=entry.user.profile_image_url if entry.user else None
+        )
+        entries.append(entry_response)
+    
+    return LeaderboardResponse(
+        leaderboard_id=leaderboard.leaderboard_id,
+        name=leaderboard.name,
+        description=leaderboard.description,
+        course_id=leaderboard.course_id,
+        metric_type=leaderboard.metric_type,
+        timeframe=leaderboard.timeframe,
+        is_active=leaderboard.is_active,
+        created_at=leaderboard.created_at,
+        last_updated=leaderboard.last_updated,
+        entries=entries
+    )
+
+def progress_response(progress) -> StudentProgressResponse:
+    """Response for a student progress row, with the student's name"""
+    return StudentProgressResponse(
+        progress_id=progress.progress_id,
+        user_id=progress.user_id,
+        course_id=progress.course_id,
+        total_exp=progress.total_exp,
+        quests_completed=progress.quests_completed,
+        badges_earned=progress.badges_earned,
+        engagement_score=progress.engagement_score,
+        study_hours=progress.study_hours,
+        last_activity=progress.last_activity,
+        streak_days=progress.streak_days,
+        last_updated=progress.last_updated,
+        username=progress.user.username if progress.user else None,
+        first_name=progress.user.first_name if progress.user else None,
+        last_name=progress.user.last_name if progress.user else None
+    )
+
 # Leaderboard Management Routes (Admin/Teacher only)
 @router.post("/", response_model=LeaderboardResponse)
 async def create_new_leaderboard(
@@ -59,43 +116,18 @@ async def create_new_leaderboard(
 @router.get("/{leaderboard_id}", response_model=LeaderboardResponse)
 async def get_leaderboard_by_id(
     leaderboard_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get a specific leaderboard with its entries"""
-    db_leaderboard = get_leaderboard(db, leaderboard_id)
-    if not db_leaderboard:
-        raise HTTPException(status_code=404, detail="Leaderboard not found")
-    
-    # Convert to response format with user details
-    entries = []
-    for entry in db_leaderboard.entries:
-        entry_response = LeaderboardEntryResponse(
-            entry_id=entry.entry_id,
-            leaderboard_id=entry.leaderboard_id,
-            user_id=entry.user_id,
-            score=entry.score,
-            rank=entry.rank,
-            last_updated=entry.last_updated,
-            username=entry.user.username if entry.user else None,
-            first_name=entry.user.first_name if entry.user else None,
-            last_name=entry.user.last_name if entry.user else None,
-            profile_image_url=entry.user.profile_image_url if entry.user else None
-        )
-        entries.append(entry_response)
+    def load(session: Session) -> Optional[LeaderboardResponse]:
+        db_leaderboard = get_leaderboard(session, leaderboard_id)
+        return leaderboard_response(db_leaderboard) if db_leaderboard else None
     
-    return LeaderboardResponse(
-        leaderboard_id=db_leaderboard.leaderboard_id,
-        name=db_leaderboard.name,
-        description=db_leaderboard.description,
-        course_id=db_leaderboard.course_id,
-        metric_type=db_leaderboard.metric_type,
-        timeframe=db_leaderboard.timeframe,
-        is_active=db_leaderboard.is_active,
-        created_at=db_leaderboard.created_at,
-        last_updated=db_leaderboard.last_updated,
-        entries=entries
-    )
+    response = await db.run_sync(load)
+    if not response:
+        raise HTTPException(status_code=404, detail="Leaderboard not found")
+    return response
 
 @router.get("/", response_model=List[LeaderboardResponse])
 async def get_leaderboards_list(
@@ -105,7 +137,7 @@ async def get_leaderboards_list(
     is_active: Optional[bool] = Query(True, description="Filter by active status"),
     limit: int = Query(50, description="Maximum number of results"),
     offset: int = Query(0, description="Number of results to skip"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get list of leaderboards with filtering options"""
@@ -118,42 +150,10 @@ async def get_leaderboards_list(
         offset=offset
     )
     
-    leaderboards = get_leaderboards(db, filters)
-    
     # Convert to response format
-    responses = []
-    for leaderboard in leaderboards:
-        entries = []
-        for entry in leaderboard.entries:
-            entry_response = LeaderboardEntryResponse(
-                entry_id=entry.entry_id,
-                leaderboard_id=entry.leaderboard_id,
-                user_id=entry.user_id,
-                score=entry.score,
-                rank=entry.rank,
-                last_updated=entry.last_updated,
-                username=entry.user.username if entry.user else None,
-                first_name=entry.user.first_name if entry.user else None,
-                last_name=entry.user.last_name if entry.user else None,
-                profile_image_url=entry.user.profile_image_url if entry.user else None
-            )
-            entries.append(entry_response)
-        
-        response = LeaderboardResponse(
-            leaderboard_id=leaderboard.leaderboard_id,
-            name=leaderboard.name,
-            description=leaderboard.description,
-            course_id=leaderboard.course_id,
-            metric_type=leaderboard.metric_type,
-            timeframe=leaderboard.timeframe,
-            is_active=leaderboard.is_active,
-            created_at=leaderboard.created_at,
-            last_updated=leaderboard.last_updated,
-            entries=entries
-        )
-        responses.append(response)
-    
-    return responses
+    return await db.run_sync(
+        lambda session: [leaderboard_response(leaderboard) for leaderboard in get_leaderboards(session, filters)]
+    )
 
 @router.put("/{leaderboard_id}", response_model=LeaderboardResponse)
 async def update_leaderboard_by_id(
@@ -196,18 +196,31 @@ async def refresh_leaderboard_rankings(
         logger.error(f"Error refreshing leaderboard {leaderboard_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to refresh leaderboard")
 
+@router.get("/{leaderboard_id}/rank/{user_id}")
+async def get_user_rank(
+    leaderboard_id: int,
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get a user's current rank on a leaderboard"""
+    rank = await db.run_sync(leaderboard_ranking.rank_of, leaderboard_id, user_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User is not ranked on this leaderboard")
+    return {"leaderboard_id": leaderboard_id, "user_id": user_id, **rank}
+
 
 # Top Students Routes
 @router.get("/top-students/global", response_model=List[TopStudentResponse])
 async def get_global_leaderboard(
     limit: int = Query(20, description="Number of top students to return"),
     timeframe: str = Query("all_time", description="Leaderboard time frame: daily, weekly, monthly, all_time"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get global top students across all courses, filtered by time frame"""
     try:
-        top_students = get_global_top_students(db, limit, timeframe)
+        top_students = await db.run_sync(get_global_top_students, limit, timeframe)
         result = [TopStudentResponse(**student) for student in top_students]
         return result
     except Exception as e:
@@ -219,12 +232,12 @@ async def get_course_leaderboard(
     course_id: int,
     limit: int = Query(10, description="Number of top students to return"),
     timeframe: str = Query("all_time", description="Leaderboard time frame: daily, weekly, monthly, all_time"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get top students for a specific course, filtered by time frame"""
     try:
-        top_students = get_top_students_by_course(db, course_id, limit, timeframe)
+        top_students = await db.run_sync(get_top_students_by_course, course_id, limit, timeframe)
         return [TopStudentResponse(**student) for student in top_students]
     except Exception as e:
         logger.error(f"Error fetching course leaderboard for course {course_id}: {e}")
@@ -234,56 +247,63 @@ async def get_course_leaderboard(
 @router.get("/course/{course_id}/summary", response_model=CourseLeaderboardResponse)
 async def get_course_leaderboard_summary(
     course_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get course leaderboard summary with top students and available leaderboards"""
     try:
-        # Get course information
-        from app.models.course import Course
-        course = db.query(Course).filter(Course.course_id == course_id).first()
-        if not course:
+        response = await db.run_sync(course_leaderboard_summary, course_id)
+        if not response:
             raise HTTPException(status_code=404, detail="Course not found")
-        
-        # Get course leaderboards
-        filters = LeaderboardFilter(course_id=course_id, is_active=True)
-        leaderboards = get_leaderboards(db, filters)
-        
-        leaderboard_summaries = []
-        for lb in leaderboards:
-            summary = LeaderboardSummary(
-                leaderboard_id=lb.leaderboard_id,
-                name=lb.name,
-                metric_type=lb.metric_type,
-                timeframe=lb.timeframe,
-                total_participants=len(lb.entries),
-                top_score=lb.entries[0].score if lb.entries else None,
-                last_updated=lb.last_updated
-            )
-            leaderboard_summaries.append(summary)
-        
-        # Get top students
-        top_students = get_top_students_by_course(db, course_id, 10)
-        top_student_responses = [TopStudentResponse(**student) for student in top_students]
-        
-        return CourseLeaderboardResponse(
-            course_id=course_id,
-            course_name=course.title,
-            leaderboards=leaderboard_summaries,
-            top_students=top_student_responses
-        )
+        return response
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error fetching course leaderboard summary for course {course_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch course summary")
 
+def course_leaderboard_summary(db: Session, course_id: int) -> Optional[CourseLeaderboardResponse]:
+    """Top students and active leaderboards of a course, or None if the course does not exist"""
+    # Get course information
+    from app.models.course import Course
+    course = db.query(Course).filter(Course.course_id == course_id).first()
+    if not course:
+        return None
+    
+    # Get course leaderboards
+    filters = LeaderboardFilter(course_id=course_id, is_active=True)
+    leaderboards = get_leaderboards(db, filters)
+    
+    leaderboard_summaries = []
+    for lb in leaderboards:
+        summary = LeaderboardSummary(
+            leaderboard_id=lb.leaderboard_id,
+            name=lb.name,
+            metric_type=lb.metric_type,
+            timeframe=lb.timeframe,
+            total_participants=len(lb.entries),
+            top_score=lb.entries[0].score if lb.entries else None,
+            last_updated=lb.last_updated
+        )
+        leaderboard_summaries.append(summary)
+    
+    # Get top students
+    top_students = get_top_students_by_course(db, course_id, 10)
+    top_student_responses = [TopStudentResponse(**student) for student in top_students]
+    
+    return CourseLeaderboardResponse(
+        course_id=course_id,
+        course_name=course.title,
+        leaderboards=leaderboard_summaries,
+        top_students=top_student_responses
+    )
+
 # Student Progress Routes
 @router.get("/progress/user/{user_id}/course/{course_id}", response_model=StudentProgressResponse)
 async def get_user_progress(
     user_id: int,
     course_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get student progress for a specific user and course"""
@@ -291,33 +311,21 @@ async def get_user_progress(
     if current_user.role not in ["admin", "teacher"] and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to view this progress")
     
-    progress = get_student_progress(db, user_id, course_id)
-    if not progress:
-        raise HTTPException(status_code=404, detail="Student progress not found")
+    def load(session: Session) -> Optional[StudentProgressResponse]:
+        progress = get_student_progress(session, user_id, course_id)
+        return progress_response(progress) if progress else None
     
-    return StudentProgressResponse(
-        progress_id=progress.progress_id,
-        user_id=progress.user_id,
-        course_id=progress.course_id,
-        total_exp=progress.total_exp,
-        quests_completed=progress.quests_completed,
-        badges_earned=progress.badges_earned,
-        engagement_score=progress.engagement_score,
-        study_hours=progress.study_hours,
-        last_activity=progress.last_activity,
-        streak_days=progress.streak_days,
-        last_updated=progress.last_updated,
-        username=progress.user.username if progress.user else None,
-        first_name=progress.user.first_name if progress.user else None,
-        last_name=progress.user.last_name if progress.user else None
-    )
+    response = await db.run_sync(load)
+    if not response:
+        raise HTTPException(status_code=404, detail="Student progress not found")
+    return response
 
 @router.get("/progress/course/{course_id}", response_model=List[StudentProgressResponse])
 async def get_course_progress(
     course_id: int,
     limit: int = Query(50, description="Maximum number of results"),
     offset: int = Query(0, description="Number of results to skip"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_role_required(["admin", "teacher"]))
 ):
     """Get all student progress for a specific course (Admin/Teacher only)"""
@@ -327,29 +335,9 @@ async def get_course_progress(
         offset=offset
     )
     
-    progress_list = get_students_progress(db, filters)
-    
-    responses = []
-    for progress in progress_list:
-        response = StudentProgressResponse(
-            progress_id=progress.progress_id,
-            user_id=progress.user_id,
-            course_id=progress.course_id,
-            total_exp=progress.total_exp,
-            quests_completed=progress.quests_completed,
-            badges_earned=progress.badges_earned,
-            engagement_score=progress.engagement_score,
-            study_hours=progress.study_hours,
-            last_activity=progress.last_activity,
-            streak_days=progress.streak_days,
-            last_updated=progress.last_updated,
-            username=progress.user.username if progress.user else None,
-            first_name=progress.user.first_name if progress.user else None,
-            last_name=progress.user.last_name if progress.user else None
-        )
-        responses.append(response)
-    
-    return responses
+    return await db.run_sync(
+        lambda session: [progress_response(progress) for progress in get_students_progress(session, filters)]
+    )
 
 @router.post("/progress", response_model=StudentProgressResponse)
 async def create_or_update_progress(
@@ -360,22 +348,7 @@ async def create_or_update_progress(
     """Create or update student progress (Admin/Teacher only)"""
     try:
         db_progress = create_or_update_student_progress(db, progress)
-        return StudentProgressResponse(
-            progress_id=db_progress.progress_id,
-            user_id=db_progress.user_id,
-            course_id=db_progress.course_id,
-            total_exp=db_progress.total_exp,
-            quests_completed=db_progress.quests_completed,
-            badges_earned=db_progress.badges_earned,
-            engagement_score=db_progress.engagement_score,
-            study_hours=db_progress.study_hours,
-            last_activity=db_progress.last_activity,
-            streak_days=db_progress.streak_days,
-            last_updated=db_progress.last_updated,
-            username=db_progress.user.username if db_progress.user else None,
-            first_name=db_progress.user.first_name if db_progress.user else None,
-            last_name=db_progress.user.last_name if db_progress.user else None
-        )
+        return progress_response(db_progress)
     except Exception as e:
         logger.error(f"Error creating/updating student progress: {e}")
         raise HTTPException(status_code=500, detail="Failed to create/update progress")
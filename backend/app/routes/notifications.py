@@ -2,83 +2,119 @@
 import asyncio
 import json
 import logging
-from typing import AsyncGenerator
-from fastapi import APIRouter, Depends, HTTPException, Request
+import os
+import re
+from typing import Any, AsyncGenerator, Dict, NamedTuple, Optional, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 
-from app.database.connection import get_db
+from app.database.connection import AsyncSessionLocal, SessionLocal
+from app.models.course import Course
+from app.models.enrollment import CourseEnrollment
 from app.models.user import User
-from app.services.notification_service import notification_service, NotificationData
+from app.services.notification_service import (
+    notification_service,
+    NotificationData,
+    sse_frame,
+    NOTIFICATIONS_CHANNEL,
+    ChannelFrame,
+    HeartbeatFrame,
+    ConnectionQueue
+)
+from app.services.notification_log import notification_log
+from app.services.notification_dispatcher import notification_dispatcher
 from app.auth.dependencies import get_current_user_optional
+from app.utils.auth import authenticate_token
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+# Channels a WebSocket connection can subscribe to
+CHANNEL_PATTERN = re.compile(r"^(notifications|leaderboard:(\d+|global)|quest_analytics:\d+)$")
+WS_MAX_SUBSCRIPTIONS = int(os.getenv("WS_MAX_SUBSCRIPTIONS", 20))
+# Time a client without a token query parameter has to send {"op": "auth", "token": ...}
+WS_AUTH_TIMEOUT_SECONDS = float(os.getenv("WS_AUTH_TIMEOUT_SECONDS", 10))
+# Compact frames sent to WebSocket clients without serializing anything
+WS_HEARTBEAT = '{"op":"heartbeat"}'
+
 @router.get("/events/{user_id}")
 async def stream_notifications(
     user_id: int,
-    current_user: User = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    last_event_id_param: Optional[str] = Query(None, alias="last_event_id"),
+    current_user: User = Depends(get_current_user_optional)
 ):
     """
     Server-Sent Events endpoint for real-time notifications.
     
     This endpoint establishes a persistent connection to stream real-time
     notifications to the frontend when users complete quizzes or other activities.
+    Events carry the ID of their notification log entry; a client that
+    reconnects with Last-Event-ID (sent by EventSource automatically, or as
+    the last_event_id query parameter) first receives what it missed.
+    
+    The user is resolved in a short-lived session that is closed before
+    streaming starts, so an open stream holds no pooled database connection.
     """
     
     # Verify user exists and has permission to receive notifications
-    # Try to find user by internal ID first, then by moodle_user_id
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        # Fallback to moodle_user_id for backward compatibility
-        user = db.query(User).filter(User.moodle_user_id == user_id).first()
-    
-    if not user:
+    local_user_id = await resolve_stream_user_id(user_id)
+    if local_user_id is None:
         raise HTTPException(status_code=404, detail="User not found")
     
+    last_event_id = parse_last_event_id(last_event_id_header or last_event_id_param)
+    
     # For now, allow any user to connect (could add authorization checks here)
-    # if current_user and current_user.id != user.id:
+    # if current_user and current_user.id != local_user_id:
     #     raise HTTPException(status_code=403, detail="Access denied")
 
     async def event_generator() -> AsyncGenerator[str, None]:
         """Generate Server-Sent Events for the client"""
         
         # Connect user to notification service
-        queue = await notification_service.connect_user(user.id)
+        queue = await notification_service.connect_user(local_user_id)
         
         try:
             # Send initial connection event
             yield f"data: {json.dumps({'type': 'connected', 'message': 'SSE connection established'})}\n\n"
             
-            # Keep connection alive and send notifications
+            # Replay what the client missed; the queue already collects newer notifications
+            replayed_until = last_event_id or 0
+            if last_event_id is not None:
+                for missed in await asyncio.to_thread(notification_log.replay, local_user_id, last_event_id):
+                    replayed_until = max(replayed_until, missed["event_id"])
+                    yield sse_frame(missed)
+            
+            # Keep connection alive and send notifications; the shared
+            # heartbeat wheel queues heartbeats while the stream is idle
             while True:
                 try:
-                    # Wait for notification with timeout to send heartbeat
-                    notification = await asyncio.wait_for(queue.get(), timeout=30.0)
+                    notification = await queue.get()
+                    if notification is None:
+                        # Evicted as a slow or dead consumer; the browser reconnects
+                        break
+                    if isinstance(notification, str):
+                        # Pre-serialized frame, such as a heartbeat
+                        yield notification
+                        continue
                     
-                    # Send the notification as SSE data
-                    event_data = json.dumps(notification)
-                    yield f"data: {event_data}\n\n"
+                    # Skip notifications already sent by the replay
+                    event_id = notification.get("event_id")
+                    if event_id is not None and event_id <= replayed_until:
+                        continue
                     
-                except asyncio.TimeoutError:
-                    # Send heartbeat to keep connection alive
-                    heartbeat = {
-                        "type": "heartbeat",
-                        "timestamp": notification_service.active_connections and 
-                                   len(notification_service.active_connections) or 0
-                    }
-                    yield f"data: {json.dumps(heartbeat)}\n\n"
+                    # Send the notification as SSE data
+                    yield sse_frame(notification)
                     
                 except asyncio.CancelledError:
                     # Client disconnected
-                    logger.info(f"SSE connection cancelled for user {user.id}")
+                    logger.info(f"SSE connection cancelled for user {local_user_id}")
                     break
                     
                 except Exception as e:
-                    logger.error(f"Error in SSE event generator for user {user.id}: {e}")
+                    logger.error(f"Error in SSE event generator for user {local_user_id}: {e}")
                     error_event = {
                         "type": "error",
                         "message": "An error occurred in the notification stream"
@@ -87,11 +123,11 @@ async def stream_notifications(
                     break
                     
         except Exception as e:
-            logger.error(f"Fatal error in SSE connection for user {user.id}: {e}")
+            logger.error(f"Fatal error in SSE connection for user {local_user_id}: {e}")
         finally:
             # Clean up connection
-            await notification_service.disconnect_user(user.id, queue)
-            logger.info(f"SSE connection closed for user {user.id}")
+            await notification_service.disconnect_user(local_user_id, queue)
+            logger.info(f"SSE connection closed for user {local_user_id}")
 
     return StreamingResponse(
         event_generator(), 
@@ -105,11 +141,173 @@ async def stream_notifications(
         }
     )
 
+class SocketUser(NamedTuple):
+    id: int
+    role: str
+
+@router.websocket("/ws/{user_id}")
+async def notification_socket(websocket: WebSocket, user_id: int, token: Optional[str] = Query(None)):
+    """
+    WebSocket endpoint multiplexing several real-time channels over one connection.
+    
+    The client authenticates with its access token, as the ``token`` query
+    parameter or as a first message ``{"op": "auth", "token": "<token>"}``;
+    the connection is closed with 1008 unless the token belongs to the user.
+    It then sends ``{"op": "sub", "c": "<channel>"}`` and
+    ``{"op": "unsub", "c": "<channel>"}``; the server answers
+    ``{"op": "subscribed" | "unsubscribed" | "error", ...}`` and sends channel
+    messages as ``{"c": "<channel>", "d": <data>}``. Channels:
+    
+    - ``notifications``: the user's notifications, as on the SSE stream
+    - ``leaderboard:<course_id>``: top entries of a changed leaderboard, for the
+      course's students and teacher; ``leaderboard:global`` for everyone
+    - ``quest_analytics:<course_id>``: quest progress changes of the course's
+      students, for its teacher and admins
+    
+    Notifications are not replayed on reconnect; clients that need replay use the SSE stream.
+    """
+    local_user_id = await resolve_stream_user_id(user_id)
+    if local_user_id is None:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    
+    if token is None:
+        token = await receive_auth_token(websocket)
+    user = await asyncio.to_thread(authenticate_socket, token) if token else None
+    if user is None or user.id != local_user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    queue = notification_service.open_connection(local_user_id)
+    receiver = asyncio.create_task(receive_socket_commands(websocket, queue, user))
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                # The client left, or the connection was evicted as a slow or dead consumer
+                break
+            await websocket.send_text(socket_frame(item))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in WebSocket connection for user {local_user_id}: {e}")
+    finally:
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+        await notification_service.disconnect_user(local_user_id, queue)
+        logger.info(f"WebSocket connection closed for user {local_user_id}")
+
+async def receive_auth_token(websocket: WebSocket) -> Optional[str]:
+    """Token of the client's first message, if it is an auth command sent in time"""
+    try:
+        command = json.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT_SECONDS))
+    except (asyncio.TimeoutError, WebSocketDisconnect, ValueError):
+        return None
+    if not isinstance(command, dict) or command.get("op") != "auth" or not isinstance(command.get("token"), str):
+        return None
+    return command["token"]
+
+def authenticate_socket(token: str) -> Optional[SocketUser]:
+    """The user of an access token, validated like the HTTP routes' bearer tokens"""
+    with SessionLocal() as db:
+        try:
+            user = authenticate_token(db, token)
+        except HTTPException:
+            return None
+        if not user.is_active:
+            return None
+        return SocketUser(user.id, user.role)
+
+async def may_subscribe(user: SocketUser, channel: str) -> bool:
+    """Whether a user may receive a channel's messages"""
+    kind, _, course_id = channel.partition(":")
+    if kind == "notifications" or channel == "leaderboard:global" or user.role == "admin":
+        return True
+    async with AsyncSessionLocal() as db:
+        teacher_id = await db.scalar(select(Course.teacher_id).where(Course.id == int(course_id)))
+        if teacher_id is not None and teacher_id == user.id:
+            return True
+        if kind != "leaderboard":
+            return False
+        enrollment = await db.scalar(select(CourseEnrollment.id).where(
+            CourseEnrollment.user_id == user.id,
+            CourseEnrollment.course_id == int(course_id)
+        ).limit(1))
+        return enrollment is not None
+
+async def receive_socket_commands(websocket: WebSocket, queue: ConnectionQueue, user: SocketUser):
+    """Apply the client's subscribe/unsubscribe commands until it disconnects"""
+    try:
+        while True:
+            try:
+                command = json.loads(await websocket.receive_text())
+                op, channel = command.get("op"), command.get("c")
+            except (ValueError, AttributeError):
+                reply(queue, "error", message="Invalid command")
+                continue
+            
+            if op == "ping":
+                reply(queue, "pong")
+            elif not isinstance(channel, str) or not CHANNEL_PATTERN.match(channel):
+                reply(queue, "error", c=channel, message="Unknown channel")
+            elif op == "sub":
+                if channel not in queue.channels and len(queue.channels) >= WS_MAX_SUBSCRIPTIONS:
+                    reply(queue, "error", c=channel, message="Too many subscriptions")
+                    continue
+                if not await may_subscribe(user, channel):
+                    reply(queue, "error", c=channel, message="Not allowed")
+                    continue
+                notification_service.subscribe(channel, queue)
+                reply(queue, "subscribed", c=channel)
+            elif op == "unsub":
+                notification_service.unsubscribe(channel, queue)
+                reply(queue, "unsubscribed", c=channel)
+            else:
+                reply(queue, "error", c=channel, message="Unknown op")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Ends the send loop
+        queue.close()
+
+def reply(queue: ConnectionQueue, op: str, **fields):
+    """Queue a control message, so only the send loop writes to the socket"""
+    queue.put(ChannelFrame(json.dumps({"op": op, **fields}, separators=(",", ":"))))
+
+def socket_frame(item: Union[Dict[str, Any], str]) -> str:
+    """WebSocket text of a queued notification, SSE frame or channel frame"""
+    if isinstance(item, ChannelFrame):
+        return item
+    if isinstance(item, HeartbeatFrame):
+        return WS_HEARTBEAT
+    if isinstance(item, str):
+        # Notification serialized once for SSE, such as a broadcast; reuse its data line
+        data = next(line[len("data: "):] for line in item.split("\n") if line.startswith("data: "))
+        return f'{{"c":"{NOTIFICATIONS_CHANNEL}","d":{data}}}'
+    return json.dumps({"c": NOTIFICATIONS_CHANNEL, "d": item}, separators=(",", ":"), default=str)
+
+async def resolve_stream_user_id(user_id: int) -> Optional[int]:
+    """Local ID of the user a stream is opened for, accepting a local or Moodle user ID"""
+    async with AsyncSessionLocal() as db:
+        # Try to find user by internal ID first, then by moodle_user_id
+        local_user_id = await db.scalar(select(User.id).where(User.id == user_id))
+        if local_user_id is None:
+            # Fallback to moodle_user_id for backward compatibility
+            local_user_id = await db.scalar(select(User.id).where(User.moodle_user_id == user_id))
+        return local_user_id
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Event ID a reconnecting client last received, if it sent a valid one"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
 @router.post("/test/{user_id}")
 async def test_notification(
     user_id: int,
-    request: Request,
-    db: Session = Depends(get_db)
+    request: Request
 ):
     """Test endpoint to send a notification to a specific user"""
     try:
@@ -148,5 +346,7 @@ async def get_notification_status():
     return {
         "active_connections": len(notification_service.active_connections),
         "connected_users": notification_service.get_connected_users(),
-        "service_status": "running"
+        "service_status": "running",
+        "metrics": notification_service.get_stats(),
+        "dispatcher": notification_dispatcher.get_stats()
     }
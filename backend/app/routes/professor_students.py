@@ -2,7 +2,7 @@ from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_
-from app.database.connection import get_db
+from app.database.connection import get_read_db
 from app.models.user import User as UserModel
 from app.models.course import Course as CourseModel
 from app.models.enrollment import CourseEnrollment
@@ -21,7 +21,7 @@ def get_professor_students(
     limit: int = Query(50, ge=1, le=100, description="Number of students per page"),
     course_id: Optional[int] = Query(None, description="Filter by specific course ID"),
     search: Optional[str] = Query(None, description="Search by student name or email"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get all students enrolled in courses handled by a specific professor.
@@ -223,7 +223,7 @@ def get_professor_students(
 @router.get("/students/{professor_id}/summary")
 def get_professor_students_summary(
     professor_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get a summary of students and courses for a professor.
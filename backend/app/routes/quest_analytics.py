@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 
-from app.database.connection import get_db
+from app.database.connection import get_read_db
 from app.auth.dependencies import get_current_user_optional
 from app.models.user import User
 from app.services.quest_engagement_service import QuestEngagementService
@@ -17,7 +17,7 @@ router = APIRouter(tags=["quest-analytics"])
 @router.get("/quest/{quest_id}")
 async def get_quest_analytics(
     quest_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get detailed analytics for a specific quest"""
     try:
@@ -39,7 +39,7 @@ async def get_quest_analytics(
 async def get_quest_timeseries(
     quest_id: int,
     days: int = Query(14, ge=1, le=90),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Daily active participants and completions for this quest."""
     try:
@@ -93,7 +93,7 @@ async def get_quest_timeseries(
 @router.get("/quest/{quest_id}/heatmap")
 async def get_quest_heatmap(
     quest_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Events count by hour (0-23) for this quest."""
     try:
@@ -118,7 +118,7 @@ async def get_quest_heatmap(
 @router.get("/quest/{quest_id}/tiers")
 async def get_quest_tiers(
     quest_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """High/Medium/Low engagement tier counts for this quest."""
     try:
@@ -139,7 +139,7 @@ async def get_quest_student_progress(
     quest_id: int,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get individual student progress for a quest"""
     try:
@@ -214,7 +214,7 @@ async def get_quest_student_progress(
 async def get_quest_engagement_events(
     quest_id: int,
     limit: int = Query(50, ge=1, le=200),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get recent engagement events for a quest"""
     try:
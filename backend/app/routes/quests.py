@@ -1,5 +1,5 @@
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, Body
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, and_
 from app.database.connection import get_db
@@ -10,6 +10,8 @@ from app.models.user import User as UserModel
 from app.models.enrollment import CourseEnrollment
 from app.services.badge_service import BadgeService
 from app.services.activity_log_service import log_activity
+from app.services.lookup_cache import lookup_cache
+from app.services.notification_service import notification_service, create_quest_notification
 from datetime import datetime
 import random
 from datetime import datetime, timedelta
@@ -22,7 +24,12 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=QuestSchema, status_code=status.HTTP_201_CREATED)
-def create_quest(quest: QuestCreate, creator_id: int = Query(..., description="ID of the user creating the quest"), db: Session = Depends(get_db)):
+def create_quest(
+    quest: QuestCreate,
+    background_tasks: BackgroundTasks,
+    creator_id: int = Query(..., description="ID of the user creating the quest"),
+    db: Session = Depends(get_db)
+):
     """
     Create a new quest with automatic XP assignment based on difficulty level.
     """
@@ -42,8 +49,20 @@ def create_quest(quest: QuestCreate, creator_id: int = Query(..., description="I
     db.add(db_quest)
     db.commit()
     db.refresh(db_quest)
+    lookup_cache.invalidate_quests(db_quest.course_id)
+    announce_new_quest(background_tasks, db_quest)
     return db_quest
 
+def announce_new_quest(background_tasks: BackgroundTasks, quest: Quest):
+    """Notify the students of the quest's course once the response is sent"""
+    if quest.is_active and quest.course_id:
+        background_tasks.add_task(
+            notification_service.broadcast,
+            create_quest_notification(user_id=None, quest_title=quest.title),
+            course_id=quest.course_id,
+            role="student"
+        )
+
 @router.get("/", response_model=List[QuestSchema])
 def get_quests(
     skip: int = 0, 
@@ -127,6 +146,7 @@ def update_quest(quest_id: int, quest: QuestUpdate, db: Session = Depends(get_db
         raise HTTPException(status_code=404, detail="Quest not found")
     
     quest_data = quest.model_dump(exclude_unset=True)
+    previous_course_id = db_quest.course_id
     
     # If difficulty level is being updated, recalculate XP
     if "difficulty_level" in quest_data:
@@ -143,6 +163,7 @@ def update_quest(quest_id: int, quest: QuestUpdate, db: Session = Depends(get_db
     
     db.commit()
     db.refresh(db_quest)
+    lookup_cache.invalidate_quests(previous_course_id, db_quest.course_id)
     return db_quest
 
 @router.delete("/{quest_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -151,8 +172,10 @@ def delete_quest(quest_id: int, db: Session = Depends(get_db)):
     if quest is None:
         raise HTTPException(status_code=404, detail="Quest not found")
     
+    course_id = quest.course_id
     db.delete(quest)
     db.commit()
+    lookup_cache.invalidate_quests(course_id)
 
 @router.post("/{quest_id}/complete")
 async def complete_quest(
@@ -396,6 +419,7 @@ async def get_courses(db: Session = Depends(get_db)):
 
 @router.post("/create-quest", status_code=201)
 def create_quest_from_frontend(
+    background_tasks: BackgroundTasks,
     payload: Dict[str, Any] = Body(...),
     db: Session = Depends(get_db)
 ):
@@ -455,6 +479,8 @@ def create_quest_from_frontend(
         db.add(db_quest)
         db.commit()
         db.refresh(db_quest)
+        lookup_cache.invalidate_quests(db_quest.course_id)
+        announce_new_quest(background_tasks, db_quest)
         
         return {
             "message": "Quest created successfully",
@@ -6,6 +6,10 @@ from the new modular structure.
 
 The original 1,702-line webhooks.py file has been refactored into:
 - webhooks/router.py - Main router and event dispatcher
+- webhooks/events.py - Event handler registry
+- webhooks/pipeline.py - Single-pass event pipeline shared by the router, batch and queue workers
+- webhooks/queue.py - Durable ingestion queue and background workers
+- webhooks/batch.py - Batched endpoint processing many events in one transaction
 - webhooks/utils.py - Common utilities and XP configuration
 - webhooks/handlers/ - Individual handler modules:
   - quiz_handlers.py - Quiz-related webhooks
@@ -2,7 +2,6 @@
 Base webhook processor to eliminate code duplication.
 """
 
-import asyncio
 import logging
 from datetime import datetime
 from sqlalchemy.orm import Session
@@ -11,10 +10,13 @@ from sqlalchemy.exc import IntegrityError
 from app.models.quest import Quest, QuestProgress, StudentProgress, ExperiencePoints
 from app.models.course import Course
 from app.models.user import User
-from app.services.notification_service import notification_service, create_xp_notification, create_quest_notification
+from app.services.notification_service import create_xp_notification, create_quest_notification
+from app.services.notification_dispatcher import notification_dispatcher
 from app.services.daily_quest_service import DailyQuestService
 from app.services.quest_engagement_service import QuestEngagementService
-from .utils import check_badges_after_quest_completion, XP_CONFIG
+from app.services.webhook_lookups import WebhookLookups
+from app.services.badge_evaluator import badge_evaluator
+from .utils import XP_CONFIG
 from .notification_manager import WebhookNotificationManager
 
 logger = logging.getLogger(__name__)
@@ -31,41 +33,45 @@ class WebhookProcessor:
         self.now = datetime.utcnow()
         self.notification_manager = WebhookNotificationManager(db)
         self.engagement_service = QuestEngagementService(db)
+        # Lookups shared with the handler and engagement tracker of this session
+        self.lookups = WebhookLookups.for_session(db)
     
     def find_course(self, moodle_course_id: int) -> Course:
         """Find course by Moodle course ID."""
-        course = self.db.query(Course).filter(Course.moodle_course_id == moodle_course_id).first()
+        course = self.lookups.course(moodle_course_id)
         if not course:
             raise ValueError(f"No local course found for moodle_course_id={moodle_course_id}")
         return course
     
     def find_user(self, moodle_user_id: int) -> User:
         """Find user by Moodle user ID."""
-        user = self.db.query(User).filter(User.moodle_user_id == moodle_user_id).first()
+        user = self.lookups.user(moodle_user_id)
         if not user:
             raise ValueError(f"No local user found for moodle_user_id={moodle_user_id}")
         return user
     
     def find_active_quest(self, course_id: int, moodle_activity_id: int) -> Quest:
         """Find active quest by course and activity ID."""
-        quest = self.db.query(Quest).filter(
-            Quest.course_id == course_id,
-            Quest.moodle_activity_id == moodle_activity_id,
-            Quest.is_active == True,
-            (Quest.start_date == None) | (Quest.start_date <= self.now),
-            (Quest.end_date == None) | (Quest.end_date >= self.now)
-        ).first()
-        return quest
+        return self.lookups.active_quest(course_id, moodle_activity_id, self.now)
     
     def get_or_create_quest_progress(self, user_id: int, quest_id: str) -> QuestProgress:
         """Get existing quest progress or create new one."""
-        qp = self.db.query(QuestProgress).filter_by(user_id=user_id, quest_id=quest_id).first()
+        qp = self.lookups.get_quest_progress(user_id, quest_id)
         if not qp:
             qp = QuestProgress(user_id=user_id, quest_id=quest_id, status="not_started", progress_percent=0)
             self.db.add(qp)
             self.db.commit()
-            self.db.refresh(qp)
+            self.lookups.add_quest_progress(qp)
         return qp
+
+    def get_student_progress(self, user_id: int, course_id: int) -> StudentProgress:
+        """Get the student's progress row for a course, if any."""
+        return self.lookups.get_student_progress(user_id, course_id)
+
+    def add_student_progress(self, sp: StudentProgress):
+        """Add a new progress row and make it visible to later lookups."""
+        self.db.add(sp)
+        self.lookups.add_student_progress(sp)
     
     def complete_quest(self, user_id: int, quest: Quest, additional_notes: str = ""):
         """
@@ -101,7 +107,7 @@ class WebhookProcessor:
         exp_reward = quest.exp_reward or 0
         
         # Update student progress
-        sp = self.db.query(StudentProgress).filter_by(user_id=user_id, course_id=course_id).first()
+        sp = self.get_student_progress(user_id, course_id)
         if sp:
             sp.total_exp += exp_reward
             sp.quests_completed += 1
@@ -114,7 +120,7 @@ class WebhookProcessor:
                 quests_completed=1,
                 last_activity=self.now
             )
-            self.db.add(sp)
+            self.add_student_progress(sp)
         
         # Record experience points
         ep = ExperiencePoints(
@@ -161,7 +167,7 @@ class WebhookProcessor:
                 return False
         
         # Update student progress
-        sp = self.db.query(StudentProgress).filter_by(user_id=user_id, course_id=course_id).first()
+        sp = self.get_student_progress(user_id, course_id)
         if sp:
             sp.total_exp += amount
             sp.last_activity = self.now
@@ -173,7 +179,7 @@ class WebhookProcessor:
                 quests_completed=0,
                 last_activity=self.now
             )
-            self.db.add(sp)
+            self.add_student_progress(sp)
         
         # Record experience points
         ep = ExperiencePoints(
@@ -194,42 +200,38 @@ class WebhookProcessor:
         """Send notifications for engagement XP (non-quest activities)."""
         try:
             # Use the enhanced notification manager
-            asyncio.create_task(
-                self.notification_manager.send_engagement_xp_notification(
-                    user_id=user_id,
-                    xp_amount=xp_amount,
-                    activity_title=activity_title,
-                    source_type=source_type,
-                    course_id=course_id
-                )
+            self.notification_manager.send_engagement_xp_notification(
+                user_id=user_id,
+                xp_amount=xp_amount,
+                activity_title=activity_title,
+                source_type=source_type,
+                course_id=course_id
             )
-            logger.info(f"Engagement XP notification task created for user {user_id}")
+            logger.info(f"Engagement XP notification dispatched for user {user_id}")
             
         except Exception as notification_error:
-            logger.error(f"Failed to create engagement XP notification task for user {user_id}: {notification_error}")
+            logger.error(f"Failed to dispatch engagement XP notification for user {user_id}: {notification_error}")
     
     def send_quest_completion_notifications(self, user_id: int, course_id: int, quest: Quest, exp_reward: int):
         """Send notifications for quest completion using enhanced notification manager."""
         try:
             # Use the enhanced notification manager for better reliability
-            asyncio.create_task(
-                self.notification_manager.send_quest_completion_notification(
-                    user_id=user_id,
-                    quest=quest,
-                    exp_reward=exp_reward,
-                    course_id=course_id
-                )
+            self.notification_manager.send_quest_completion_notification(
+                user_id=user_id,
+                quest=quest,
+                exp_reward=exp_reward,
+                course_id=course_id
             )
-            logger.info(f"Quest completion notification task created for user {user_id}")
+            logger.info(f"Quest completion notification dispatched for user {user_id}")
             
         except Exception as notification_error:
             # Don't fail the main operation if notification fails
-            logger.error(f"Failed to create quest completion notification task for user {user_id}: {notification_error}")
+            logger.error(f"Failed to dispatch quest completion notification for user {user_id}: {notification_error}")
             
             # Fallback to original notification method
             try:
                 # Get updated student progress for total XP
-                updated_sp = self.db.query(StudentProgress).filter_by(user_id=user_id, course_id=course_id).first()
+                updated_sp = self.get_student_progress(user_id, course_id)
                 total_xp = updated_sp.total_exp if updated_sp else exp_reward
                 
                 # Create and send XP notification
@@ -242,7 +244,7 @@ class WebhookProcessor:
                 )
                 
                 # Send XP notification asynchronously (non-blocking)
-                asyncio.create_task(notification_service.send_notification(notification))
+                notification_dispatcher.dispatch(notification, self.db)
                 logger.info(f"Fallback XP notification sent to user {user_id} for quest completion")
                 
             except Exception as fallback_error:
@@ -258,7 +260,7 @@ class WebhookProcessor:
             if result.get("success") and result.get("xp_awarded", 0) > 0:
                 try:
                     # Get updated student progress for total XP
-                    updated_sp = self.db.query(StudentProgress).filter_by(user_id=user_id, course_id=course_id).first()
+                    updated_sp = self.get_student_progress(user_id, course_id)
                     total_xp = updated_sp.total_exp if updated_sp else xp_amount
                     
                     # Create and send XP reward notification for daily quest completion
@@ -271,7 +273,7 @@ class WebhookProcessor:
                     )
                     
                     # Send XP reward notification asynchronously (non-blocking)
-                    asyncio.create_task(notification_service.send_notification(daily_quest_notification))
+                    notification_dispatcher.dispatch(daily_quest_notification, self.db)
                     logger.info(f"Daily quest XP reward notification sent to user {user_id}")
                     
                 except Exception as notification_error:
@@ -350,7 +352,7 @@ class WebhookProcessor:
                 self.commit_changes_safely(f"Successfully processed {source_type} quest completion for user {user.id}, quest {quest.quest_id}")
                 
                 # Send notifications and check badges
-                check_badges_after_quest_completion(user.id, self.db)
+                badge_evaluator.signal(user.id, self.db)
                 self.send_quest_completion_notifications(user.id, course.id, quest, exp_reward)
                 self.update_daily_quest_progress(user.id, course.id, exp_reward)
                 
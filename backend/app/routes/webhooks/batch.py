@@ -0,0 +1,183 @@
+"""
+Batched webhook endpoint.
+
+Processes many Moodle events in one request and one database transaction.
+Courses, users, quests and progress rows referenced by the whole batch are
+resolved up front with a few IN (...) queries and shared by every handler.
+
+What a batch saves over one request per event: the HTTP round trips, one
+pooled connection and transaction instead of one per event (a single commit
+and WAL flush), and the per-event course, user, quest and progress lookups.
+What it does not save: each item still runs its event's handler, so the XP
+inserts and progress upserts are issued per item, plus a SAVEPOINT and a
+RELEASE per item. Those writes are not merged into set-based statements on
+purpose: items are handled in order and later items read what earlier ones
+wrote (duplicate XP checks, quest progress towards completion, streaks), and
+each item must be rolled back on its own when it fails, so one bad event
+does not fail or replay the rest of the batch.
+"""
+
+import logging
+import os
+from typing import List, Tuple
+
+from fastapi import APIRouter, HTTPException
+from sqlalchemy.orm import Session
+
+from app.database import after_commit
+from app.database.connection import AsyncSessionLocal
+from app.schemas.webhook import WebhookBatchItem, WebhookBatchItemResult
+from app.services.idempotency import webhook_idempotency
+from app.services.webhook_lookups import WebhookLookups
+from .events import EVENT_HANDLERS
+from .pipeline import event_unit_of_work, run_pipeline
+from .queue import webhook_queue
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BATCH_MAX_ITEMS = int(os.getenv("WEBHOOK_BATCH_MAX_ITEMS", 500))
+
+router = APIRouter(tags=["webhooks"])
+
+
+def _idempotency_key(item: WebhookBatchItem) -> str:
+    return webhook_idempotency.derive_key(item.event_path, item.payload, item.idempotency_key)
+
+
+async def _process_batch(items: List[WebhookBatchItem], results: List[WebhookBatchItemResult]) -> int:
+    """
+    Dispatch accepted items inside a single outer transaction.
+
+    The session joins the connection's transaction in "create_savepoint" mode,
+    so the commits the handlers issue only release savepoints. Each item also
+    runs inside its own savepoint, so a failing item is rolled back without
+    affecting the rest of the batch. The batch is committed once at the end.
+
+    Returns:
+        int: Number of items processed successfully
+    """
+    accepted = [(result, item) for result, item in zip(results, items) if result.status == "pending"]
+    if not accepted:
+        return 0
+
+    claimed_keys = []
+    async with event_unit_of_work() as db:
+        processed = await db.run_sync(_run_batch, accepted, claimed_keys)
+    for key in claimed_keys:
+        webhook_idempotency.remember(key)
+
+    return processed
+
+
+def _run_batch(
+    db: Session,
+    accepted: List[Tuple[WebhookBatchItemResult, WebhookBatchItem]],
+    claimed_keys: List[str]
+) -> int:
+    """Run the accepted items on the sync side of the batch's async session"""
+    processed = 0
+    connection = db.connection()
+    lookups = WebhookLookups(db).attach()
+    try:
+        lookups.preload(item.payload for _, item in accepted)
+
+        for result, item in accepted:
+            # Release any open session savepoint so the item savepoint encloses
+            # everything the handlers do for this item
+            db.commit()
+            item_savepoint = connection.begin_nested()
+            item_callbacks = after_commit.mark(db)
+            try:
+                # The claim is part of the item savepoint, so a failed item can be retried
+                key = _idempotency_key(item)
+                if not webhook_idempotency.claim(db, key, item.event_path, commit=False):
+                    db.commit()
+                    item_savepoint.commit()
+                    result.status = "duplicate"
+                    result.message = "Duplicate webhook event ignored"
+                    continue
+
+                result.message = run_pipeline(item.event_path, item.payload, db).message
+                db.commit()
+                item_savepoint.commit()
+                result.status = "processed"
+                claimed_keys.append(key)
+                processed += 1
+            except Exception as e:
+                db.rollback()
+                item_savepoint.rollback()
+                after_commit.discard_since(db, item_callbacks)
+                lookups.discard_progress()
+                result.status = "failed"
+                result.error = str(e)
+                logger.error("❌ Error processing batched webhook %s #%d: %s", item.event_path, result.index, str(e))
+    finally:
+        lookups.detach()
+
+    return processed
+
+
+def _queue_batch(db: Session, accepted: List[Tuple[WebhookBatchItemResult, WebhookBatchItem]]):
+    """Claim the accepted items and queue the new ones, committing claims and rows together"""
+    new_events, claimed_keys = [], []
+    for result, item in accepted:
+        key = _idempotency_key(item)
+        if webhook_idempotency.claim(db, key, item.event_path, commit=False):
+            new_events.append((result, item))
+            claimed_keys.append(key)
+        else:
+            result.status = "duplicate"
+            result.message = "Duplicate webhook event ignored"
+    queue_ids = webhook_queue.enqueue_many(db, [(item.event_path, item.payload) for _, item in new_events])
+    return new_events, claimed_keys, queue_ids
+
+
+@router.post("/batch", response_model=List[WebhookBatchItemResult])
+async def handle_webhook_batch(items: List[WebhookBatchItem]):
+    """
+    Process an array of ``{event_path, payload}`` Moodle events in one transaction.
+
+    Args:
+        items: Events to process, in order
+
+    Returns:
+        list: One result per item with status "processed", "queued", "rejected" or "failed"
+
+    Raises:
+        HTTPException: If the batch is larger than WEBHOOK_BATCH_MAX_ITEMS or cannot be committed
+    """
+    if len(items) > WEBHOOK_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(items)} items (max {WEBHOOK_BATCH_MAX_ITEMS})"
+        )
+
+    results = []
+    for index, item in enumerate(items):
+        if item.event_path in EVENT_HANDLERS:
+            results.append(WebhookBatchItemResult(index=index, event_path=item.event_path, status="pending"))
+        else:
+            results.append(WebhookBatchItemResult(
+                index=index, event_path=item.event_path, status="rejected", error="Unknown webhook event path"
+            ))
+
+    try:
+        if webhook_queue.enabled:
+            accepted = [(result, item) for result, item in zip(results, items) if result.status == "pending"]
+            if accepted:
+                async with AsyncSessionLocal() as db:
+                    new_events, claimed_keys, queue_ids = await db.run_sync(_queue_batch, accepted)
+                for key in claimed_keys:
+                    webhook_idempotency.remember(key)
+                for (result, _), queue_id in zip(new_events, queue_ids):
+                    result.status = "queued"
+                    result.message = f"queue_id={queue_id}"
+            return results
+
+        processed = await _process_batch(items, results)
+        logger.info(f"📨 Processed webhook batch: {processed}/{len(items)} events succeeded")
+    except Exception as e:
+        logger.error("❌ Error processing webhook batch: %s", str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to process webhook batch: {str(e)}")
+
+    return results
@@ -68,7 +68,7 @@ async def test_webhook_notification(
         # Create test notification using notification manager
         notification_manager = WebhookNotificationManager(db)
         
-        success = await notification_manager.send_engagement_xp_notification(
+        success = notification_manager.send_engagement_xp_notification(
             user_id=user_id,
             xp_amount=25,
             activity_title="Webhook Test Activity",
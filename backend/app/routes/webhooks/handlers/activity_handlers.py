@@ -2,7 +2,6 @@
 General activity-related webhook handlers.
 """
 
-import asyncio
 import logging
 from datetime import datetime
 from sqlalchemy.orm import Session
@@ -11,9 +10,12 @@ from sqlalchemy.exc import IntegrityError
 from app.models.quest import Quest, QuestProgress, StudentProgress, ExperiencePoints
 from app.models.course import Course
 from app.models.user import User
-from app.services.notification_service import notification_service, create_xp_notification, create_quest_notification
+from app.services.notification_service import create_xp_notification, create_quest_notification
+from app.services.notification_dispatcher import notification_dispatcher
 from app.services.daily_quest_service import DailyQuestService
-from ..utils import check_badges_after_quest_completion, XP_CONFIG
+from app.services.webhook_lookups import WebhookLookups
+from app.services.badge_evaluator import badge_evaluator
+from ..utils import XP_CONFIG
 
 logger = logging.getLogger(__name__)
 
@@ -45,15 +47,17 @@ def handle_course_completion_updated(data: dict, db: Session):
         logger.debug(f"Ignoring non-completion state {completion_state} for activity {moodle_activity_id}")
         return
 
+    lookups = WebhookLookups.for_session(db)
+
     # Find the course
-    course = db.query(Course).filter(Course.moodle_course_id == moodle_course_id).first()
+    course = lookups.course(moodle_course_id)
     if not course:
         logger.error(f"No local course found for moodle_course_id={moodle_course_id}")
         return
     course_id = course.id
 
     # Find the user
-    user = db.query(User).filter(User.moodle_user_id == moodle_user_id).first()
+    user = lookups.user(moodle_user_id)
     if not user:
         logger.error(f"No local user found for moodle_user_id={moodle_user_id}")
         return
@@ -61,23 +65,17 @@ def handle_course_completion_updated(data: dict, db: Session):
 
 
     # Check if this activity is mapped to a quest
-    quest = db.query(Quest).filter(
-        Quest.course_id == course_id,
-        Quest.moodle_activity_id == moodle_activity_id,
-        Quest.is_active == True,
-        (Quest.start_date == None) | (Quest.start_date <= datetime.utcnow()),
-        (Quest.end_date == None) | (Quest.end_date >= datetime.utcnow())
-    ).first()
+    quest = lookups.active_quest(course_id, moodle_activity_id, datetime.utcnow())
 
     if quest:
         # Mark quest as completed for this user
-        qp = db.query(QuestProgress).filter_by(user_id=user_id, quest_id=quest.quest_id).first()
+        qp = lookups.get_quest_progress(user_id, quest.quest_id)
         now = datetime.utcnow()
         if not qp:
             qp = QuestProgress(user_id=user_id, quest_id=quest.quest_id, status="not_started", progress_percent=0)
             db.add(qp)
             db.commit()
-            db.refresh(qp)
+            lookups.add_quest_progress(qp)
         if not qp.started_at:
             qp.started_at = now
         qp.status = "completed"
@@ -122,7 +120,7 @@ def handle_course_completion_updated(data: dict, db: Session):
         try:
             db.commit()
             logger.info(f"Successfully processed module quest completion for user {user_id}, quest {quest.quest_id}")
-            check_badges_after_quest_completion(user_id, db)
+            badge_evaluator.signal(user_id, db)
             # Send notifications
             try:
                 updated_sp = db.query(StudentProgress).filter_by(user_id=user_id, course_id=course_id).first()
@@ -134,7 +132,7 @@ def handle_course_completion_updated(data: dict, db: Session):
                     total_xp=total_xp,
                     source_type="module_completion"
                 )
-                asyncio.create_task(notification_service.send_notification(notification))
+                notification_dispatcher.dispatch(notification, db)
                 logger.info(f"Real-time XP notification sent to user {user_id} for module completion")
                 quest_notification = create_quest_notification(
                     user_id=user_id,
@@ -142,7 +140,7 @@ def handle_course_completion_updated(data: dict, db: Session):
                     notification_type="quest_completion",
                     message=f"Quest completed via module completion! You may have earned new badges."
                 )
-                asyncio.create_task(notification_service.send_notification(quest_notification))
+                notification_dispatcher.dispatch(quest_notification, db)
                 logger.info(f"Quest completion notification sent to user {user_id} for badge refresh")
             except Exception as notification_error:
                 logger.error(f"Failed to send real-time notification for user {user_id}: {notification_error}")
@@ -214,7 +212,7 @@ def handle_course_completion_updated(data: dict, db: Session):
                     total_xp=total_xp,
                     source_type="daily_quest_completion"
                 )
-                asyncio.create_task(notification_service.send_notification(daily_quest_notification))
+                notification_dispatcher.dispatch(daily_quest_notification, db)
                 logger.info(f"Daily quest XP reward notification sent to user {user_id}")
             except Exception as notification_error:
                 logger.error(f"Failed to send daily quest XP reward notification for user {user_id}: {notification_error}")
@@ -242,15 +240,17 @@ def handle_feedback_submitted(data: dict, db: Session):
         logger.error("Missing required fields in feedback submission webhook payload: %s", data)
         return
 
+    lookups = WebhookLookups.for_session(db)
+
     # Find the course
-    course = db.query(Course).filter(Course.moodle_course_id == moodle_course_id).first()
+    course = lookups.course(moodle_course_id)
     if not course:
         logger.error(f"No local course found for moodle_course_id={moodle_course_id}")
         return
     course_id = course.id
 
     # Find the user
-    user = db.query(User).filter(User.moodle_user_id == moodle_user_id).first()
+    user = lookups.user(moodle_user_id)
     if not user:
         logger.error(f"No local user found for moodle_user_id={moodle_user_id}")
         return
@@ -258,22 +258,16 @@ def handle_feedback_submitted(data: dict, db: Session):
 
     # Check if this feedback is mapped to a quest
     now = datetime.utcnow()
-    quest = db.query(Quest).filter(
-        Quest.course_id == course_id,
-        Quest.moodle_activity_id == moodle_activity_id,
-        Quest.is_active == True,
-        (Quest.start_date == None) | (Quest.start_date <= now),
-        (Quest.end_date == None) | (Quest.end_date >= now)
-    ).first()
+    quest = lookups.active_quest(course_id, moodle_activity_id, now)
     
     if quest:
         # Handle as quest completion
-        qp = db.query(QuestProgress).filter_by(user_id=user_id, quest_id=quest.quest_id).first()
+        qp = lookups.get_quest_progress(user_id, quest.quest_id)
         if not qp:
             qp = QuestProgress(user_id=user_id, quest_id=quest.quest_id, status="not_started", progress_percent=0)
             db.add(qp)
             db.commit()
-            db.refresh(qp)
+            lookups.add_quest_progress(qp)
         
         if not qp.started_at:
             qp.started_at = now
@@ -316,7 +310,7 @@ def handle_feedback_submitted(data: dict, db: Session):
         logger.info(f"Successfully processed feedback quest completion for user {user_id}, quest {quest.quest_id}")
         
         # Check for badge achievements after quest completion
-        check_badges_after_quest_completion(user_id, db)
+        badge_evaluator.signal(user_id, db)
         
         # Send real-time notifications
         try:
@@ -334,7 +328,7 @@ def handle_feedback_submitted(data: dict, db: Session):
             )
             
             # Send XP notification asynchronously (non-blocking)
-            asyncio.create_task(notification_service.send_notification(notification))
+            notification_dispatcher.dispatch(notification, db)
             logger.info(f"Real-time XP notification sent to user {user_id} for feedback completion")
             
             # Also send quest completion notification for badge refresh
@@ -344,7 +338,7 @@ def handle_feedback_submitted(data: dict, db: Session):
                 notification_type="quest_completion",
                 message=f"Quest completed via feedback submission! You may have earned new badges."
             )
-            asyncio.create_task(notification_service.send_notification(quest_notification))
+            notification_dispatcher.dispatch(quest_notification, db)
             logger.info(f"Quest completion notification sent to user {user_id} for badge refresh")
             
         except Exception as notification_error:
@@ -429,7 +423,7 @@ def handle_feedback_submitted(data: dict, db: Session):
                 )
                 
                 # Send XP reward notification asynchronously (non-blocking)
-                asyncio.create_task(notification_service.send_notification(daily_quest_notification))
+                notification_dispatcher.dispatch(daily_quest_notification, db)
                 logger.info(f"Daily quest XP reward notification sent to user {user_id}")
                 
             except Exception as notification_error:
@@ -460,15 +454,17 @@ def handle_choice_answer_submitted(data: dict, db: Session):
         logger.error("Missing required fields in choice answer webhook payload: %s", data)
         return
 
+    lookups = WebhookLookups.for_session(db)
+
     # Find the course
-    course = db.query(Course).filter(Course.moodle_course_id == moodle_course_id).first()
+    course = lookups.course(moodle_course_id)
     if not course:
         logger.error(f"No local course found for moodle_course_id={moodle_course_id}")
         return
     course_id = course.id
 
     # Find the user
-    user = db.query(User).filter(User.moodle_user_id == moodle_user_id).first()
+    user = lookups.user(moodle_user_id)
     if not user:
         logger.error(f"No local user found for moodle_user_id={moodle_user_id}")
         return
@@ -550,7 +546,7 @@ def handle_choice_answer_submitted(data: dict, db: Session):
                 )
                 
                 # Send XP reward notification asynchronously (non-blocking)
-                asyncio.create_task(notification_service.send_notification(daily_quest_notification))
+                notification_dispatcher.dispatch(daily_quest_notification, db)
                 logger.info(f"Daily quest XP reward notification sent to user {user_id}")
                 
             except Exception as notification_error:
@@ -62,11 +62,7 @@ def handle_assign_graded(data: dict, db: Session):
         user = processor.find_user(moodle_user_id)
         
         # Find the quest associated with this assignment
-        quest = db.query(Quest).filter(
-            Quest.course_id == course.id,
-            Quest.moodle_activity_id == moodle_activity_id,
-            Quest.is_active == True
-        ).first()
+        quest = processor.lookups.quest(course.id, moodle_activity_id)
         
         if not quest:
             logger.warning(f"No quest found for graded assignment course_id={course.id}, moodle_activity_id={moodle_activity_id}")
@@ -2,7 +2,6 @@
 Forum-related webhook handlers.
 """
 
-import asyncio
 import logging
 from datetime import datetime
 from sqlalchemy.orm import Session
@@ -11,8 +10,10 @@ from sqlalchemy.exc import IntegrityError
 from app.models.quest import StudentProgress, ExperiencePoints
 from app.models.course import Course
 from app.models.user import User
-from app.services.notification_service import notification_service, create_xp_notification
+from app.services.notification_service import create_xp_notification
+from app.services.notification_dispatcher import notification_dispatcher
 from app.services.daily_quest_service import DailyQuestService
+from app.services.webhook_lookups import WebhookLookups
 from ..utils import XP_CONFIG
 
 logger = logging.getLogger(__name__)
@@ -33,15 +34,17 @@ def handle_forum_post_created(data: dict, db: Session):
         logger.error("Missing required fields in forum post webhook payload: %s", data)
         return
 
+    lookups = WebhookLookups.for_session(db)
+
     # Find the course
-    course = db.query(Course).filter(Course.moodle_course_id == moodle_course_id).first()
+    course = lookups.course(moodle_course_id)
     if not course:
         logger.error(f"No local course found for moodle_course_id={moodle_course_id}")
         return
     course_id = course.id
 
     # Find the user
-    user = db.query(User).filter(User.moodle_user_id == moodle_user_id).first()
+    user = lookups.user(moodle_user_id)
     if not user:
         logger.error(f"No local user found for moodle_user_id={moodle_user_id}")
         return
@@ -123,7 +126,7 @@ def handle_forum_post_created(data: dict, db: Session):
                 )
                 
                 # Send XP reward notification asynchronously (non-blocking)
-                asyncio.create_task(notification_service.send_notification(daily_quest_notification))
+                notification_dispatcher.dispatch(daily_quest_notification, db)
                 logger.info(f"Daily quest XP reward notification sent to user {user_id}")
                 
             except Exception as notification_error:
@@ -147,15 +150,17 @@ def handle_forum_discussion_created(data: dict, db: Session):
         logger.error("Missing required fields in forum discussion webhook payload: %s", data)
         return
 
+    lookups = WebhookLookups.for_session(db)
+
     # Find the course
-    course = db.query(Course).filter(Course.moodle_course_id == moodle_course_id).first()
+    course = lookups.course(moodle_course_id)
     if not course:
         logger.error(f"No local course found for moodle_course_id={moodle_course_id}")
         return
     course_id = course.id
 
     # Find the user
-    user = db.query(User).filter(User.moodle_user_id == moodle_user_id).first()
+    user = lookups.user(moodle_user_id)
     if not user:
         logger.error(f"No local user found for moodle_user_id={moodle_user_id}")
         return
@@ -237,7 +242,7 @@ def handle_forum_discussion_created(data: dict, db: Session):
                 )
                 
                 # Send XP reward notification asynchronously (non-blocking)
-                asyncio.create_task(notification_service.send_notification(daily_quest_notification))
+                notification_dispatcher.dispatch(daily_quest_notification, db)
                 logger.info(f"Daily quest XP reward notification sent to user {user_id}")
                 
             except Exception as notification_error:
@@ -3,7 +3,6 @@ Enhanced notification manager for webhook events.
 Ensures reliable XP reward notifications reach the frontend.
 """
 
-import asyncio
 import logging
 from typing import Optional
 from datetime import datetime
@@ -14,9 +13,9 @@ from app.models.quest import Quest, StudentProgress
 from app.services.notification_service import (
     notification_service, 
     create_xp_notification, 
-    create_quest_notification,
-    NotificationData
+    create_quest_notification
 )
+from app.services.notification_dispatcher import notification_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +29,7 @@ class WebhookNotificationManager:
     def __init__(self, db: Session):
         self.db = db
     
-    async def send_quest_completion_notification(
+    def send_quest_completion_notification(
         self, 
         user_id: int, 
         quest: Quest, 
@@ -40,6 +39,9 @@ class WebhookNotificationManager:
         """
         Send comprehensive quest completion notification.
         
+        Total XP is read here, in the caller's session; the notifications
+        are delivered by the dispatcher once the session's work is committed.
+        
         Args:
             user_id: ID of the user who completed the quest
             quest: The completed quest object
@@ -47,7 +49,7 @@ class WebhookNotificationManager:
             course_id: Optional course ID for context
             
         Returns:
-            bool: True if notification was sent successfully
+            bool: True if the notifications were handed to the dispatcher
         """
         try:
             # Get updated student progress for accurate total XP
@@ -82,11 +84,11 @@ class WebhookNotificationManager:
             )
             
             # Send both notifications
-            await self._send_notification_with_retry(xp_notification)
-            await self._send_notification_with_retry(quest_notification)
+            notification_dispatcher.dispatch(xp_notification, self.db)
+            notification_dispatcher.dispatch(quest_notification, self.db)
             
             logger.info(
-                f"Successfully sent quest completion notifications for user {user_id}, "
+                f"Dispatched quest completion notifications for user {user_id}, "
                 f"quest '{quest.title}', {exp_reward} XP awarded"
             )
             
@@ -99,7 +101,7 @@ class WebhookNotificationManager:
             )
             return False
     
-    async def send_engagement_xp_notification(
+    def send_engagement_xp_notification(
         self, 
         user_id: int, 
         xp_amount: int, 
@@ -110,6 +112,9 @@ class WebhookNotificationManager:
         """
         Send XP notification for engagement activities (non-quest).
         
+        Total XP is read here, in the caller's session; the notification
+        is delivered by the dispatcher once the session's work is committed.
+        
         Args:
             user_id: ID of the user who earned XP
             xp_amount: Amount of XP earned
@@ -118,7 +123,7 @@ class WebhookNotificationManager:
             course_id: Optional course ID for context
             
         Returns:
-            bool: True if notification was sent successfully
+            bool: True if the notification was handed to the dispatcher
         """
         try:
             # Get updated student progress for accurate total XP
@@ -144,10 +149,10 @@ class WebhookNotificationManager:
             )
             
             # Send notification
-            await self._send_notification_with_retry(notification)
+            notification_dispatcher.dispatch(notification, self.db)
             
             logger.info(
-                f"Successfully sent engagement XP notification for user {user_id}, "
+                f"Dispatched engagement XP notification for user {user_id}, "
                 f"activity '{activity_title}', {xp_amount} XP awarded"
             )
             
@@ -160,59 +165,6 @@ class WebhookNotificationManager:
             )
             return False
     
-    async def _send_notification_with_retry(
-        self, 
-        notification: NotificationData, 
-        max_retries: int = 3
-    ) -> bool:
-        """
-        Send notification with retry logic for improved reliability.
-        
-        Args:
-            notification: The notification to send
-            max_retries: Maximum number of retry attempts
-            
-        Returns:
-            bool: True if notification was sent successfully
-        """
-        for attempt in range(max_retries):
-            try:
-                await notification_service.send_notification(notification)
-                
-                # Check if user has active connections
-                connected_users = notification_service.get_connected_users()
-                if notification.user_id in connected_users:
-                    logger.debug(
-                        f"Notification sent successfully to user {notification.user_id} "
-                        f"(attempt {attempt + 1})"
-                    )
-                    return True
-                else:
-                    logger.warning(
-                        f"User {notification.user_id} not connected to SSE, "
-                        f"notification may not be received (attempt {attempt + 1})"
-                    )
-                    
-                    # Still return True as notification was "sent" to the service
-                    # The user will receive it when they reconnect
-                    return True
-                    
-            except Exception as e:
-                logger.warning(
-                    f"Failed to send notification to user {notification.user_id} "
-                    f"(attempt {attempt + 1}/{max_retries}): {e}"
-                )
-                
-                if attempt < max_retries - 1:
-                    # Wait before retry with exponential backoff
-                    await asyncio.sleep(0.5 * (2 ** attempt))
-        
-        logger.error(
-            f"Failed to send notification to user {notification.user_id} "
-            f"after {max_retries} attempts"
-        )
-        return False
-    
     def get_connection_status(self, user_id: int) -> dict:
         """
         Get SSE connection status for a user (for debugging).
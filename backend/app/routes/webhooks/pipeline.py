@@ -0,0 +1,196 @@
+"""
+Single-pass webhook event pipeline.
+
+Every event runs as a fixed sequence of stages over one WebhookEventContext:
+resolving the course, user and quest, the event-specific handler and quest
+engagement tracking. The stages share one session and one unit of work, so
+each row is looked up once and the event is committed exactly once.
+
+The unit of work runs on the async engine. Handlers are plain ORM code and
+run through ``AsyncSession.run_sync``, so their queries wait on the database
+without blocking the event loop.
+"""
+
+import inspect
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Callable, ClassVar, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import after_commit
+from app.database.connection import async_engine, AsyncSessionLocal
+from app.models.course import Course
+from app.models.user import User
+from app.models.quest import Quest
+from app.services.idempotency import webhook_idempotency
+from app.services.quest_engagement_service import QuestEngagementService
+from app.services.webhook_lookups import ACTIVITY_ID_KEYS, WebhookLookups
+from .events import EVENT_HANDLERS, EVENT_TO_TYPE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WebhookEventContext:
+    """State shared by the stages of one webhook event."""
+
+    SESSION_KEY: ClassVar[str] = "webhook_event_context"
+
+    event_path: str
+    data: dict
+    db: Session
+    lookups: WebhookLookups
+    event_type: Optional[str] = None
+    message: str = ""
+    now: datetime = field(default_factory=datetime.utcnow)
+    course: Optional[Course] = None
+    user: Optional[User] = None
+    # First active quest for the activity, regardless of its date window
+    quest: Optional[Quest] = None
+
+    @classmethod
+    def for_session(cls, db: Session) -> Optional["WebhookEventContext"]:
+        """Context of the event the session is currently processing, if any."""
+        return db.info.get(cls.SESSION_KEY)
+
+    @property
+    def moodle_course_id(self) -> Optional[int]:
+        return self.data.get("course_id")
+
+    @property
+    def moodle_user_id(self) -> Optional[int]:
+        return self.data.get("user_id") or self.data.get("student_id")
+
+    @property
+    def moodle_activity_id(self) -> Optional[int]:
+        return next((self.data[key] for key in ACTIVITY_ID_KEYS if self.data.get(key)), None)
+
+
+def resolve_stage(ctx: WebhookEventContext):
+    """Resolve the course, user and quest once for every later stage."""
+    if ctx.moodle_course_id:
+        ctx.course = ctx.lookups.course(ctx.moodle_course_id)
+    if ctx.moodle_user_id:
+        ctx.user = ctx.lookups.user(ctx.moodle_user_id)
+    if ctx.course and ctx.moodle_activity_id:
+        ctx.quest = ctx.lookups.quest(ctx.course.id, ctx.moodle_activity_id)
+
+
+def handler_stage(ctx: WebhookEventContext):
+    """Run the event-specific handler; its lookups hit the context's lookups."""
+    handler = EVENT_HANDLERS[ctx.event_path].get("handler")
+    if not handler:
+        return
+    # Pass db session if handler expects it
+    if "db" in inspect.signature(handler).parameters:
+        handler(ctx.data, ctx.db)
+    else:
+        handler(ctx.data)
+
+
+def engagement_stage(ctx: WebhookEventContext):
+    """Track quest engagement for the resolved quest and user."""
+    if not (ctx.event_type and ctx.quest and ctx.user):
+        return
+    # Keep the handler's work out of reach of a rollback below
+    ctx.db.commit()
+    QuestEngagementService(ctx.db).process_engagement_event(
+        ctx.data, ctx.event_type, quest=ctx.quest, user=ctx.user
+    )
+    if not ctx.db.is_active:
+        # Engagement tracking is best effort: drop its failed flush, keep the handler's work
+        ctx.db.rollback()
+
+
+PIPELINE_STAGES: Tuple[Callable[[WebhookEventContext], None], ...] = (
+    resolve_stage,
+    handler_stage,
+    engagement_stage,
+)
+
+
+def run_pipeline(event_path: str, data: dict, db: Session) -> WebhookEventContext:
+    """
+    Run every pipeline stage for one event on the given session.
+
+    Args:
+        event_path: The event path (e.g., "quiz/attempt-submitted")
+        data: Webhook payload data
+        db: Database session, normally one opened by ``event_unit_of_work``
+
+    Returns:
+        WebhookEventContext: The context, with the acknowledgment message set
+
+    Raises:
+        KeyError: If the event path is unknown
+    """
+    ctx = WebhookEventContext(
+        event_path=event_path,
+        data=data,
+        db=db,
+        lookups=WebhookLookups.for_session(db),
+        event_type=EVENT_TO_TYPE.get(event_path),
+        message=EVENT_HANDLERS[event_path]["message"],
+    )
+    db.info[ctx.SESSION_KEY] = ctx
+    try:
+        for stage in PIPELINE_STAGES:
+            stage(ctx)
+    finally:
+        db.info.pop(ctx.SESSION_KEY, None)
+    return ctx
+
+
+@asynccontextmanager
+async def event_unit_of_work() -> AsyncIterator[AsyncSession]:
+    """
+    Open a session whose work is committed once, when the block exits.
+
+    The session joins an outer connection transaction in "create_savepoint"
+    mode, so the commits handlers and services issue only release savepoints
+    and their rollbacks only undo work since their last commit. After-commit
+    callbacks, such as badge evaluation signals, wait for the outer commit.
+    """
+    async with async_engine.connect() as connection:
+        transaction = await connection.begin()
+        db = AsyncSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+        after_commit.hold(db)
+        try:
+            yield db
+            await db.commit()
+            await transaction.commit()
+            after_commit.release(db)
+        except Exception:
+            await transaction.rollback()
+            after_commit.discard(db)
+            raise
+        finally:
+            await db.close()
+
+
+def _run_event(db: Session, event_path: str, data: dict, idempotency_key: Optional[str]) -> Optional[str]:
+    if idempotency_key and not webhook_idempotency.claim(db, idempotency_key, event_path, commit=False):
+        return None
+    return run_pipeline(event_path, data, db).message
+
+
+async def process_event(event_path: str, data: dict, idempotency_key: Optional[str] = None) -> Optional[str]:
+    """
+    Process one event in its own unit of work.
+
+    The idempotency claim, when a key is given, is part of the same
+    transaction, so a failed event leaves its key unclaimed.
+
+    Returns:
+        str: The acknowledgment message, or None if the key was already claimed
+    """
+    async with event_unit_of_work() as db:
+        message = await db.run_sync(_run_event, event_path, data, idempotency_key)
+
+    if idempotency_key:
+        webhook_idempotency.remember(idempotency_key)
+    return message
@@ -0,0 +1,282 @@
+"""
+Durable ingestion queue for Moodle webhook events.
+
+In queue mode the webhook endpoint only validates the payload, stores it in
+the ``webhook_events`` table and acknowledges with 202. A pool of background
+workers drains the table and runs the event pipeline, retrying
+failed events with exponential backoff and dead-lettering them after
+``WEBHOOK_QUEUE_MAX_ATTEMPTS`` attempts.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.database.connection import SessionLocal, get_db
+from app.models.webhook_event import WebhookEvent
+from app.services.badge_evaluator import badge_evaluator
+from app.services.idempotency import webhook_idempotency
+from app.services.lookup_cache import lookup_cache
+from app.utils.auth import get_role_required
+from .pipeline import event_unit_of_work, run_pipeline
+
+logger = logging.getLogger(__name__)
+
+# "inline" processes events on the request, "queue" stores and acknowledges
+WEBHOOK_INGESTION_MODE = os.getenv("WEBHOOK_INGESTION_MODE", "inline").lower()
+WEBHOOK_QUEUE_WORKERS = int(os.getenv("WEBHOOK_QUEUE_WORKERS", 4))
+WEBHOOK_QUEUE_BATCH_SIZE = int(os.getenv("WEBHOOK_QUEUE_BATCH_SIZE", 10))
+WEBHOOK_QUEUE_POLL_INTERVAL = float(os.getenv("WEBHOOK_QUEUE_POLL_INTERVAL", 1.0))
+WEBHOOK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_QUEUE_MAX_ATTEMPTS", 5))
+WEBHOOK_QUEUE_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_QUEUE_RETRY_BASE_SECONDS", 2.0))
+# Events stuck in "processing" longer than this are reclaimed (crashed worker)
+WEBHOOK_QUEUE_VISIBILITY_TIMEOUT = int(os.getenv("WEBHOOK_QUEUE_VISIBILITY_TIMEOUT", 300))
+
+
+class WebhookQueue:
+    """Stores webhook events durably and drains them with a worker pool."""
+
+    def __init__(self):
+        self.workers: List[asyncio.Task] = []
+        self.metrics: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "enqueued": 0,
+            "processed": 0,
+            "failed": 0,
+            "retried": 0,
+            "dead_lettered": 0,
+            "total_processing_ms": 0.0,
+        })
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return WEBHOOK_INGESTION_MODE == "queue"
+
+    def enqueue(self, db: Session, event_path: str, data: dict) -> WebhookEvent:
+        """Persist an event for background processing."""
+        event = WebhookEvent(event_path=event_path, payload=data, status="pending", attempts=0)
+        db.add(event)
+        db.commit()
+        db.refresh(event)
+
+        self.metrics[event_path]["enqueued"] += 1
+        if self._wakeup:
+            self._wakeup.set()
+        return event
+
+    def enqueue_many(self, db: Session, events: List[tuple]) -> List[int]:
+        """Persist several (event_path, data) pairs with a single commit and return their queue IDs."""
+        rows = [
+            WebhookEvent(event_path=event_path, payload=data, status="pending", attempts=0)
+            for event_path, data in events
+        ]
+        db.add_all(rows)
+        db.flush()
+        queue_ids = [row.id for row in rows]
+        db.commit()
+
+        for event_path, _ in events:
+            self.metrics[event_path]["enqueued"] += 1
+        if self._wakeup and rows:
+            self._wakeup.set()
+        return queue_ids
+
+    def start(self):
+        """Start the worker pool on the running event loop."""
+        if self.workers:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        for worker_id in range(WEBHOOK_QUEUE_WORKERS):
+            self.workers.append(asyncio.create_task(self._worker(worker_id)))
+        logger.info(f"Started {WEBHOOK_QUEUE_WORKERS} webhook queue workers")
+
+    async def stop(self):
+        """Stop the worker pool, letting in-flight events finish."""
+        self._stopping = True
+        if self._wakeup:
+            self._wakeup.set()
+        if self.workers:
+            await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        logger.info("Webhook queue workers stopped")
+
+    async def _worker(self, worker_id: int):
+        while not self._stopping:
+            try:
+                event_ids = await asyncio.to_thread(self._claim_batch)
+            except Exception as e:
+                logger.error(f"Webhook queue worker {worker_id} failed to claim events: {e}")
+                event_ids = []
+
+            if not event_ids:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=WEBHOOK_QUEUE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for event_id in event_ids:
+                await self._process(event_id)
+                # Let request handlers run between events
+                await asyncio.sleep(0)
+
+    def _claim_batch(self) -> List[int]:
+        """Mark a batch of available events as processing and return their IDs."""
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=WEBHOOK_QUEUE_VISIBILITY_TIMEOUT)
+        with SessionLocal() as db:
+            events = db.query(WebhookEvent).filter(
+                or_(
+                    (WebhookEvent.status == "pending") & (WebhookEvent.available_at <= now),
+                    (WebhookEvent.status == "processing") & (WebhookEvent.locked_at < stale_before)
+                )
+            ).order_by(WebhookEvent.id).with_for_update(skip_locked=True).limit(WEBHOOK_QUEUE_BATCH_SIZE).all()
+
+            for event in events:
+                event.status = "processing"
+                event.locked_at = now
+            db.commit()
+            return [event.id for event in events]
+
+    async def _process(self, event_id: int):
+        """Run one claimed event through the pipeline and mark it done in the same transaction."""
+        event_path = None
+        started = time.perf_counter()
+        try:
+            async with event_unit_of_work() as db:
+                event = await db.get(WebhookEvent, event_id)
+                if not event or event.status != "processing":
+                    return
+                event_path = event.event_path
+                await db.run_sync(self._run_claimed, event)
+        except Exception as e:
+            if event_path is None:
+                logger.error(f"Failed to load webhook event {event_id}: {e}")
+                return
+            await asyncio.to_thread(self._record_failure_in_session, event_id, event_path, str(e))
+            return
+        finally:
+            if event_path:
+                self.metrics[event_path]["total_processing_ms"] += (time.perf_counter() - started) * 1000
+
+        self.metrics[event_path]["processed"] += 1
+
+    @staticmethod
+    def _run_claimed(db: Session, event: WebhookEvent):
+        run_pipeline(event.event_path, event.payload, db)
+
+        event.status = "done"
+        event.attempts += 1
+        event.processed_at = datetime.utcnow()
+        event.last_error = None
+
+    def _record_failure_in_session(self, event_id: int, event_path: str, error: str):
+        with SessionLocal() as db:
+            self._record_failure(db, event_id, event_path, error)
+
+    def _record_failure(self, db: Session, event_id: int, event_path: str, error: str):
+        event = db.query(WebhookEvent).filter(WebhookEvent.id == event_id).first()
+        event.attempts += 1
+        event.last_error = error
+        self.metrics[event_path]["failed"] += 1
+
+        if event.attempts >= WEBHOOK_QUEUE_MAX_ATTEMPTS:
+            event.status = "dead"
+            self.metrics[event_path]["dead_lettered"] += 1
+            logger.error(f"❌ Webhook event {event_id} ({event_path}) dead-lettered after {event.attempts} attempts: {error}")
+        else:
+            delay = WEBHOOK_QUEUE_RETRY_BASE_SECONDS * (2 ** (event.attempts - 1))
+            event.status = "pending"
+            event.available_at = datetime.utcnow() + timedelta(seconds=delay)
+            self.metrics[event_path]["retried"] += 1
+            logger.warning(f"Webhook event {event_id} ({event_path}) failed, retrying in {delay:.0f}s: {error}")
+        event.locked_at = None
+        db.commit()
+
+    def get_stats(self, db: Session) -> dict:
+        """Queue depth by status plus per-event-type counters."""
+        depth = dict(
+            db.query(WebhookEvent.status, func.count(WebhookEvent.id))
+            .group_by(WebhookEvent.status)
+            .all()
+        )
+        event_types = {}
+        for event_path, counters in self.metrics.items():
+            processed = counters["processed"]
+            event_types[event_path] = {
+                **counters,
+                "avg_processing_ms": round(counters["total_processing_ms"] / processed, 2) if processed else 0.0,
+            }
+        return {
+            "mode": WEBHOOK_INGESTION_MODE,
+            "workers": len(self.workers),
+            "depth": depth,
+            "event_types": event_types,
+        }
+
+
+# Global instance
+webhook_queue = WebhookQueue()
+
+
+# Queue statistics, failed payloads and requeueing are for administrators only
+router = APIRouter(prefix="/queue", tags=["webhook-queue"], dependencies=[Depends(get_role_required("admin"))])
+
+
+@router.get("/stats")
+async def get_queue_stats(db: Session = Depends(get_db)):
+    """Queue depth, worker count, per-event-type metrics, duplicate suppression, lookup cache and badge evaluator counters."""
+    return {
+        **webhook_queue.get_stats(db),
+        "idempotency": webhook_idempotency.get_stats(),
+        "lookup_cache": lookup_cache.get_stats(),
+        "badge_evaluator": badge_evaluator.get_stats(),
+    }
+
+
+@router.get("/dead-letter")
+async def get_dead_letter_events(limit: int = 50, db: Session = Depends(get_db)):
+    """List events that exhausted their retries."""
+    events = db.query(WebhookEvent).filter(
+        WebhookEvent.status == "dead"
+    ).order_by(WebhookEvent.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": event.id,
+            "event_path": event.event_path,
+            "attempts": event.attempts,
+            "last_error": event.last_error,
+            "created_at": event.created_at.isoformat() if event.created_at else None,
+            "payload": event.payload,
+        }
+        for event in events
+    ]
+
+
+@router.post("/dead-letter/{event_id}/requeue")
+async def requeue_dead_letter_event(event_id: int, db: Session = Depends(get_db)):
+    """Move a dead-lettered event back to the pending queue."""
+    event = db.query(WebhookEvent).filter(
+        WebhookEvent.id == event_id,
+        WebhookEvent.status == "dead"
+    ).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Dead-lettered event not found")
+
+    event.status = "pending"
+    event.attempts = 0
+    event.available_at = datetime.utcnow()
+    event.locked_at = None
+    db.commit()
+    return {"status": "requeued", "id": event_id}
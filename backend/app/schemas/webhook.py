@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+
+
+class WebhookBatchItem(BaseModel):
+    """A single Moodle event inside a batched webhook request"""
+    event_path: str
+    payload: Dict[str, Any]
+    idempotency_key: Optional[str] = None
+
+
+class WebhookBatchItemResult(BaseModel):
+    """Processing outcome for one batched event"""
+    index: int
+    event_path: str
+    status: str  # processed, queued, duplicate, rejected, failed
+    message: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,246 @@
+"""
+Resumable retroactive badge award job.
+
+A job walks active users in ID order, ``chunk_size`` users at a time. For
+each chunk the criteria engine loads every metric with one grouped query
+over the whole chunk, and new UserBadge and ActivityLog rows are inserted
+with one statement each. The chunk's awards and the job's progress cursor
+are committed together, so a job interrupted by a restart resumes after the
+last committed chunk without awarding anything twice.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database.connection import SessionLocal
+from app.models.activity_log import ActivityLog
+from app.models.badge import Badge, BadgeAwardJob
+from app.models.user import User
+from app.services.badge_criteria import BadgeCriteriaEngine
+
+logger = logging.getLogger(__name__)
+
+BADGE_AWARD_JOB_CHUNK_SIZE = int(os.getenv("BADGE_AWARD_JOB_CHUNK_SIZE", 500))
+# Per-user results kept on the job for the status endpoint; counters are always exact
+BADGE_AWARD_JOB_MAX_RESULTS = int(os.getenv("BADGE_AWARD_JOB_MAX_RESULTS", 1000))
+
+
+class BadgeAwardJobRunner:
+    """Creates retroactive badge award jobs and runs them in the background."""
+
+    def __init__(self):
+        self.tasks: Dict[int, asyncio.Task] = {}
+
+    def create_job(
+        self,
+        db: Session,
+        dry_run: bool = True,
+        user_id: Optional[int] = None,
+        chunk_size: int = BADGE_AWARD_JOB_CHUNK_SIZE
+    ) -> BadgeAwardJob:
+        """Record a new job covering one user or every active user."""
+        job = BadgeAwardJob(
+            status="pending",
+            dry_run=dry_run,
+            target_user_id=user_id,
+            chunk_size=chunk_size,
+            total_users=self._users_query(db, user_id).count(),
+            users_processed=0,
+            users_with_new_badges=0,
+            badges_awarded=0,
+            last_user_id=0,
+            user_results=[]
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def start(self, job_id: int):
+        """Run a job on the running event loop, unless it is already running here."""
+        task = self.tasks.get(job_id)
+        if task and not task.done():
+            return
+        self.tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    def resume_unfinished(self):
+        """Restart jobs that were pending or running when the process stopped."""
+        with SessionLocal() as db:
+            job_ids = [
+                job_id for (job_id,) in db.query(BadgeAwardJob.job_id).filter(
+                    BadgeAwardJob.status.in_(["pending", "running"])
+                ).order_by(BadgeAwardJob.job_id).all()
+            ]
+        for job_id in job_ids:
+            logger.info(f"Resuming badge award job {job_id}")
+            self.start(job_id)
+
+    async def stop(self):
+        """Cancel running jobs; each resumes from its last committed chunk on the next start."""
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks = {}
+
+    async def _run(self, job_id: int):
+        try:
+            while not await asyncio.to_thread(self.run_chunk, job_id):
+                # Let request handlers run between chunks
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Badge award job {job_id} failed: {e}")
+            with SessionLocal() as db:
+                job = db.get(BadgeAwardJob, job_id)
+                if job:
+                    job.status = "failed"
+                    job.error = str(e)
+                    job.updated_at = datetime.utcnow()
+                    db.commit()
+        finally:
+            self.tasks.pop(job_id, None)
+
+    def run(self, job_id: int):
+        """Run a job to completion on the calling thread."""
+        while not self.run_chunk(job_id):
+            pass
+
+    def run_chunk(self, job_id: int) -> bool:
+        """
+        Process the next chunk of a job in one transaction.
+
+        Returns:
+            bool: True once the job has no users left (or is no longer runnable)
+        """
+        with SessionLocal() as db:
+            # Lock the job row so two processes never run the same chunk
+            job = db.query(BadgeAwardJob).filter(
+                BadgeAwardJob.job_id == job_id
+            ).with_for_update(skip_locked=True).first()
+            if not job or job.status not in ("pending", "running"):
+                return True
+
+            now = datetime.utcnow()
+            if job.status == "pending":
+                job.status = "running"
+                job.started_at = now
+
+            users = self._users_query(db, job.target_user_id).filter(
+                User.id > job.last_user_id
+            ).order_by(User.id).limit(job.chunk_size).all()
+            if not users:
+                job.status = "completed"
+                job.finished_at = now
+                job.updated_at = now
+                db.commit()
+                logger.info(
+                    f"🏁 Badge award job {job_id} completed: {job.badges_awarded} badges "
+                    f"{'would be awarded to' if job.dry_run else 'awarded to'} {job.users_with_new_badges} users"
+                )
+                return True
+
+            badges = db.query(Badge).filter(Badge.is_active == True).all()
+            engine = BadgeCriteriaEngine(db)
+            new_badges, earned = engine.find_new_badges([user_id for user_id, _ in users], badges)
+
+            awards = [(user_id, badge) for user_id, _ in users for badge in new_badges.get(user_id, [])]
+            if awards and not job.dry_run:
+                # A concurrent evaluation may have awarded some of them first, count and log only the rows inserted
+                badges_by_id = {badge.badge_id: badge for _, badge in awards}
+                inserted = engine.insert_user_badges([(user_id, badge.badge_id) for user_id, badge in awards])
+                awards = [(user_badge.user_id, badges_by_id[user_badge.badge_id]) for user_badge in inserted]
+                new_badges = {}
+                for user_id, badge in awards:
+                    new_badges.setdefault(user_id, []).append(badge)
+                if awards:
+                    db.execute(insert(ActivityLog), [
+                        {
+                            "user_id": user_id,
+                            "action_type": "badge_awarded",
+                            "action_details": {
+                                "badge_id": badge.badge_id,
+                                "badge_name": badge.name,
+                                "retroactive": True
+                            },
+                            "related_entity_type": "badge",
+                            "related_entity_id": badge.badge_id,
+                            "exp_change": 0
+                        }
+                        for user_id, badge in awards
+                    ])
+
+            results = list(job.user_results or [])
+            for user_id, moodle_user_id in users:
+                user_new_badges = new_badges.get(user_id)
+                if not user_new_badges or len(results) >= BADGE_AWARD_JOB_MAX_RESULTS:
+                    continue
+                results.append({
+                    "user_id": user_id,
+                    "moodle_user_id": moodle_user_id,
+                    "current_badges_count": len(earned[user_id]),
+                    "new_badges": [
+                        {
+                            "badge_id": badge.badge_id,
+                            "badge_name": badge.name,
+                            "badge_description": badge.description
+                        }
+                        for badge in user_new_badges
+                    ],
+                    "new_badges_count": len(user_new_badges)
+                })
+
+            job.user_results = results
+            job.users_processed += len(users)
+            job.users_with_new_badges += len(new_badges)
+            job.badges_awarded += len(awards)
+            job.last_user_id = users[-1][0]
+            job.updated_at = now
+            # The awards and the cursor commit together
+            db.commit()
+            logger.info(f"Badge award job {job_id}: {job.users_processed}/{job.total_users} users processed")
+            return False
+
+    @staticmethod
+    def _users_query(db: Session, user_id: Optional[int] = None):
+        query = db.query(User.id, User.moodle_user_id)
+        if user_id:
+            return query.filter(User.id == user_id)
+        return query.filter(User.is_active == True)
+
+    @staticmethod
+    def to_dict(job: BadgeAwardJob) -> dict:
+        return {
+            "job_id": job.job_id,
+            "status": job.status,
+            "dry_run": job.dry_run,
+            "target_user_id": job.target_user_id,
+            "chunk_size": job.chunk_size,
+            "progress": {
+                "users_processed": job.users_processed,
+                "total_users": job.total_users,
+                "percentage": round(job.users_processed / job.total_users * 100, 1) if job.total_users else 100.0
+            },
+            "summary": {
+                "total_users_checked": job.users_processed,
+                "users_with_new_badges": job.users_with_new_badges,
+                "total_badges_awarded": job.badges_awarded,
+                "target_user_id": job.target_user_id
+            },
+            "user_results": job.user_results,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+
+# Global instance
+badge_award_jobs = BadgeAwardJobRunner()
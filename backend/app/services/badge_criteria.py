@@ -0,0 +1,171 @@
+"""
+Set-based badge criteria engine.
+
+Badges are grouped by ``criteria.type``. Each type needs one per-user metric
+(completed quests, streaks, XP, completed daily quests), which is loaded
+with a single grouped query for any number of users. Thresholds are then
+evaluated in memory, so checking every badge costs one query per criteria
+type instead of several per badge.
+"""
+
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..models.badge import Badge, UserBadge
+from ..models.quest import QuestProgress, StudentProgress
+from ..models.streak import UserStreak
+from ..models.daily_quest import UserDailyQuest
+
+# user_id -> criteria type -> metric value
+UserMetrics = Dict[str, Any]
+
+
+class BadgeCriteriaEngine:
+    """Evaluates badge criteria for many badges and users with one query per criteria type."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.metric_loaders: Dict[str, Callable[[List[int]], Dict[int, Any]]] = {
+            "quest_completion": self._load_completed_quests,
+            "streak_days": self._load_streaks,
+            "xp_earned": self._load_xp,
+            # Older name of xp_earned, still used by retroactively awarded badges
+            "total_exp": self._load_xp,
+            "daily_quest_streak": self._load_completed_daily_quests,
+            # grade_average, assignment_submission and participation have no
+            # data model yet, so they never qualify
+        }
+
+    def load_metrics(self, user_ids: Iterable[int], criteria_types: Iterable[str]) -> Dict[int, UserMetrics]:
+        """Load the metric of every given criteria type for every user, one query per type."""
+        user_ids = list(set(user_ids))
+        metrics: Dict[int, UserMetrics] = {user_id: {} for user_id in user_ids}
+        if not user_ids:
+            return metrics
+        for criteria_type in set(criteria_types):
+            loader = self.metric_loaders.get(criteria_type)
+            if loader is None:
+                continue
+            for user_id, value in loader(user_ids).items():
+                metrics[user_id][criteria_type] = value
+        return metrics
+
+    def load_earned_badge_ids(self, user_ids: Iterable[int]) -> Dict[int, Set[int]]:
+        """Badge IDs each user already holds, in one query."""
+        earned: Dict[int, Set[int]] = {user_id: set() for user_id in user_ids}
+        if not earned:
+            return earned
+        rows = self.db.query(UserBadge.user_id, UserBadge.badge_id).filter(
+            UserBadge.user_id.in_(earned.keys())
+        ).all()
+        for user_id, badge_id in rows:
+            earned[user_id].add(badge_id)
+        return earned
+
+    def current_value(self, metrics: UserMetrics, badge: Badge) -> int:
+        """The user's current value for the badge's criteria."""
+        criteria = badge.criteria or {}
+        criteria_type = criteria.get("type", "")
+        value = metrics.get(criteria_type)
+        if criteria_type == "streak_days":
+            return (value or {}).get(criteria.get("streak_type", "login"), 0)
+        return value or 0
+
+    def qualifies(self, metrics: UserMetrics, badge: Badge) -> bool:
+        """Check one badge's threshold against metrics loaded by ``load_metrics``."""
+        criteria = badge.criteria or {}
+        if criteria.get("type", "") not in self.metric_loaders:
+            return False
+        return self.current_value(metrics, badge) >= criteria.get("target", 1)
+
+    def progress(self, metrics: UserMetrics, badge: Badge) -> Dict[str, Any]:
+        """Progress towards one badge from metrics loaded by ``load_metrics``."""
+        target = (badge.criteria or {}).get("target", 1)
+        current = self.current_value(metrics, badge)
+        return {
+            "current": current,
+            "target": target,
+            "percentage": min(100.0, (current / target) * 100) if target > 0 else 0.0
+        }
+
+    def find_new_badges(
+        self, user_ids: Iterable[int], badges: List[Badge]
+    ) -> Tuple[Dict[int, List[Badge]], Dict[int, Set[int]]]:
+        """
+        Find the badges each user qualifies for but does not hold yet.
+
+        Returns:
+            tuple: (user_id -> newly earned badges, user_id -> IDs of badges already held)
+        """
+        earned = self.load_earned_badge_ids(user_ids)
+        criteria_types = {(badge.criteria or {}).get("type", "") for badge in badges}
+        metrics = self.load_metrics(earned.keys(), criteria_types)
+
+        new_badges: Dict[int, List[Badge]] = defaultdict(list)
+        for user_id, earned_ids in earned.items():
+            for badge in badges:
+                if badge.badge_id not in earned_ids and self.qualifies(metrics[user_id], badge):
+                    new_badges[user_id].append(badge)
+        return dict(new_badges), earned
+
+    def insert_user_badges(
+        self,
+        awards: List[Tuple[int, int]],
+        awarded_by: Optional[int] = None,
+        course_id: Optional[int] = None
+    ) -> List[UserBadge]:
+        """
+        Insert all (user_id, badge_id) awards with one INSERT ... RETURNING; the caller commits.
+
+        Awards a concurrent evaluation inserted first are skipped, so only the
+        rows returned here were awarded by this call.
+        """
+        if not awards:
+            return []
+        return list(self.db.scalars(
+            insert(UserBadge)
+            .on_conflict_do_nothing(index_elements=[UserBadge.user_id, UserBadge.badge_id])
+            .returning(UserBadge),
+            [
+                {"user_id": user_id, "badge_id": badge_id, "awarded_by": awarded_by, "course_id": course_id}
+                for user_id, badge_id in awards
+            ]
+        ))
+
+    def _load_completed_quests(self, user_ids: List[int]) -> Dict[int, int]:
+        return dict(
+            self.db.query(QuestProgress.user_id, func.count(QuestProgress.quest_id))
+            .filter(QuestProgress.user_id.in_(user_ids), QuestProgress.status == "completed")
+            .group_by(QuestProgress.user_id)
+            .all()
+        )
+
+    def _load_streaks(self, user_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        streaks: Dict[int, Dict[str, int]] = defaultdict(dict)
+        rows = self.db.query(UserStreak.user_id, UserStreak.streak_type, UserStreak.current_streak).filter(
+            UserStreak.user_id.in_(user_ids)
+        ).all()
+        for user_id, streak_type, current_streak in rows:
+            streaks[user_id][streak_type] = current_streak
+        return streaks
+
+    def _load_xp(self, user_ids: List[int]) -> Dict[int, int]:
+        return {
+            user_id: int(total_exp or 0)
+            for user_id, total_exp in self.db.query(StudentProgress.user_id, func.sum(StudentProgress.total_exp))
+            .filter(StudentProgress.user_id.in_(user_ids))
+            .group_by(StudentProgress.user_id)
+            .all()
+        }
+
+    def _load_completed_daily_quests(self, user_ids: List[int]) -> Dict[int, int]:
+        return dict(
+            self.db.query(UserDailyQuest.user_id, func.count(UserDailyQuest.user_id))
+            .filter(UserDailyQuest.user_id.in_(user_ids), UserDailyQuest.status == "completed")
+            .group_by(UserDailyQuest.user_id)
+            .all()
+        )
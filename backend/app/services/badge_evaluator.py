@@ -0,0 +1,242 @@
+"""
+Background badge evaluation.
+
+Webhook handlers and quest services no longer check badges on the request
+path. They signal that a user's progress changed; the evaluator coalesces
+every signal for the same user within ``BADGE_EVALUATOR_COALESCE_SECONDS``
+into one evaluation, runs it on a worker with its own session and pushes the
+awarded badges to the user over SSE. Webhook latency therefore no longer
+depends on the number of badges.
+
+Signals raised inside a unit of work (the webhook pipeline or a batch) are
+held on the session and only released once its outer transaction commits
+(see ``app.database.after_commit``), so the evaluator never reads progress
+that may still be rolled back.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.database import after_commit
+from app.database.connection import SessionLocal
+from app.services.badge_service import BadgeService
+from app.services.notification_service import notification_service, create_badge_notification
+from app.services.notification_dispatcher import notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+BADGE_EVALUATOR_ENABLED = os.getenv("BADGE_EVALUATOR_ENABLED", "true").lower() == "true"
+BADGE_EVALUATOR_WORKERS = int(os.getenv("BADGE_EVALUATOR_WORKERS", 2))
+# Signals for the same user within this window are evaluated once
+BADGE_EVALUATOR_COALESCE_SECONDS = float(os.getenv("BADGE_EVALUATOR_COALESCE_SECONDS", 2.0))
+
+
+class BadgeEvaluator:
+    """Evaluates badges for users whose progress changed, off the request path."""
+
+    def __init__(self, coalesce_seconds: float = BADGE_EVALUATOR_COALESCE_SECONDS):
+        self.coalesce_seconds = coalesce_seconds
+        # user_id -> monotonic time the evaluation is due
+        self._pending: Dict[int, float] = {}
+        # Users being evaluated; a new signal for them waits for the next pass
+        self._running: Set[int] = set()
+        self._lock = threading.Lock()
+        self.workers: List[asyncio.Task] = []
+        # Inline evaluations handed to a thread from an event loop
+        self._inline_tasks: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.stats = {
+            "signals": 0,
+            "coalesced": 0,
+            "evaluations": 0,
+            "failed": 0,
+            "badges_awarded": 0,
+            "total_evaluation_ms": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return BADGE_EVALUATOR_ENABLED
+
+    def signal(self, user_id: int, db: Optional[Session] = None):
+        """
+        Note that a user's progress changed and their badges need evaluating.
+
+        Args:
+            user_id: ID of the user whose progress changed
+            db: Session the change was made in. If it is held by a unit of
+                work, the signal is sent when its outer transaction commits;
+                otherwise the change must already be committed.
+        """
+        if db is not None and after_commit.is_held(db):
+            after_commit.call_after_commit(db, lambda: self.signal(user_id))
+            return
+        # Without running workers (scripts, tests, a failed startup) nothing would drain the queue
+        if not self.enabled or self._loop is None:
+            self._evaluate_without_workers(user_id)
+            return
+
+        with self._lock:
+            self.stats["signals"] += 1
+            if user_id in self._pending:
+                self.stats["coalesced"] += 1
+                return
+            self._pending[user_id] = time.monotonic() + self.coalesce_seconds
+        self._wake()
+
+    def _wake(self):
+        if not (self._loop and self._wakeup):
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    def start(self):
+        """Start the evaluation workers on the running event loop."""
+        if self.workers:
+            return
+        self._stopping = False
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        for worker_id in range(BADGE_EVALUATOR_WORKERS):
+            self.workers.append(asyncio.create_task(self._worker(worker_id)))
+        logger.info(f"Started {BADGE_EVALUATOR_WORKERS} badge evaluation workers")
+
+    async def stop(self):
+        """Stop the workers, letting in-flight evaluations finish."""
+        self._stopping = True
+        if self._wakeup:
+            self._wakeup.set()
+        if self.workers:
+            await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self._loop = None
+        logger.info("Badge evaluation workers stopped")
+
+    def _take_due(self) -> tuple:
+        """Pop one user whose coalescing window has passed, and the seconds until the next one is due."""
+        now = time.monotonic()
+        with self._lock:
+            waiting = [item for item in self._pending.items() if item[0] not in self._running]
+            if not waiting:
+                return None, None
+            user_id, due_at = min(waiting, key=lambda item: item[1])
+            if due_at > now:
+                return None, due_at - now
+            del self._pending[user_id]
+            self._running.add(user_id)
+            return user_id, 0.0
+
+    async def _worker(self, worker_id: int):
+        while not self._stopping:
+            user_id, wait_seconds = self._take_due()
+            if user_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait_seconds or BADGE_EVALUATOR_COALESCE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                awards = await self._evaluate_user(user_id)
+            finally:
+                with self._lock:
+                    self._running.discard(user_id)
+            await self._notify(user_id, awards)
+
+    async def _evaluate_user(self, user_id: int) -> List[dict]:
+        started = time.perf_counter()
+        try:
+            awards = await asyncio.to_thread(self.evaluate, user_id)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"❌ Badge evaluation failed for user {user_id}: {e}")
+            return []
+        finally:
+            self.stats["total_evaluation_ms"] += (time.perf_counter() - started) * 1000
+        self.stats["evaluations"] += 1
+        self.stats["badges_awarded"] += len(awards)
+        return awards
+
+    async def _notify(self, user_id: int, awards: List[dict]):
+        for award in awards:
+            await notification_service.send_notification(badge_notification(user_id, award))
+
+    def _evaluate_without_workers(self, user_id: int):
+        """Evaluate inline, on a thread if called on an event loop (e.g. from an async route's commit)."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._evaluate_inline(user_id)
+            return
+        task = asyncio.create_task(asyncio.to_thread(self._evaluate_inline, user_id))
+        self._inline_tasks.add(task)
+        task.add_done_callback(self._inline_tasks.discard)
+
+    def _evaluate_inline(self, user_id: int):
+        """Evaluate on the caller's thread, as before the evaluator existed (disabled, or no workers running)."""
+        try:
+            awards = self.evaluate(user_id)
+        except Exception as e:
+            logger.error(f"❌ Badge evaluation failed for user {user_id}: {e}")
+            return
+        # Without an event loop (scripts) the awards are stored, only the push is skipped
+        for award in awards:
+            notification_dispatcher.dispatch(badge_notification(user_id, award))
+
+    def evaluate(self, user_id: int) -> List[dict]:
+        """
+        Check and award badges for one user in a session of its own.
+
+        Returns:
+            list: The awarded badges as plain dicts, safe to use after the session closes
+        """
+        with SessionLocal() as db:
+            awarded = BadgeService(db).check_and_award_badges(user_id)
+            awards = [
+                {
+                    "badge_id": award["badge"].badge_id,
+                    "name": award["badge"].name,
+                    "badge_type": award["badge"].badge_type,
+                    "image_url": award["badge"].image_url,
+                    "exp_bonus": award["exp_bonus"],
+                }
+                for award in awarded
+            ]
+        for award in awards:
+            logger.info(f"🎖️ Awarded badge '{award['name']}' to user {user_id}")
+        return awards
+
+    def get_stats(self) -> dict:
+        evaluations = self.stats["evaluations"]
+        return {
+            **self.stats,
+            "avg_evaluation_ms": round(self.stats["total_evaluation_ms"] / evaluations, 2) if evaluations else 0.0,
+            "pending": len(self._pending),
+            "workers": len(self.workers),
+            "coalesce_seconds": self.coalesce_seconds,
+        }
+
+
+def badge_notification(user_id: int, award: dict):
+    return create_badge_notification(
+        user_id=user_id,
+        badge_name=award["name"],
+        exp_bonus=award["exp_bonus"],
+        badge_data=award
+    )
+
+
+# Global instance
+badge_evaluator = BadgeEvaluator()
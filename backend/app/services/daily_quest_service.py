@@ -8,7 +8,7 @@ from app.models.daily_quest import DailyQuest, UserDailyQuest, DailyQuestProgres
 from app.models.user import User
 from app.models.quest import ExperiencePoints, StudentProgress
 from app.models.streak import UserStreak
-from app.services.badge_service import BadgeService
+from app.services.badge_evaluator import badge_evaluator
 
 logger = logging.getLogger(__name__)
 
@@ -717,18 +717,6 @@ class DailyQuestService:
     def _check_badges_after_quest_completion(self, user_id: int):
         """
         Check for badge achievements after a quest completion.
-        This integrates badge checking into the quest completion flow.
+        The check runs on the background badge evaluator, off the request path.
         """
-        try:
-            badge_service = BadgeService(self.db)
-            awarded_badges = badge_service.check_all_badges_for_user(user_id)
-            
-            if awarded_badges:
-                logger.info(f"User {user_id} earned {len(awarded_badges)} badges after quest completion")
-                for badge_award in awarded_badges:
-                    logger.info(f"Awarded badge '{badge_award['badge'].name}' to user {user_id}")
-            
-            return awarded_badges
-        except Exception as e:
-            logger.error(f"Error checking badges for user {user_id}: {e}")
-            return []
\ No newline at end of file
+        badge_evaluator.signal(user_id, self.db)
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Idempotency layer for Moodle webhook events.
+
+Each event gets a key, either supplied by the sender (``Idempotency-Key``
+header, ``idempotency_key``/``event_id`` in the payload) or derived from a
+hash of the event path and canonical payload. Keys are checked against a
+bounded in-memory LRU first and then claimed in the uniquely keyed
+``webhook_idempotency_keys`` table with a single INSERT ... ON CONFLICT, so a
+Moodle retry costs one index probe instead of a full processing pass.
+
+Supplied keys are kept for ``WEBHOOK_IDEMPOTENCY_TTL_HOURS``. Derived keys
+only cover Moodle's retries and expire after
+``WEBHOOK_DERIVED_KEY_TTL_MINUTES``: two identical payloads further apart
+are separate events (a lesson viewed again, which may be awarded again
+after an hour).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.webhook_event import WebhookIdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_IDEMPOTENCY_TTL_HOURS = int(os.getenv("WEBHOOK_IDEMPOTENCY_TTL_HOURS", 24))
+# Retry window of keys derived from the payload; keep it well under an hour
+WEBHOOK_DERIVED_KEY_TTL_MINUTES = int(os.getenv("WEBHOOK_DERIVED_KEY_TTL_MINUTES", 10))
+WEBHOOK_IDEMPOTENCY_LRU_SIZE = int(os.getenv("WEBHOOK_IDEMPOTENCY_LRU_SIZE", 10000))
+# Expired keys are purged from the table after this many new claims
+WEBHOOK_IDEMPOTENCY_PURGE_EVERY = int(os.getenv("WEBHOOK_IDEMPOTENCY_PURGE_EVERY", 1000))
+
+# Marks derived keys; the digest is shortened to keep keys at 64 characters
+DERIVED_KEY_PREFIX = "p:"
+
+
+class WebhookIdempotency:
+    """Detects duplicate webhook deliveries before any handler runs."""
+
+    def __init__(
+        self,
+        lru_size: int = WEBHOOK_IDEMPOTENCY_LRU_SIZE,
+        ttl_hours: int = WEBHOOK_IDEMPOTENCY_TTL_HOURS,
+        derived_ttl_minutes: int = WEBHOOK_DERIVED_KEY_TTL_MINUTES
+    ):
+        self.lru_size = lru_size
+        self.ttl = timedelta(hours=ttl_hours)
+        self.derived_ttl = timedelta(minutes=derived_ttl_minutes)
+        # key -> monotonic expiry time
+        self._recent: "OrderedDict[str, float]" = OrderedDict()
+        self._claims_since_purge = 0
+        self.stats = {"claimed": 0, "duplicates_memory": 0, "duplicates_db": 0, "released": 0}
+
+    @staticmethod
+    def derive_key(event_path: str, data: dict, header_key: Optional[str] = None) -> str:
+        """Build a fixed-length key for an event; keys derived from the payload carry DERIVED_KEY_PREFIX."""
+        raw = header_key or data.get("idempotency_key") or data.get("event_id")
+        if raw:
+            return hashlib.sha256(f"{event_path}:{raw}".encode("utf-8")).hexdigest()
+        source = f"{event_path}:{json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)}"
+        digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        return DERIVED_KEY_PREFIX + digest[:64 - len(DERIVED_KEY_PREFIX)]
+
+    def ttl_for(self, key: str) -> timedelta:
+        """How long a claimed key suppresses its event"""
+        return self.derived_ttl if key.startswith(DERIVED_KEY_PREFIX) else self.ttl
+
+    def seen(self, key: str) -> bool:
+        """Check the in-memory LRU only."""
+        expires_at = self._recent.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._recent[key]
+            return False
+        self._recent.move_to_end(key)
+        return True
+
+    def remember(self, key: str):
+        self._recent[key] = time.monotonic() + self.ttl_for(key).total_seconds()
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+
+    def claim(self, db: Session, key: str, event_path: str, commit: bool = True) -> bool:
+        """
+        Claim a key for processing.
+
+        Args:
+            db: Database session
+            key: Idempotency key of the event
+            event_path: The event path, stored for inspection
+            commit: Commit the claim immediately. Pass False to make the claim
+                part of the caller's transaction and call ``remember`` after it commits.
+
+        Returns:
+            bool: True if the event is new, False if it is a duplicate
+        """
+        if self.seen(key):
+            self.stats["duplicates_memory"] += 1
+            return False
+
+        now = datetime.utcnow()
+        cutoff = now - self.ttl_for(key)
+        # Insert, or take over an expired key; an unexpired conflict returns no row
+        statement = insert(WebhookIdempotencyKey).values(
+            key=key, event_path=event_path, created_at=now
+        ).on_conflict_do_update(
+            index_elements=[WebhookIdempotencyKey.key],
+            set_={"event_path": event_path, "created_at": now},
+            where=WebhookIdempotencyKey.created_at < cutoff
+        ).returning(WebhookIdempotencyKey.key)
+
+        claimed = db.execute(statement).first() is not None
+        if not claimed:
+            if commit:
+                db.commit()
+                self.remember(key)
+            self.stats["duplicates_db"] += 1
+            logger.info(f"Duplicate webhook {event_path} suppressed (key={key[:12]})")
+            return False
+
+        self.stats["claimed"] += 1
+        self._claims_since_purge += 1
+        if self._claims_since_purge >= WEBHOOK_IDEMPOTENCY_PURGE_EVERY:
+            self._claims_since_purge = 0
+            self.purge_expired(db)
+
+        if commit:
+            db.commit()
+            self.remember(key)
+        return True
+
+    def release(self, db: Session, key: str):
+        """Forget a claimed key so a retry of a failed event is processed again."""
+        self._recent.pop(key, None)
+        try:
+            db.rollback()
+            db.query(WebhookIdempotencyKey).filter(WebhookIdempotencyKey.key == key).delete(synchronize_session=False)
+            db.commit()
+            self.stats["released"] += 1
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to release idempotency key {key[:12]}: {e}")
+
+    def purge_expired(self, db: Session) -> int:
+        """Delete keys older than their retention window."""
+        now = datetime.utcnow()
+        deleted = db.query(WebhookIdempotencyKey).filter(or_(
+            WebhookIdempotencyKey.created_at < now - self.ttl,
+            and_(
+                WebhookIdempotencyKey.key.startswith(DERIVED_KEY_PREFIX, autoescape=True),
+                WebhookIdempotencyKey.created_at < now - self.derived_ttl
+            )
+        )).delete(synchronize_session=False)
+        if deleted:
+            logger.info(f"Purged {deleted} expired webhook idempotency keys")
+        return deleted
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "lru_size": len(self._recent),
+            "ttl_hours": self.ttl.total_seconds() / 3600,
+            "derived_ttl_minutes": self.derived_ttl.total_seconds() / 60,
+        }
+
+
+# Global instance
+webhook_idempotency = WebhookIdempotency()
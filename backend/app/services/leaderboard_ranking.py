@@ -0,0 +1,527 @@
+"""
+Incrementally maintained leaderboard rankings.
+
+Every active leaderboard is kept in memory as a sorted list of
+(-score, user_id) keys, so a score change and a rank lookup cost O(log n).
+XP awards are picked up from the session when their ExperiencePoints rows
+are flushed, and applied to the affected user's score on every matching
+"exp" leaderboard once the transaction commits. No award path needs to know
+about leaderboards.
+
+Score changes are persisted to ``leaderboard_entries`` by a background task
+every ``LEADERBOARD_FLUSH_SECONDS``. Each worker process keeps its own boards
+and only sees its own awards, so a flush adds the per-user deltas recorded
+since the last flush to the stored scores (``score = score + delta``) rather
+than writing absolute values, then re-ranks only the entries scored within
+the range the changed users moved across. Both run under a per-leaderboard
+advisory lock, so concurrent flushes of one board are serialized.
+
+A board is recomputed from the source tables only when it is loaded: on
+startup or first use, by an explicit recompute, and every
+``LEADERBOARD_RELOAD_SECONDS`` to drop XP that fell out of a weekly or
+monthly window. The next flush reconciles the stored entries with the
+recomputation, leaving out users awarded XP recently, whose deltas may
+still be pending in another worker.
+After a flush, the top of every changed board is published to its course's
+``leaderboard:<course_id>`` channel (``leaderboard:global`` for boards without
+a course) for WebSocket subscribers.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+from sqlalchemy import event, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.database import after_commit
+from app.database.connection import SessionLocal
+from app.models.leaderboard import Leaderboard, LeaderboardEntry, ExperiencePoint
+from app.models.quest import ExperiencePoints
+from app.services.notification_dispatcher import notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_FLUSH_SECONDS = float(os.getenv("LEADERBOARD_FLUSH_SECONDS", 10))
+LEADERBOARD_RELOAD_SECONDS = float(os.getenv("LEADERBOARD_RELOAD_SECONDS", 900))
+# Entries included in a leaderboard channel update
+LEADERBOARD_PUBLISH_TOP = int(os.getenv("LEADERBOARD_PUBLISH_TOP", 10))
+
+PENDING_XP_KEY = "leaderboard_pending_xp"
+
+# First key of the (namespace, leaderboard_id) advisory locks held while flushing a board
+LEADERBOARD_LOCK_NAMESPACE = int(os.getenv("LEADERBOARD_LOCK_NAMESPACE", 7301))
+# Users awarded XP this recently are left out of reconciliation, other workers may not have flushed them yet
+LEADERBOARD_RECONCILE_GRACE_SECONDS = float(
+    os.getenv("LEADERBOARD_RECONCILE_GRACE_SECONDS", 3 * LEADERBOARD_FLUSH_SECONDS)
+)
+
+# Rank the entries scored within [low, high], either bound NULL for an open
+# range, offset by the number of entries scored above the range
+RANK_RANGE_SQL = text("""
+    WITH ranked AS (
+        SELECT user_id,
+               (SELECT count(*) FROM leaderboard_entries
+                WHERE leaderboard_id = :leaderboard_id AND score > :high)
+               + row_number() OVER (ORDER BY score DESC, user_id) AS rank
+        FROM leaderboard_entries
+        WHERE leaderboard_id = :leaderboard_id
+          AND (CAST(:low AS numeric) IS NULL OR score >= :low)
+          AND (CAST(:high AS numeric) IS NULL OR score <= :high)
+    )
+    UPDATE leaderboard_entries entry
+    SET rank = ranked.rank, last_updated = now()
+    FROM ranked
+    WHERE entry.leaderboard_id = :leaderboard_id
+      AND entry.user_id = ranked.user_id
+      AND entry.rank IS DISTINCT FROM ranked.rank
+    RETURNING entry.user_id, entry.score
+""")
+
+
+@dataclass
+class XPAward:
+    user_id: int
+    course_id: Optional[int]
+    amount: int
+    awarded_at: datetime
+
+
+@dataclass
+class RankedBoard:
+    """Scores of one leaderboard, ordered by score descending then user ID."""
+
+    leaderboard_id: int
+    course_id: Optional[int]
+    metric_type: str
+    window_start: Optional[datetime]
+    scores: Dict[int, float] = field(default_factory=dict)
+    order: SortedList = field(default_factory=SortedList)
+    # Score changes applied since the last flush, by user
+    deltas: Dict[int, float] = field(default_factory=dict)
+    # Reconcile the persisted entries with the loaded scores on the next flush
+    reconcile: bool = False
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def load(self, scores: List[Tuple[int, float]]):
+        self.scores = {user_id: float(score or 0) for user_id, score in scores}
+        self.order = SortedList((-score, user_id) for user_id, score in self.scores.items())
+        self.reconcile = True
+        self.loaded_at = time.monotonic()
+
+    def add(self, user_id: int, amount: float):
+        self._set(user_id, self.scores.get(user_id, 0.0) + amount)
+        self.deltas[user_id] = self.deltas.get(user_id, 0.0) + amount
+
+    def refresh(self, scores: Dict[int, Decimal]):
+        """Take persisted scores, keeping the deltas not flushed yet."""
+        for user_id, score in scores.items():
+            self._set(user_id, float(score) + self.deltas.get(user_id, 0.0))
+
+    def matches(self, award: XPAward) -> bool:
+        if self.metric_type != "exp":
+            return False
+        if self.course_id is not None and award.course_id != self.course_id:
+            return False
+        return self.window_start is None or award.awarded_at >= self.window_start
+
+    def rank(self, user_id: int) -> Optional[int]:
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return self.order.index((-score, user_id)) + 1
+
+    def entries(self, start: int = 0, stop: Optional[int] = None) -> List[Tuple[int, int, float]]:
+        """(rank, user_id, score) for rank indexes start..stop-1."""
+        return [
+            (index + 1, user_id, -negative_score)
+            for index, (negative_score, user_id) in enumerate(self.order.islice(start, stop), start)
+        ]
+
+    def take_deltas(self) -> Dict[int, float]:
+        """Deltas to persist, resetting them."""
+        deltas, self.deltas = self.deltas, {}
+        return deltas
+
+    def restore_deltas(self, deltas: Dict[int, float]):
+        """Put back deltas whose flush failed."""
+        for user_id, delta in deltas.items():
+            self.deltas[user_id] = self.deltas.get(user_id, 0.0) + delta
+
+    def _set(self, user_id: int, score: float):
+        old_score = self.scores.get(user_id)
+        if old_score is not None:
+            self.order.remove((-old_score, user_id))
+        self.scores[user_id] = score
+        self.order.add((-score, user_id))
+
+
+class LeaderboardRankingEngine:
+    """Keeps every active leaderboard ranked in memory and persists changes in batches."""
+
+    def __init__(self):
+        self.boards: Dict[int, RankedBoard] = {}
+        self._lock = threading.RLock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {
+            "xp_awards_applied": 0, "score_updates": 0, "flushes": 0,
+            "entries_upserted": 0, "reloads": 0, "reconciliations": 0
+        }
+
+    # Loading
+
+    def load(self, db: Session, leaderboard: Leaderboard) -> RankedBoard:
+        """(Re)compute a leaderboard's scores from the database; the next flush reconciles the stored entries."""
+        from app.crud.leaderboard import calculate_scores_for_leaderboard, get_date_filter_for_timeframe
+
+        window_start = get_date_filter_for_timeframe(leaderboard.timeframe)
+        scores = calculate_scores_for_leaderboard(db, leaderboard)
+        with self._lock:
+            board = self.boards.get(leaderboard.leaderboard_id)
+            if board is None:
+                board = RankedBoard(
+                    leaderboard_id=leaderboard.leaderboard_id,
+                    course_id=leaderboard.course_id,
+                    metric_type=leaderboard.metric_type,
+                    window_start=window_start
+                )
+                self.boards[leaderboard.leaderboard_id] = board
+            board.course_id = leaderboard.course_id
+            board.metric_type = leaderboard.metric_type
+            board.window_start = window_start.replace(tzinfo=timezone.utc) if window_start else None
+            board.load(scores)
+            self.stats["reloads"] += 1
+        return board
+
+    def load_all(self, db: Session):
+        """Load every active leaderboard."""
+        for leaderboard in db.query(Leaderboard).filter(Leaderboard.is_active == True).all():
+            self.load(db, leaderboard)
+
+    def get_board(self, db: Session, leaderboard_id: int) -> Optional[RankedBoard]:
+        """The in-memory board, loading it on first use."""
+        board = self.boards.get(leaderboard_id)
+        if board is not None:
+            return board
+        leaderboard = db.query(Leaderboard).filter(Leaderboard.leaderboard_id == leaderboard_id).first()
+        if not leaderboard:
+            return None
+        return self.load(db, leaderboard)
+
+    def forget(self, leaderboard_id: int):
+        """Drop a deleted or reconfigured leaderboard; it is reloaded on next use."""
+        with self._lock:
+            self.boards.pop(leaderboard_id, None)
+
+    # Incremental updates
+
+    def apply_xp(self, awards: List[XPAward]):
+        """Add committed XP awards to every matching leaderboard."""
+        with self._lock:
+            for award in awards:
+                for board in self.boards.values():
+                    if board.matches(award):
+                        board.add(award.user_id, award.amount)
+                        self.stats["score_updates"] += 1
+                self.stats["xp_awards_applied"] += 1
+
+    def rank_of(self, db: Session, leaderboard_id: int, user_id: int) -> Optional[dict]:
+        """A user's current rank and score, in O(log n)."""
+        board = self.get_board(db, leaderboard_id)
+        if board is None:
+            return None
+        with self._lock:
+            rank = board.rank(user_id)
+            if rank is None:
+                return None
+            return {"rank": rank, "score": board.scores[user_id], "total_participants": len(board.order)}
+
+    # Persistence
+
+    def flush(self, db: Session, leaderboard_ids: Optional[List[int]] = None) -> int:
+        """
+        Persist the boards changed since the last flush, or the given boards.
+
+        Adds each board's pending score deltas to the stored entries and
+        re-ranks the affected score range, reconciling boards loaded since
+        their last flush first. Advisory locks are taken in leaderboard
+        order, so concurrent flushes cannot deadlock.
+        """
+        with self._lock:
+            if leaderboard_ids is None:
+                leaderboard_ids = [
+                    leaderboard_id for leaderboard_id, board in self.boards.items()
+                    if board.deltas or board.reconcile
+                ]
+        leaderboard_ids = sorted(set(leaderboard_ids))
+        if not leaderboard_ids:
+            return 0
+
+        written, updates = 0, {}
+        taken: Dict[int, Tuple[Dict[int, float], bool]] = {}
+        try:
+            for leaderboard_id in leaderboard_ids:
+                db.execute(select(func.pg_advisory_xact_lock(LEADERBOARD_LOCK_NAMESPACE, leaderboard_id)))
+            for leaderboard_id in leaderboard_ids:
+                board = self.get_board(db, leaderboard_id)
+                if board is None:
+                    continue
+                with self._lock:
+                    deltas = board.take_deltas()
+                    reconcile, board.reconcile = board.reconcile, False
+                    scores = dict(board.scores)
+                    taken[leaderboard_id] = (deltas, reconcile)
+                count = 0
+                if reconcile:
+                    count += self._reconcile(db, board, scores, set(deltas))
+                if deltas:
+                    count += self._apply_deltas(db, board, deltas)
+                if count:
+                    db.query(Leaderboard).filter(Leaderboard.leaderboard_id == leaderboard_id).update(
+                        {"last_updated": func.now()}, synchronize_session=False
+                    )
+                    updates[leaderboard_id] = self._top(db, board)
+                written += count
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for leaderboard_id, (deltas, reconcile) in taken.items():
+                    board = self.boards.get(leaderboard_id)
+                    if board:
+                        board.restore_deltas(deltas)
+                        board.reconcile = board.reconcile or reconcile
+            raise
+        self.stats["flushes"] += 1
+        self.stats["entries_upserted"] += written
+        for board_update in updates.values():
+            notification_dispatcher.publish(leaderboard_channel(board_update["course_id"]), board_update)
+        return written
+
+    def _apply_deltas(self, db: Session, board: RankedBoard, deltas: Dict[int, float]) -> int:
+        """Add score deltas to the stored entries and re-rank the range the users moved across."""
+        user_ids = list(deltas)
+        previous = dict(db.execute(
+            select(LeaderboardEntry.user_id, LeaderboardEntry.score).where(
+                LeaderboardEntry.leaderboard_id == board.leaderboard_id,
+                LeaderboardEntry.user_id.in_(user_ids)
+            )
+        ).all())
+        statement = insert(LeaderboardEntry).values([
+            {"leaderboard_id": board.leaderboard_id, "user_id": user_id, "score": _to_score(delta)}
+            for user_id, delta in deltas.items()
+        ])
+        updated = dict(db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[LeaderboardEntry.leaderboard_id, LeaderboardEntry.user_id],
+                set_={"score": LeaderboardEntry.score + statement.excluded.score, "last_updated": func.now()}
+            ).returning(LeaderboardEntry.user_id, LeaderboardEntry.score)
+        ).all())
+
+        scores = list(previous.values()) + list(updated.values())
+        # A new entry moves everyone scored below it down one rank
+        low = min(scores) if len(previous) == len(user_ids) else None
+        reranked = self._rank_range(db, board.leaderboard_id, low, max(scores))
+        with self._lock:
+            board.refresh({**reranked, **updated})
+        return len(set(updated) | set(reranked))
+
+    def _reconcile(self, db: Session, board: RankedBoard, scores: Dict[int, float], pending: Set[int]) -> int:
+        """
+        Write the recomputed scores of a freshly loaded board and rank it from scratch.
+
+        Users with pending deltas here, or awarded XP since shortly before
+        the board was loaded, are skipped: the stored entry may lack deltas
+        other workers have not flushed yet, and their flushes add to it.
+        """
+        skipped = set(pending)
+        if board.metric_type == "exp":
+            since = LEADERBOARD_RECONCILE_GRACE_SECONDS + time.monotonic() - board.loaded_at
+            recent = select(ExperiencePoint.user_id).where(
+                ExperiencePoint.awarded_at >= func.now() - timedelta(seconds=since)
+            )
+            if board.course_id is not None:
+                recent = recent.where(ExperiencePoint.course_id == board.course_id)
+            skipped |= set(db.execute(recent.distinct()).scalars())
+
+        stored = dict(db.execute(
+            select(LeaderboardEntry.user_id, LeaderboardEntry.score).where(
+                LeaderboardEntry.leaderboard_id == board.leaderboard_id
+            )
+        ).all())
+        removed = [user_id for user_id in stored if user_id not in scores and user_id not in skipped]
+        changed = {
+            user_id: _to_score(score) for user_id, score in scores.items()
+            if user_id not in skipped and stored.get(user_id) != _to_score(score)
+        }
+        if removed:
+            db.query(LeaderboardEntry).filter(
+                LeaderboardEntry.leaderboard_id == board.leaderboard_id,
+                LeaderboardEntry.user_id.in_(removed)
+            ).delete(synchronize_session=False)
+        if changed:
+            statement = insert(LeaderboardEntry).values([
+                {"leaderboard_id": board.leaderboard_id, "user_id": user_id, "score": score}
+                for user_id, score in changed.items()
+            ])
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[LeaderboardEntry.leaderboard_id, LeaderboardEntry.user_id],
+                set_={"score": statement.excluded.score, "last_updated": func.now()}
+            ))
+        reranked = self._rank_range(db, board.leaderboard_id, None, None)
+        self.stats["reconciliations"] += 1
+        return len(set(removed) | set(changed) | set(reranked))
+
+    def _rank_range(
+        self, db: Session, leaderboard_id: int, low: Optional[Decimal], high: Optional[Decimal]
+    ) -> Dict[int, Decimal]:
+        """Rewrite the changed ranks of entries scored within [low, high]; returns their users' scores."""
+        return dict(db.execute(
+            RANK_RANGE_SQL, {"leaderboard_id": leaderboard_id, "low": low, "high": high}
+        ).all())
+
+    def _top(self, db: Session, board: RankedBoard) -> dict:
+        """Channel update with the stored top of a board."""
+        top = db.execute(
+            select(LeaderboardEntry.rank, LeaderboardEntry.user_id, LeaderboardEntry.score)
+            .where(LeaderboardEntry.leaderboard_id == board.leaderboard_id)
+            .order_by(LeaderboardEntry.score.desc(), LeaderboardEntry.user_id)
+            .limit(LEADERBOARD_PUBLISH_TOP)
+        ).all()
+        return {
+            "leaderboard_id": board.leaderboard_id,
+            "course_id": board.course_id,
+            "metric_type": board.metric_type,
+            "total_participants": len(board.order),
+            "top": [{"rank": rank, "user_id": user_id, "score": float(score)} for rank, user_id, score in top],
+        }
+
+    def _reload_stale(self, db: Session):
+        """Reload boards not loaded for LEADERBOARD_RELOAD_SECONDS, so the next flush reconciles them."""
+        stale = [
+            board.leaderboard_id for board in list(self.boards.values())
+            if time.monotonic() - board.loaded_at >= LEADERBOARD_RELOAD_SECONDS
+        ]
+        for leaderboard_id in stale:
+            leaderboard = db.query(Leaderboard).filter(Leaderboard.leaderboard_id == leaderboard_id).first()
+            if leaderboard and leaderboard.is_active:
+                self.load(db, leaderboard)
+            else:
+                self.forget(leaderboard_id)
+
+    def _maintain(self):
+        with SessionLocal() as db:
+            self._reload_stale(db)
+            self.flush(db)
+
+    def start(self):
+        """Load active leaderboards and start the periodic flush on the running event loop."""
+        if self._task:
+            return
+        self._stopping = False
+        with SessionLocal() as db:
+            self.load_all(db)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Leaderboard ranking engine started with {len(self.boards)} leaderboards")
+
+    async def stop(self):
+        """Stop the periodic flush, persisting pending changes first."""
+        self._stopping = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await asyncio.to_thread(self._maintain)
+        except Exception as e:
+            logger.error(f"Final leaderboard flush failed: {e}")
+
+    async def _run(self):
+        while not self._stopping:
+            await asyncio.sleep(LEADERBOARD_FLUSH_SECONDS)
+            try:
+                await asyncio.to_thread(self._maintain)
+            except Exception as e:
+                logger.error(f"❌ Leaderboard flush failed: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "leaderboards": {
+                    leaderboard_id: {
+                        "participants": len(board.order),
+                        "pending_deltas": len(board.deltas),
+                        "reconcile_pending": board.reconcile,
+                    }
+                    for leaderboard_id, board in self.boards.items()
+                },
+            }
+
+
+def _to_score(value: float) -> Decimal:
+    """A score as stored in leaderboard_entries.score (two decimal places)."""
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def leaderboard_channel(course_id: Optional[int]) -> str:
+    return f"leaderboard:{course_id if course_id is not None else 'global'}"
+
+
+# Global instance
+leaderboard_ranking = LeaderboardRankingEngine()
+
+
+# XP awards are captured from every session, whatever code path created them
+
+def _award_time(instance) -> datetime:
+    # Read the loaded value only; a server-side default is not fetched back after flush
+    awarded_at = instance.__dict__.get("awarded_at")
+    if not isinstance(awarded_at, datetime):
+        return datetime.now(timezone.utc)
+    if awarded_at.tzinfo is None:
+        return awarded_at.replace(tzinfo=timezone.utc)
+    return awarded_at
+
+
+def collect_xp_awards(session: Session) -> List[XPAward]:
+    """XP awards among the objects a session is flushing; call from ``after_flush``."""
+    return [
+        XPAward(
+            user_id=instance.user_id,
+            course_id=instance.course_id,
+            amount=instance.amount or 0,
+            awarded_at=_award_time(instance)
+        )
+        for instance in session.new
+        if isinstance(instance, (ExperiencePoints, ExperiencePoint))
+    ]
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_xp_awards(session: Session, flush_context):
+    awards = collect_xp_awards(session)
+    if awards:
+        session.info.setdefault(PENDING_XP_KEY, []).extend(awards)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_committed_xp_awards(session: Session):
+    awards = session.info.pop(PENDING_XP_KEY, None)
+    if awards:
+        # In a unit of work this commit only released a savepoint
+        after_commit.call_after_commit(session, lambda: leaderboard_ranking.apply_xp(awards))
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _drop_rolled_back_xp_awards(session: Session, previous_transaction):
+    session.info.pop(PENDING_XP_KEY, None)
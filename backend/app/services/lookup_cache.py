@@ -0,0 +1,338 @@
+"""
+Process-wide cache of the Moodle ID lookups done by webhook processing.
+
+Maps moodle_course_id -> Course, moodle_user_id -> User and
+(course_id, moodle_activity_id) -> active quests. Entries are column
+snapshots rather than session-bound instances: a hit is merged into the
+caller's session with ``load=False``, which costs no query. User snapshots
+hold only the columns webhook processing reads, never credentials; other
+attributes load on access. Entries expire after a TTL and the least recently
+used ones are evicted once a map is full.
+Quest entries are invalidated when quests are created, updated or deleted.
+Course and user entries are invalidated from session events whenever a
+commit inserts, updates or deletes a course or user, whichever route made
+the change. Invalidation only reaches the worker process that made the
+change, so other workers rely on the TTL; quest lists use a much shorter one.
+"""
+
+import copy
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.database import after_commit
+from app.models.course import Course
+from app.models.user import User
+from app.models.quest import Quest
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_LOOKUP_CACHE_TTL_SECONDS = float(os.getenv("WEBHOOK_LOOKUP_CACHE_TTL_SECONDS", 300))
+WEBHOOK_LOOKUP_CACHE_SIZE = int(os.getenv("WEBHOOK_LOOKUP_CACHE_SIZE", 5000))
+# Quests are edited by teachers at any time, other workers see changes after this TTL
+WEBHOOK_QUEST_CACHE_TTL_SECONDS = float(os.getenv("WEBHOOK_QUEST_CACHE_TTL_SECONDS", 30))
+
+# Columns kept in cached snapshots, by model (default: all of them)
+CACHED_COLUMNS = {
+    User: ("id", "moodle_user_id", "username", "first_name", "last_name", "role", "is_active"),
+}
+
+# Session.info key of the Moodle IDs of courses and users changed by uncommitted flushes
+PENDING_INVALIDATIONS_KEY = "lookup_cache_invalidations"
+
+
+class TTLCache:
+    """Thread-safe LRU map whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (monotonic expiry time, value)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so in-flight loads don't store stale rows
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """Store a value, unless the cache was invalidated since ``generation`` was read."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches the predicate."""
+        with self._lock:
+            self.generation += 1
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def moodle_id(value: Any) -> Optional[int]:
+    """
+    A Moodle ID as an int. Moodle sends IDs as numbers or numeric strings
+    depending on the event; anything else (None, "", "abc") is not an ID.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _moodle_ids(values: Iterable[Any]) -> set:
+    return {key for key in map(moodle_id, values) if key is not None}
+
+
+def _snapshot(instance) -> dict:
+    keys = CACHED_COLUMNS.get(type(instance))
+    return {
+        attr.key: getattr(instance, attr.key) for attr in inspect(instance).mapper.column_attrs
+        if keys is None or attr.key in keys
+    }
+
+
+def _restore(db: Session, model, values: dict):
+    """
+    Attach a cached snapshot to the session as a clean persistent instance,
+    without a query. Columns missing from the snapshot load on first access.
+    """
+    mapper = inspect(model)
+    identity = mapper.identity_key_from_primary_key(
+        [values[mapper.get_property_by_column(column).key] for column in mapper.primary_key]
+    )
+    # Rows the session already holds may be newer than the snapshot
+    existing = db.identity_map.get(identity)
+    if existing is not None:
+        return existing
+    instance = model(**copy.deepcopy(values))
+    make_transient_to_detached(instance)
+    return db.merge(instance, load=False)
+
+
+class MoodleLookupCache:
+    """
+    Resolves Moodle IDs to local rows through TTL caches shared by all sessions.
+
+    Only rows that exist are cached, so a course synced, a user created or a
+    quest added after a miss is found on the next event, in every worker.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = WEBHOOK_LOOKUP_CACHE_SIZE,
+        ttl: float = WEBHOOK_LOOKUP_CACHE_TTL_SECONDS,
+        quest_ttl: float = WEBHOOK_QUEST_CACHE_TTL_SECONDS
+    ):
+        self.courses = TTLCache(maxsize, ttl)
+        self.users = TTLCache(maxsize, ttl)
+        self.quests = TTLCache(maxsize, quest_ttl)
+
+    def get_courses(self, db: Session, moodle_course_ids: Iterable[int]) -> Dict[int, Course]:
+        """Resolve courses, loading all misses with one IN (...) query."""
+        return self._resolve(db, Course, Course.moodle_course_id, self.courses, moodle_course_ids)
+
+    def get_users(self, db: Session, moodle_user_ids: Iterable[int]) -> Dict[int, User]:
+        """Resolve users, loading all misses with one IN (...) query."""
+        return self._resolve(db, User, User.moodle_user_id, self.users, moodle_user_ids)
+
+    def get_course(self, db: Session, moodle_course_id: Any) -> Optional[Course]:
+        key = moodle_id(moodle_course_id)
+        return self.get_courses(db, [key]).get(key) if key is not None else None
+
+    def get_user(self, db: Session, moodle_user_id: Any) -> Optional[User]:
+        key = moodle_id(moodle_user_id)
+        return self.get_users(db, [key]).get(key) if key is not None else None
+
+    def _resolve(self, db: Session, model, column, cache: TTLCache, moodle_ids: Iterable[Any]) -> Dict[int, Any]:
+        """Rows by int Moodle ID; IDs may be given as numeric strings, others are skipped."""
+        found, missing = {}, set()
+        for key in _moodle_ids(moodle_ids):
+            values = cache.get(key)
+            if values is None:
+                missing.add(key)
+            else:
+                found[key] = _restore(db, model, values)
+
+        if missing:
+            generation = cache.generation
+            for row in db.query(model).filter(column.in_(missing)).all():
+                key = getattr(row, column.key)
+                found.setdefault(key, row)
+                cache.set(key, _snapshot(row), generation)
+        return found
+
+    def get_quests(
+        self, db: Session, course_ids: Iterable[int], moodle_activity_ids: Iterable[int]
+    ) -> Dict[Tuple[int, int], List[Quest]]:
+        """
+        Resolve the active quests of every (course, activity) pair, ordered by quest_id.
+
+        Misses are loaded with one query over all missing courses and activities.
+        """
+        keys = {
+            (course_id, activity_id)
+            for course_id in _moodle_ids(course_ids) for activity_id in _moodle_ids(moodle_activity_ids)
+        }
+        found, missing = {}, set()
+        for key in keys:
+            snapshots = self.quests.get(key)
+            if snapshots is None:
+                missing.add(key)
+            else:
+                found[key] = [_restore(db, Quest, values) for values in snapshots]
+
+        if missing:
+            generation = self.quests.generation
+            loaded = {key: [] for key in missing}
+            quests = db.query(Quest).filter(
+                Quest.course_id.in_({course_id for course_id, _ in missing}),
+                Quest.moodle_activity_id.in_({activity_id for _, activity_id in missing}),
+                Quest.is_active == True
+            ).order_by(Quest.quest_id).all()
+            for quest in quests:
+                key = (quest.course_id, quest.moodle_activity_id)
+                if key in loaded:
+                    loaded[key].append(quest)
+            for key, key_quests in loaded.items():
+                if key_quests:
+                    self.quests.set(key, [_snapshot(quest) for quest in key_quests], generation)
+            found.update(loaded)
+        return found
+
+    def get_activity_quests(self, db: Session, course_id: int, moodle_activity_id: Any) -> List[Quest]:
+        key = (moodle_id(course_id), moodle_id(moodle_activity_id))
+        return self.get_quests(db, [course_id], [moodle_activity_id]).get(key, [])
+
+    def invalidate_quests(self, *course_ids: Optional[int]):
+        """Forget cached quests of the given local courses, or of all courses."""
+        if not course_ids or None in course_ids:
+            self.quests.clear()
+            return
+        dropped = self.quests.discard_where(lambda key: key[0] in course_ids)
+        logger.debug(f"Invalidated {dropped} cached quest lookups for courses {course_ids}")
+
+    def invalidate_courses(self, *moodle_course_ids: int):
+        """Forget the given cached courses, or all of them."""
+        if not moodle_course_ids:
+            self.courses.clear()
+            return
+        keys = _moodle_ids(moodle_course_ids)
+        self.courses.discard_where(lambda key: key in keys)
+
+    def invalidate_users(self, *moodle_user_ids: int):
+        """Forget the given cached users, or all of them."""
+        if not moodle_user_ids:
+            self.users.clear()
+            return
+        keys = _moodle_ids(moodle_user_ids)
+        self.users.discard_where(lambda key: key in keys)
+
+    def clear(self):
+        self.courses.clear()
+        self.users.clear()
+        self.quests.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "ttl_seconds": self.courses.ttl,
+            "quest_ttl_seconds": self.quests.ttl,
+            "courses": self.courses.get_stats(),
+            "users": self.users.get_stats(),
+            "quests": self.quests.get_stats(),
+        }
+
+
+# Global instance
+lookup_cache = MoodleLookupCache()
+
+
+def _flushed_moodle_ids(instance, attribute: str) -> set:
+    """Moodle IDs an instance had before and after the flush"""
+    return _moodle_ids(inspect(instance).attrs[attribute].history.sum())
+
+
+def collect_changed_lookups(session: Session) -> Tuple[set, set]:
+    """Moodle IDs of the courses and users a session is flushing; call from ``after_flush``."""
+    courses, users = set(), set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Course):
+            courses |= _flushed_moodle_ids(instance, "moodle_course_id")
+        elif isinstance(instance, User):
+            users |= _flushed_moodle_ids(instance, "moodle_user_id")
+    return courses, users
+
+
+# Registered on every session, not only SessionLocal's, so no write site is missed
+@event.listens_for(Session, "after_flush")
+def _collect_changed_lookups(session: Session, flush_context):
+    courses, users = collect_changed_lookups(session)
+    if courses or users:
+        pending = session.info.setdefault(PENDING_INVALIDATIONS_KEY, (set(), set()))
+        pending[0].update(courses)
+        pending[1].update(users)
+
+
+def _invalidate(courses: set, users: set):
+    if courses:
+        lookup_cache.invalidate_courses(*courses)
+    if users:
+        lookup_cache.invalidate_users(*users)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_lookups(session: Session):
+    pending = session.info.pop(PENDING_INVALIDATIONS_KEY, None)
+    if pending:
+        # In a unit of work this commit only released a savepoint
+        after_commit.call_after_commit(session, lambda: _invalidate(*pending))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back_lookups(session: Session, previous_transaction):
+    session.info.pop(PENDING_INVALIDATIONS_KEY, None)
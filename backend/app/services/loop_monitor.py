@@ -0,0 +1,243 @@
+"""
+Opt-in event-loop stall detector.
+
+With ``LOOP_STALL_MONITOR=true`` a ticker task on the event loop records
+when the loop last ran, and a watchdog thread checks it. When the loop has
+not run for ``LOOP_STALL_THRESHOLD_MS``, the watchdog captures the stack
+the loop thread is executing and the task it belongs to; that is the code
+blocking the loop, e.g. synchronous ORM work or ``requests`` in an
+``async def`` route. Once the loop runs again the stall's duration is
+known and it is recorded against the route (or background task) it was
+captured in.
+
+``LoopStallMiddleware`` maps request tasks to their ASGI scope, so stalls
+are attributed to the matched route template, such as
+``GET /api/auth/activities``. The report of the worst offenders is served
+at ``/api/debug/loop-stalls``.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LOOP_STALL_MONITOR = os.getenv("LOOP_STALL_MONITOR", "false").lower() == "true"
+# Loop lag reported as a stall, and how often the loop is checked
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", 100))
+LOOP_STALL_CHECK_MS = float(os.getenv("LOOP_STALL_CHECK_MS", 20))
+# Frames kept per captured stack, and recent stalls kept for the report
+LOOP_STALL_STACK_DEPTH = int(os.getenv("LOOP_STALL_STACK_DEPTH", 15))
+LOOP_STALL_RECENT = int(os.getenv("LOOP_STALL_RECENT", 50))
+
+UNATTRIBUTED = "(unknown)"
+# Backend directory; frames under it (outside installed packages) are application code
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep
+
+
+class RouteStalls:
+    """Stalls attributed to one route or background task."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.worst_stack: List[str] = []
+        self.last_seen: Optional[float] = None
+
+    def add(self, duration_ms: float, stack: List[str]):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.last_seen = time.time()
+        if duration_ms >= self.max_ms:
+            self.max_ms = duration_ms
+            self.worst_stack = stack
+
+    def to_dict(self, name: str) -> Dict[str, Any]:
+        return {
+            "route": name,
+            "stalls": self.count,
+            "total_ms": round(self.total_ms, 1),
+            "max_ms": round(self.max_ms, 1),
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0,
+            "worst_stack": self.worst_stack,
+        }
+
+
+class LoopStallMonitor:
+    """Detects event-loop stalls and attributes them to routes and stacks."""
+
+    def __init__(
+        self,
+        enabled: bool = LOOP_STALL_MONITOR,
+        threshold_ms: float = LOOP_STALL_THRESHOLD_MS,
+        check_ms: float = LOOP_STALL_CHECK_MS
+    ):
+        self.enabled = enabled
+        self.threshold = threshold_ms / 1000
+        self.check_interval = check_ms / 1000
+        self.routes: Dict[str, RouteStalls] = {}
+        self.recent: deque = deque(maxlen=LOOP_STALL_RECENT)
+        # Request task -> its ASGI scope; the route is read from the scope when a stall is captured
+        self.scopes: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = weakref.WeakKeyDictionary()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = 0.0
+        self._tick = 0
+        # Tick number -> (route, stack) captured by the watchdog while that tick was late
+        self._captured: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self.stats = {"stalls": 0, "stalled_ms": 0.0, "max_lag_ms": 0.0, "uncaptured": 0}
+
+    def start(self):
+        """Start the ticker and the watchdog thread on the running event loop."""
+        if not self.enabled or self._task:
+            return
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.perf_counter()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._ticker())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"🩺 Loop stall monitor started (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    def track(self, scope: dict):
+        """Attribute stalls in the current task to this request's route."""
+        task = asyncio.current_task()
+        if task is not None:
+            self.scopes[task] = scope
+
+    async def _ticker(self):
+        while True:
+            self._last_tick = time.perf_counter()
+            await asyncio.sleep(self.check_interval)
+            lag = time.perf_counter() - self._last_tick - self.check_interval
+            with self._lock:
+                tick, self._tick = self._tick, self._tick + 1
+                captured = self._captured.pop(tick, None)
+            self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], round(lag * 1000, 1))
+            if lag >= self.threshold:
+                self._record(lag * 1000, captured)
+
+    def _watch(self):
+        while not self._stopping.wait(self.check_interval):
+            with self._lock:
+                tick = self._tick
+                if tick in self._captured:
+                    continue
+            if time.perf_counter() - self._last_tick - self.check_interval < self.threshold:
+                continue
+            captured = self._capture()
+            with self._lock:
+                # Only keep it if the loop is still stuck on the same tick
+                if self._tick == tick:
+                    self._captured[tick] = captured
+
+    def _capture(self) -> tuple:
+        """Route and stack the loop thread is executing right now."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = format_stack(frame) if frame is not None else []
+        task = asyncio.tasks._current_tasks.get(self.loop)
+        return route_name(task, self.scopes.get(task) if task else None), stack
+
+    def _record(self, duration_ms: float, captured: Optional[tuple]):
+        if captured is None:
+            # Shorter than a watchdog check past the threshold; the duration is still counted
+            self.stats["uncaptured"] += 1
+            route, stack = UNATTRIBUTED, []
+        else:
+            route, stack = captured
+        self.stats["stalls"] += 1
+        self.stats["stalled_ms"] = round(self.stats["stalled_ms"] + duration_ms, 1)
+        self.routes.setdefault(route, RouteStalls()).add(duration_ms, stack)
+        self.recent.append({"route": route, "duration_ms": round(duration_ms, 1), "at": time.time()})
+        logger.warning(f"⚠️  Event loop stalled {duration_ms:.0f}ms in {route}")
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        """Routes that stalled the loop the longest in total, worst first."""
+        worst = sorted(self.routes.items(), key=lambda item: item[1].total_ms, reverse=True)[:limit]
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold * 1000,
+            **self.stats,
+            "routes": [stalls.to_dict(name) for name, stalls in worst],
+            "recent": list(self.recent),
+        }
+
+    def reset(self):
+        self.routes.clear()
+        self.recent.clear()
+        self.stats.update({"stalls": 0, "stalled_ms": 0.0, "max_lag_ms": 0.0, "uncaptured": 0})
+
+
+class LoopStallMiddleware:
+    """ASGI middleware registering each request's task with the loop monitor."""
+
+    def __init__(self, app, monitor: LoopStallMonitor = None):
+        self.app = app
+        self.monitor = monitor or loop_monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            self.monitor.track(scope)
+        await self.app(scope, receive, send)
+
+
+def route_name(task: Optional[asyncio.Task], scope: Optional[dict]) -> str:
+    """Route template of a request scope, or the coroutine of a background task"""
+    if scope is not None:
+        method = scope.get("method", "WS")
+        route = scope.get("route")
+        return f"{method} {getattr(route, 'path', None) or scope.get('path')}"
+    if task is not None:
+        coro = task.get_coro()
+        return f"task {getattr(coro, '__qualname__', task.get_name())}"
+    return UNATTRIBUTED
+
+
+def format_stack(frame) -> List[str]:
+    """
+    Innermost frame of a stack and the application frames leading to it,
+    innermost first, as "file:line in function" strings. Library frames in
+    between (SQLAlchemy, requests) are left out so the route's own code shows.
+    """
+    frames = traceback.extract_stack(frame)[::-1]
+    app_frames = [
+        summary for summary in frames[1:]
+        if summary.filename.startswith(APP_ROOT)
+        and "site-packages" not in summary.filename
+        and summary.filename != __file__
+    ]
+    kept = (frames[:1] + app_frames) if app_frames else frames
+    return [
+        f"{summary.filename.replace(APP_ROOT, '')}:{summary.lineno} in {summary.name}"
+        for summary in kept[:LOOP_STALL_STACK_DEPTH]
+    ]
+
+
+# Global instance
+loop_monitor = LoopStallMonitor()
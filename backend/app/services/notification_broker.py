@@ -0,0 +1,244 @@
+"""
+Notification brokers that carry notifications between API workers.
+
+SSE connections live in the worker that accepted them, so a notification
+raised by another worker (or pod) has to travel through a broker. Every
+worker subscribes once, when it starts, and hands each message it receives
+to its own connections. Messages a worker publishes are delivered to its
+own connections directly and skipped when they come back from the broker.
+
+``NOTIFICATION_BROKER`` selects the backend:
+
+- ``memory`` (default): single worker, no broker traffic.
+- ``postgres``: LISTEN/NOTIFY on the application database.
+- ``redis``: Redis pub/sub at ``REDIS_URL``; needs the ``redis`` package.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.database.connection import engine
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_BROKER = os.getenv("NOTIFICATION_BROKER", "memory").lower()
+NOTIFICATION_BROKER_CHANNEL = os.getenv("NOTIFICATION_BROKER_CHANNEL", "moodlequest_notifications")
+NOTIFICATION_BROKER_RECONNECT_SECONDS = float(os.getenv("NOTIFICATION_BROKER_RECONNECT_SECONDS", 2.0))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# NOTIFY payloads must stay under 8000 bytes
+POSTGRES_MAX_PAYLOAD_BYTES = 7900
+
+# Identifies this worker's messages when they come back from the broker
+WORKER_ID = uuid.uuid4().hex
+
+Message = Dict[str, Any]
+DeliverCallback = Callable[[Message], Awaitable[None]]
+
+
+class NotificationBroker:
+    """In-memory broker: messages only reach connections of this worker."""
+
+    name = "memory"
+    # Largest message the backend carries, in encoded JSON bytes (None: no limit)
+    max_payload_bytes: Optional[int] = None
+
+    def __init__(self):
+        self.deliver: Optional[DeliverCallback] = None
+        self.stats = {"published": 0, "received": 0, "publish_errors": 0}
+
+    async def start(self, deliver: DeliverCallback):
+        """Subscribe, passing messages from other workers to ``deliver``."""
+        self.deliver = deliver
+
+    async def stop(self):
+        self.deliver = None
+
+    async def publish(self, message: Message):
+        """Send a message to the other workers; the caller delivers it locally. Raises if it could not be sent."""
+        self.stats["published"] += 1
+
+    async def _receive(self, payload):
+        try:
+            message = json.loads(payload)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Invalid notification broker message: {e}")
+            return
+        if message.get("origin") == WORKER_ID or self.deliver is None:
+            return
+        self.stats["received"] += 1
+        await self.deliver(message)
+
+    def get_stats(self) -> dict:
+        return {"backend": self.name, "worker_id": WORKER_ID, **self.stats}
+
+
+class PostgresNotificationBroker(NotificationBroker):
+    """LISTEN/NOTIFY on the application database, outside the connection pool."""
+
+    name = "postgres"
+    max_payload_bytes = POSTGRES_MAX_PAYLOAD_BYTES
+
+    def __init__(self, channel: str = NOTIFICATION_BROKER_CHANNEL):
+        super().__init__()
+        self.channel = channel
+        self._listen_connection = None
+        self._publish_connection = None
+        self._publish_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries = set()
+
+    async def start(self, deliver: DeliverCallback):
+        await super().start(deliver)
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        await super().stop()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for connection in (self._listen_connection, self._publish_connection):
+            if connection is not None:
+                connection.close()
+        self._listen_connection = self._publish_connection = None
+
+    async def publish(self, message: Message):
+        payload = json.dumps(message, default=str)
+        if len(payload.encode()) > self.max_payload_bytes:
+            self.stats["publish_errors"] += 1
+            logger.warning(f"Notification too large for NOTIFY ({len(payload)} bytes), delivered locally only")
+            return
+        try:
+            await asyncio.to_thread(self._notify, payload)
+            self.stats["published"] += 1
+        except Exception:
+            self.stats["publish_errors"] += 1
+            self._publish_connection = None
+            raise
+
+    def _notify(self, payload: str):
+        with self._publish_lock:
+            if self._publish_connection is None or self._publish_connection.closed:
+                self._publish_connection = self._connect()
+            with self._publish_connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+
+    @staticmethod
+    def _connect():
+        # A dedicated connection: a listener would otherwise hold a pool slot forever
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        connection = engine.dialect.loaded_dbapi.connect(*cargs, **cparams)
+        connection.autocommit = True
+        return connection
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lost = loop.create_future()
+            try:
+                connection = await asyncio.to_thread(self._connect)
+                self._listen_connection = connection
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                loop.add_reader(connection.fileno(), self._on_readable, connection, lost)
+                logger.info(f"Listening for notifications on Postgres channel '{self.channel}'")
+                await lost
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Notification listener lost its connection: {e}")
+            finally:
+                if self._listen_connection is not None:
+                    try:
+                        loop.remove_reader(self._listen_connection.fileno())
+                    except Exception:
+                        pass
+                    self._listen_connection.close()
+                    self._listen_connection = None
+            await asyncio.sleep(NOTIFICATION_BROKER_RECONNECT_SECONDS)
+
+    def _on_readable(self, connection, lost: asyncio.Future):
+        try:
+            connection.poll()
+        except Exception as e:
+            if not lost.done():
+                lost.set_exception(e)
+            return
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            task = asyncio.create_task(self._receive(notify.payload))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+
+class RedisNotificationBroker(NotificationBroker):
+    """Redis pub/sub, shared by every worker and pod connected to ``REDIS_URL``."""
+
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL, channel: str = NOTIFICATION_BROKER_CHANNEL):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: DeliverCallback):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("NOTIFICATION_BROKER=redis requires the 'redis' package")
+        await super().start(deliver)
+        self._client = redis.from_url(self.url)
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        await super().stop()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def publish(self, message: Message):
+        try:
+            await self._client.publish(self.channel, json.dumps(message, default=str))
+            self.stats["published"] += 1
+        except Exception:
+            self.stats["publish_errors"] += 1
+            raise
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    logger.info(f"Listening for notifications on Redis channel '{self.channel}'")
+                    async for item in pubsub.listen():
+                        if item.get("type") == "message":
+                            await self._receive(item["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Notification listener lost its Redis connection: {e}")
+            await asyncio.sleep(NOTIFICATION_BROKER_RECONNECT_SECONDS)
+
+
+def create_broker(backend: str = NOTIFICATION_BROKER) -> NotificationBroker:
+    """Build the broker selected by ``NOTIFICATION_BROKER``."""
+    brokers = {
+        "memory": NotificationBroker,
+        "postgres": PostgresNotificationBroker,
+        "redis": RedisNotificationBroker,
+    }
+    if backend not in brokers:
+        raise ValueError(f"Unknown NOTIFICATION_BROKER '{backend}', expected one of {sorted(brokers)}")
+    return brokers[backend]()
@@ -0,0 +1,167 @@
+"""
+Tracked delivery of real-time notifications.
+
+Webhook handlers and services hand the dispatcher a fully built
+``NotificationData``; everything the notification shows (total XP, quest
+title) is computed by the caller while its session is open, so no delivery
+touches the database through a session that may already be closed. The
+dispatcher keeps a reference to every delivery task, caps how many are
+pending and how many send at once, and on shutdown waits for the pending
+ones before the broker is stopped. Channel messages for WebSocket
+subscribers (see ``SSENotificationService.publish``) go through it too.
+
+A notification is logged and delivered to this worker's connections once;
+only its publication to the other workers through the broker is retried,
+so a broker hiccup cannot log or show a notification twice.
+
+When the caller passes its session, the notification is handed over only
+once that session's work is committed (see ``app.database.after_commit``),
+so a rolled-back webhook event sends nothing.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.database import after_commit
+from app.services.notification_service import NotificationData, notification_service
+
+logger = logging.getLogger(__name__)
+
+# Deliveries sending at the same time, and pending before new ones are rejected
+NOTIFICATION_DISPATCH_CONCURRENCY = int(os.getenv("NOTIFICATION_DISPATCH_CONCURRENCY", 50))
+NOTIFICATION_DISPATCH_MAX_PENDING = int(os.getenv("NOTIFICATION_DISPATCH_MAX_PENDING", 10000))
+NOTIFICATION_DISPATCH_RETRIES = int(os.getenv("NOTIFICATION_DISPATCH_RETRIES", 3))
+# How long shutdown waits for pending deliveries
+NOTIFICATION_DISPATCH_DRAIN_SECONDS = float(os.getenv("NOTIFICATION_DISPATCH_DRAIN_SECONDS", 10))
+
+
+class NotificationDispatcher:
+    """Owns the tasks that deliver notifications to the SSE service."""
+
+    def __init__(
+        self,
+        max_concurrency: int = NOTIFICATION_DISPATCH_CONCURRENCY,
+        max_pending: int = NOTIFICATION_DISPATCH_MAX_PENDING,
+        retries: int = NOTIFICATION_DISPATCH_RETRIES
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.retries = max(1, retries)
+        self.tasks: Set[asyncio.Task] = set()
+        self.sending = 0
+        self.closing = False
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {"dispatched": 0, "sent": 0, "failed": 0, "rejected": 0, "skipped": 0, "abandoned": 0}
+
+    def start(self):
+        """Bind to the running event loop, so threads can dispatch onto it."""
+        self.loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.closing = False
+
+    def dispatch(self, notification: NotificationData, db: Optional[Session] = None) -> bool:
+        """
+        Deliver a notification in the background.
+
+        Args:
+            notification: The notification, with everything it shows already computed
+            db: The caller's session; delivery then waits for its work to be committed
+
+        Returns:
+            bool: False if the notification was rejected or there is no event loop to deliver on
+        """
+        return self._submit(
+            lambda: notification_service.deliver_notification(notification),
+            f"notification for user {notification.user_id}",
+            db
+        )
+
+    def publish(self, channel: str, data: Any, db: Optional[Session] = None) -> bool:
+        """Publish a channel message in the background, like ``dispatch``."""
+        return self._submit(lambda: notification_service.deliver_channel(channel, data), f"message on {channel}", db)
+
+    def _submit(self, deliver: Callable[[], Awaitable[Dict[str, Any]]], label: str, db: Optional[Session]) -> bool:
+        if db is not None:
+            after_commit.call_after_commit(db, lambda: self._submit(deliver, label, None))
+            return True
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a worker thread, e.g. a sync route in the threadpool
+            if self.loop is None or self.loop.is_closed():
+                self.stats["skipped"] += 1
+                return False
+            self.loop.call_soon_threadsafe(self._spawn, deliver, label)
+            return True
+        return self._spawn(deliver, label)
+
+    def _spawn(self, deliver: Callable[[], Awaitable[Dict[str, Any]]], label: str) -> bool:
+        if self.closing or len(self.tasks) >= self.max_pending:
+            self.stats["rejected"] += 1
+            logger.warning(f"Notification dispatcher rejected a {label}")
+            return False
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        task = asyncio.create_task(self._deliver(deliver, label))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        self.stats["dispatched"] += 1
+        return True
+
+    async def _deliver(self, deliver: Callable[[], Awaitable[Dict[str, Any]]], label: str):
+        async with self._semaphore:
+            self.sending += 1
+            try:
+                try:
+                    message = await deliver()
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"❌ Failed to deliver {label}: {e}")
+                    return
+                for attempt in range(self.retries):
+                    try:
+                        await notification_service.forward(message)
+                        self.stats["sent"] += 1
+                        return
+                    except Exception as e:
+                        logger.warning(f"Failed to publish {label} (attempt {attempt + 1}/{self.retries}): {e}")
+                        if attempt < self.retries - 1:
+                            # Wait before retry with exponential backoff
+                            await asyncio.sleep(0.5 * (2 ** attempt))
+                self.stats["failed"] += 1
+                logger.error(f"❌ Failed to publish {label} to other workers after {self.retries} attempts")
+            finally:
+                self.sending -= 1
+
+    async def stop(self, timeout: float = NOTIFICATION_DISPATCH_DRAIN_SECONDS):
+        """Stop accepting notifications and wait for the pending ones."""
+        self.closing = True
+        if not self.tasks:
+            return
+        logger.info(f"Draining {len(self.tasks)} pending notifications")
+        _, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.stats["abandoned"] += len(pending)
+            logger.warning(f"⚠️  Abandoned {len(pending)} notifications still pending after {timeout}s")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "in_flight": len(self.tasks),
+            "sending": self.sending,
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+        }
+
+
+# Global instance
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,171 @@
+"""
+Persistent notification inbox with Last-Event-ID replay.
+
+Every notification is written to ``notification_log`` before it is sent,
+and its row ID becomes the SSE event ID. Each worker also keeps the last
+``NOTIFICATION_LOG_BUFFER_SIZE`` notifications of recently notified users
+in memory, so a browser that reconnects with ``Last-Event-ID`` is usually
+replayed from memory; older gaps are read from the table. Rows older than
+``NOTIFICATION_LOG_RETENTION_HOURS`` are pruned periodically.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, insert
+
+from app.database.connection import SessionLocal
+from app.models.notification import NotificationLog
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_LOG_ENABLED = os.getenv("NOTIFICATION_LOG_ENABLED", "true").lower() == "true"
+NOTIFICATION_LOG_RETENTION_HOURS = float(os.getenv("NOTIFICATION_LOG_RETENTION_HOURS", 72))
+NOTIFICATION_LOG_PRUNE_SECONDS = float(os.getenv("NOTIFICATION_LOG_PRUNE_SECONDS", 3600))
+# Notifications kept in memory per user, and users kept in memory per worker
+NOTIFICATION_LOG_BUFFER_SIZE = int(os.getenv("NOTIFICATION_LOG_BUFFER_SIZE", 50))
+NOTIFICATION_LOG_BUFFER_USERS = int(os.getenv("NOTIFICATION_LOG_BUFFER_USERS", 10000))
+# Most notifications replayed to one reconnecting client
+NOTIFICATION_LOG_REPLAY_LIMIT = int(os.getenv("NOTIFICATION_LOG_REPLAY_LIMIT", 200))
+
+
+class NotificationLogStore:
+    """Writes the notification log and replays it to reconnecting clients."""
+
+    def __init__(self, enabled: bool = NOTIFICATION_LOG_ENABLED):
+        self.enabled = enabled
+        # user_id -> deque of notifications with an event_id, oldest first
+        self.buffers: "OrderedDict[int, deque]" = OrderedDict()
+        # user_id -> highest event ID missing from the user's buffer
+        self.floors: Dict[int, int] = {}
+        # Highest event ID in the table when this worker started; the
+        # buffers hold every later notification unless they overflowed
+        self.watermark: Optional[int] = None
+        # Highest event ID of the buffers dropped to stay under NOTIFICATION_LOG_BUFFER_USERS
+        self.evicted_floor = 0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"logged": 0, "log_errors": 0, "replays": 0, "replayed_from_memory": 0, "replayed_from_db": 0, "pruned": 0}
+
+    def append(self, user_id: int, message: Dict[str, Any]) -> Optional[int]:
+        """Persist a notification; returns its event ID, or None if it could not be logged."""
+        if not self.enabled:
+            return None
+        try:
+            with SessionLocal() as db:
+                event_id = db.execute(
+                    insert(NotificationLog).values(
+                        user_id=user_id,
+                        notification=json.loads(json.dumps(message, default=str))
+                    ).returning(NotificationLog.event_id)
+                ).scalar_one()
+                db.commit()
+        except Exception as e:
+            self.stats["log_errors"] += 1
+            logger.error(f"❌ Failed to log notification for user {user_id}: {e}")
+            return None
+        self.stats["logged"] += 1
+        return event_id
+
+    def remember(self, user_id: int, message: Dict[str, Any]):
+        """Keep a sent notification in the user's in-memory buffer."""
+        event_id = message.get("event_id")
+        if event_id is None:
+            return
+        with self._lock:
+            buffer = self.buffers.get(user_id)
+            if buffer is None:
+                buffer = self.buffers[user_id] = deque()
+                self.floors[user_id] = self._base_floor()
+                while len(self.buffers) > NOTIFICATION_LOG_BUFFER_USERS:
+                    evicted_user, evicted = self.buffers.popitem(last=False)
+                    self.floors.pop(evicted_user, None)
+                    if evicted:
+                        self.evicted_floor = max(self.evicted_floor, evicted[-1]["event_id"])
+            self.buffers.move_to_end(user_id)
+            buffer.append(message)
+            if len(buffer) > NOTIFICATION_LOG_BUFFER_SIZE:
+                self.floors[user_id] = buffer.popleft()["event_id"]
+
+    def _base_floor(self) -> Optional[int]:
+        if self.watermark is None:
+            return None
+        return max(self.watermark, self.evicted_floor)
+
+    def replay(self, user_id: int, last_event_id: int) -> List[Dict[str, Any]]:
+        """Notifications of the user after ``last_event_id``, oldest first."""
+        self.stats["replays"] += 1
+        with self._lock:
+            floor = self.floors[user_id] if user_id in self.buffers else self._base_floor()
+            if floor is not None and last_event_id >= floor:
+                self.stats["replayed_from_memory"] += 1
+                return [
+                    message for message in self.buffers.get(user_id, ())
+                    if message["event_id"] > last_event_id
+                ][-NOTIFICATION_LOG_REPLAY_LIMIT:]
+        if not self.enabled:
+            return []
+
+        self.stats["replayed_from_db"] += 1
+        with SessionLocal() as db:
+            rows = db.query(NotificationLog.event_id, NotificationLog.notification).filter(
+                NotificationLog.user_id == user_id,
+                NotificationLog.event_id > last_event_id
+            ).order_by(NotificationLog.event_id.desc()).limit(NOTIFICATION_LOG_REPLAY_LIMIT).all()
+        return [{**notification, "event_id": event_id} for event_id, notification in reversed(rows)]
+
+    def prune(self) -> int:
+        """Delete notifications older than the retention window."""
+        cutoff = datetime.utcnow() - timedelta(hours=NOTIFICATION_LOG_RETENTION_HOURS)
+        with SessionLocal() as db:
+            deleted = db.query(NotificationLog).filter(
+                NotificationLog.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        self.stats["pruned"] += deleted
+        return deleted
+
+    def load_watermark(self):
+        with SessionLocal() as db:
+            self.watermark = db.query(func.coalesce(func.max(NotificationLog.event_id), 0)).scalar()
+
+    def start(self):
+        """Record the startup watermark and prune the log periodically on the running event loop."""
+        if not self.enabled or self._task:
+            return
+        self.load_watermark()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                deleted = await asyncio.to_thread(self.prune)
+                if deleted:
+                    logger.info(f"Pruned {deleted} notifications older than {NOTIFICATION_LOG_RETENTION_HOURS}h")
+            except Exception as e:
+                logger.error(f"❌ Notification log prune failed: {e}")
+            await asyncio.sleep(NOTIFICATION_LOG_PRUNE_SECONDS)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "buffered_users": len(self.buffers),
+            "retention_hours": NOTIFICATION_LOG_RETENTION_HOURS,
+        }
+
+
+# Global instance
+notification_log = NotificationLogStore()
@@ -2,13 +2,34 @@
 import asyncio
 import json
 import logging
-from typing import Dict, List, Any, Optional
+import os
+import time
+from collections import deque
+from typing import Dict, List, Any, Optional, Set, Union
 from fastapi import BackgroundTasks
 from datetime import datetime
 from sqlalchemy.orm import Session
 
+from app.database.connection import SessionLocal
+from app.models.enrollment import CourseEnrollment
+from app.models.user import User
+from app.services.notification_broker import NotificationBroker, WORKER_ID, create_broker
+from app.services.notification_log import notification_log
+
 logger = logging.getLogger(__name__)
 
+# Per-connection queue bound; a stalled browser tab can't grow memory past it
+SSE_QUEUE_MAXSIZE = int(os.getenv("SSE_QUEUE_MAXSIZE", 100))
+# What a full queue does with a new notification: drop_oldest or drop_newest
+SSE_QUEUE_DROP_POLICY = os.getenv("SSE_QUEUE_DROP_POLICY", "drop_oldest")
+# Connections whose queue stays full this long are closed
+SSE_SLOW_CONSUMER_EVICT_SECONDS = float(os.getenv("SSE_SLOW_CONSUMER_EVICT_SECONDS", 60))
+# Every connection is visited once per interval by the shared heartbeat wheel
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 30))
+SSE_HEARTBEAT_SLOTS = int(os.getenv("SSE_HEARTBEAT_SLOTS", 10))
+# WebSocket channel carrying the connection user's own notifications
+NOTIFICATIONS_CHANNEL = "notifications"
+
 class NotificationService:
     """Wrapper service for notifications that can use SSE or database storage"""
     
@@ -31,7 +52,8 @@ class NotificationService:
             )
             
             # Try to send via SSE if available
-            asyncio.create_task(notification_service.send_notification(notification_data))
+            from app.services.notification_dispatcher import notification_dispatcher
+            notification_dispatcher.dispatch(notification_data)
             
         except Exception as e:
             logger.error(f"Failed to send notification to user {user_id}: {e}")
@@ -95,75 +117,407 @@ class NotificationData:
             "id": f"{self.user_id}_{int(self.timestamp.timestamp())}"
         }
 
+class ConnectionQueue:
+    """
+    Bounded notification queue of one SSE connection.
+
+    When full, a new notification either replaces the oldest one or is
+    dropped, depending on ``drop_policy``. An xp_reward notification that
+    arrives while another one is still queued is merged into it, so a
+    burst of quiz completions reaches the browser as one "You earned N XP!".
+    """
+    
+    def __init__(self, user_id: int = 0, maxsize: int = SSE_QUEUE_MAXSIZE, drop_policy: str = SSE_QUEUE_DROP_POLICY):
+        self.user_id = user_id
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        # Notification dicts, or frames already serialized for SSE or a channel
+        self.items: deque = deque()
+        # Channels the connection subscribed to (WebSocket connections only)
+        self.channels: Set[str] = set()
+        self.closed = False
+        # Monotonic time the queue became full, None while it has room
+        self.full_since: Optional[float] = None
+        # Monotonic time something was last queued or read
+        self.last_activity = time.monotonic()
+        # A heartbeat was queued and not read yet
+        self.unread_heartbeat = False
+        self.heartbeat_slot = 0
+        self._ready = asyncio.Event()
+    
+    def put(self, message: Union[Dict[str, Any], str]) -> str:
+        """Queue a message or serialized frame; returns "queued", "coalesced" or "dropped"."""
+        self.last_activity = time.monotonic()
+        last = self.items[-1] if self.items else None
+        if (isinstance(last, dict) and isinstance(message, dict)
+                and message.get("type") == "xp_reward" and last.get("type") == "xp_reward"):
+            self.items[-1] = coalesce_xp_rewards(last, message)
+            return "coalesced"
+        
+        result = "queued"
+        if len(self.items) >= self.maxsize:
+            if self.drop_policy == "drop_newest":
+                return "dropped"
+            self.items.popleft()
+            result = "dropped"
+        self.items.append(message)
+        if len(self.items) >= self.maxsize and self.full_since is None:
+            self.full_since = time.monotonic()
+        self._ready.set()
+        return result
+    
+    def put_heartbeat(self, frame: str):
+        """Queue a serialized heartbeat frame, unless the queue is full."""
+        if len(self.items) >= self.maxsize:
+            return
+        self.items.append(frame)
+        self.unread_heartbeat = True
+        self._ready.set()
+    
+    async def get(self) -> Optional[Union[Dict[str, Any], str]]:
+        """Next message or serialized frame, or None once the connection is closed."""
+        while not self.items:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        message = self.items.popleft()
+        if len(self.items) < self.maxsize:
+            self.full_since = None
+        self.last_activity = time.monotonic()
+        self.unread_heartbeat = False
+        return message
+    
+    def close(self):
+        """Wake the reader so it ends the stream."""
+        self.closed = True
+        self.items.clear()
+        self._ready.set()
+    
+    def full_for(self) -> float:
+        return time.monotonic() - self.full_since if self.full_since is not None else 0.0
+    
+    def qsize(self) -> int:
+        return len(self.items)
+
+def coalesce_xp_rewards(queued: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge two xp_reward notifications into one that reports the combined XP"""
+    xp_earned = (queued.get("xp_earned") or 0) + (new.get("xp_earned") or 0)
+    merged = dict(new)
+    merged["xp_earned"] = xp_earned
+    merged["message"] = f"You earned {xp_earned} XP!"
+    merged["quest_data"] = {
+        **(new.get("quest_data") or {}),
+        "coalesced_count": (queued.get("quest_data") or {}).get("coalesced_count", 1) + 1
+    }
+    return merged
+
+class HeartbeatWheel:
+    """
+    Sends heartbeats to idle SSE connections from one shared timer.
+    
+    Connections are spread round-robin over ``slots`` buckets and one bucket
+    is visited every ``interval / slots`` seconds, so each connection is
+    visited once per interval without a timer of its own. A visited
+    connection gets the tick's heartbeat frame, serialized once for all of
+    them, unless something was sent to it in the last half interval. One
+    whose previous heartbeat is still unread has stopped reading and is
+    reported as dead.
+    """
+    
+    def __init__(self, interval: float = SSE_HEARTBEAT_SECONDS, slots: int = SSE_HEARTBEAT_SLOTS):
+        self.interval = interval
+        self.slots = max(1, slots)
+        self.buckets: List[Set[ConnectionQueue]] = [set() for _ in range(self.slots)]
+        self._next_slot = 0
+        self._position = 0
+        self.stats = {"ticks": 0, "heartbeats": 0, "dead": 0}
+    
+    @property
+    def tick_seconds(self) -> float:
+        return self.interval / self.slots
+    
+    def add(self, queue: ConnectionQueue):
+        queue.heartbeat_slot = self._next_slot
+        self.buckets[self._next_slot].add(queue)
+        self._next_slot = (self._next_slot + 1) % self.slots
+    
+    def remove(self, queue: ConnectionQueue):
+        self.buckets[queue.heartbeat_slot].discard(queue)
+    
+    def tick(self) -> List[ConnectionQueue]:
+        """Visit the next bucket; returns the dead connections found in it."""
+        bucket = self.buckets[self._position]
+        self._position = (self._position + 1) % self.slots
+        self.stats["ticks"] += 1
+        if not bucket:
+            return []
+        
+        frame = heartbeat_frame()
+        idle_before = time.monotonic() - self.interval / 2
+        dead = []
+        for queue in bucket:
+            if queue.unread_heartbeat:
+                dead.append(queue)
+            elif queue.last_activity <= idle_before:
+                queue.put_heartbeat(frame)
+                self.stats["heartbeats"] += 1
+        self.stats["dead"] += len(dead)
+        return dead
+    
+    def get_stats(self) -> dict:
+        return {**self.stats, "interval_seconds": self.interval, "slots": self.slots}
+
+class HeartbeatFrame(str):
+    """SSE heartbeat frame; WebSocket connections send their own compact heartbeat instead."""
+
+class ChannelFrame(str):
+    """Channel message serialized once for every subscribed WebSocket connection."""
+
+def heartbeat_frame() -> str:
+    return HeartbeatFrame(f"data: {json.dumps({'type': 'heartbeat', 'timestamp': datetime.utcnow().isoformat()})}\n\n")
+
+def channel_frame(channel: str, data: Any) -> ChannelFrame:
+    """Compact WebSocket frame of a channel message: {"c": channel, "d": data}"""
+    return ChannelFrame(json.dumps({"c": channel, "d": data}, separators=(",", ":"), default=str))
+
 class SSENotificationService:
-    """Service for managing Server-Sent Events notifications"""
+    """
+    Service for managing Server-Sent Events notifications.
     
-    def __init__(self):
-        # Dictionary to store active connections: user_id -> asyncio.Queue
-        self.active_connections: Dict[int, List[asyncio.Queue]] = {}
+    WebSocket connections use the same queues: they can join the user's
+    notifications like an SSE stream and also subscribe to named channels,
+    such as a course leaderboard, whose messages are published with
+    ``publish``.
+    """
+    
+    def __init__(self, broker: Optional[NotificationBroker] = None):
+        # Dictionary to store active connections: user_id -> queues of the user's connections
+        self.active_connections: Dict[int, List[ConnectionQueue]] = {}
+        # Channel name -> queues of the WebSocket connections subscribed to it
+        self.channels: Dict[str, Set[ConnectionQueue]] = {}
+        # Carries notifications to connections held by other workers
+        self.broker = broker or create_broker()
+        self.broker_started = False
+        self.heartbeat = HeartbeatWheel()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.stats = {"delivered": 0, "coalesced": 0, "dropped": 0, "evicted": 0, "broadcasts": 0, "broadcast_recipients": 0, "channel_messages": 0}
+    
+    async def start(self):
+        """Subscribe this worker to notifications published by the others and start heartbeats"""
+        await self.broker.start(self._deliver_from_broker)
+        self.broker_started = True
+        self._heartbeat_task = asyncio.create_task(self._run_heartbeat())
+        logger.info(f"Notification broker '{self.broker.name}' started")
+    
+    async def stop(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        if self.broker_started:
+            await self.broker.stop()
+            self.broker_started = False
+    
+    async def _run_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat.tick_seconds)
+            try:
+                for queue in self.heartbeat.tick():
+                    logger.info(f"Closing dead SSE connection of user {queue.user_id}")
+                    queue.close()
+                    await self.disconnect_user(queue.user_id, queue)
+            except Exception as e:
+                logger.error(f"❌ SSE heartbeat tick failed: {e}")
         
-    async def connect_user(self, user_id: int) -> asyncio.Queue:
+    async def connect_user(self, user_id: int) -> ConnectionQueue:
         """Connect a user to the SSE notification system"""
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        
         # Create a new queue for this connection
-        queue = asyncio.Queue()
-        self.active_connections[user_id].append(queue)
+        queue = self.open_connection(user_id)
+        self.attach_user(queue)
         
         # logger.info(f"User {user_id} connected to SSE notifications")
         return queue
     
-    async def disconnect_user(self, user_id: int, queue: asyncio.Queue):
-        """Disconnect a user from the SSE notification system"""
+    def open_connection(self, user_id: int) -> ConnectionQueue:
+        """Queue of a new connection, kept alive by heartbeats but not receiving anything yet"""
+        queue = ConnectionQueue(user_id)
+        self.heartbeat.add(queue)
+        return queue
+    
+    def attach_user(self, queue: ConnectionQueue):
+        """Deliver the user's notifications to the connection"""
+        connections = self.active_connections.setdefault(queue.user_id, [])
+        if queue not in connections:
+            connections.append(queue)
+    
+    def detach_user(self, queue: ConnectionQueue):
+        """Stop delivering the user's notifications to the connection"""
+        user_id = queue.user_id
         if user_id in self.active_connections:
             try:
                 self.active_connections[user_id].remove(queue)
                 if not self.active_connections[user_id]:
                     del self.active_connections[user_id]
-                # logger.info(f"User {user_id} disconnected from SSE notifications")
             except ValueError:
                 # Queue not in list, already removed
                 pass
     
+    def subscribe(self, channel: str, queue: ConnectionQueue):
+        queue.channels.add(channel)
+        if channel == NOTIFICATIONS_CHANNEL:
+            self.attach_user(queue)
+        else:
+            self.channels.setdefault(channel, set()).add(queue)
+    
+    def unsubscribe(self, channel: str, queue: ConnectionQueue):
+        queue.channels.discard(channel)
+        if channel == NOTIFICATIONS_CHANNEL:
+            self.detach_user(queue)
+            return
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self.channels[channel]
+    
+    async def disconnect_user(self, user_id: int, queue: ConnectionQueue):
+        """Disconnect a user from the SSE notification system"""
+        self.heartbeat.remove(queue)
+        self.detach_user(queue)
+        for channel in list(queue.channels):
+            self.unsubscribe(channel, queue)
+        # logger.info(f"User {user_id} disconnected from SSE notifications")
+    
     async def send_notification(self, notification: NotificationData):
-        """Send a notification to a specific user via SSE"""
-        user_id = notification.user_id
-        
+        """Send a notification to a user's connections on every worker"""
+        await self._forward_logged(await self.deliver_notification(notification))
+    
+    async def deliver_notification(self, notification: NotificationData) -> Dict[str, Any]:
+        """Log a notification and deliver it on this worker; returns the broker message for ``forward``"""
+        message = notification.to_dict()
+        if notification_log.enabled:
+            # Logged first so the event ID can be replayed after a reconnect
+            event_id = await asyncio.to_thread(notification_log.append, notification.user_id, message)
+            if event_id is not None:
+                message["event_id"] = event_id
+        await self.deliver_local(notification.user_id, message)
+        return {"origin": WORKER_ID, "user_id": notification.user_id, "notification": message}
+    
+    async def forward(self, message: Dict[str, Any]):
+        """Publish a message to the other workers; raises if the broker could not send it"""
+        if self.broker_started:
+            await self.broker.publish(message)
+    
+    async def _forward_logged(self, message: Dict[str, Any]):
+        try:
+            await self.forward(message)
+        except Exception as e:
+            logger.error(f"❌ Failed to publish notification: {e}")
+    
+    async def _deliver_from_broker(self, message: Dict[str, Any]):
+        if "channel" in message:
+            await self.deliver_channel_local(message["channel"], ChannelFrame(message["frame"]))
+        elif "frame" in message:
+            await self.deliver_frame_local(message["user_ids"], message["frame"])
+        else:
+            await self.deliver_local(message["user_id"], message["notification"])
+    
+    async def deliver_local(self, user_id: int, message: Dict[str, Any]):
+        """Send a notification to the user's connections held by this worker"""
+        notification_log.remember(user_id, message)
         if user_id in self.active_connections:
-            # Send to all active connections for this user
-            disconnected_queues = []
-            
-            for queue in self.active_connections[user_id]:
-                try:
-                    await queue.put(notification.to_dict())
-                    logger.debug(f"Sent notification to user {user_id}: {notification.title}")
-                except asyncio.QueueFull:
-                    logger.warning(f"Queue full for user {user_id}, dropping notification")
-                except Exception as e:
-                    logger.error(f"Failed to send notification to user {user_id}: {e}")
-                    disconnected_queues.append(queue)
-            
-            # Clean up disconnected queues
-            for queue in disconnected_queues:
-                await self.disconnect_user(user_id, queue)
+            await self._enqueue(self.active_connections[user_id], message)
         else:
-            logger.debug(f"No active connections for user {user_id}, notification not sent")
+            logger.debug(f"No active connections for user {user_id} on this worker")
+    
+    async def _enqueue(self, queues, message: Union[Dict[str, Any], str]):
+        """Put a notification or serialized frame on each of the given local connections"""
+        slow_queues = []
+        
+        for queue in list(queues):
+            result = queue.put(message)
+            if result == "queued":
+                self.stats["delivered"] += 1
+            elif result == "coalesced":
+                self.stats["coalesced"] += 1
+            else:
+                self.stats["dropped"] += 1
+                logger.warning(f"Queue full for user {queue.user_id}, dropped a notification")
+            if queue.full_for() > SSE_SLOW_CONSUMER_EVICT_SECONDS:
+                slow_queues.append(queue)
+        
+        # Close connections that stopped reading
+        for queue in slow_queues:
+            self.stats["evicted"] += 1
+            logger.warning(f"Evicting slow SSE connection of user {queue.user_id}, full for {queue.full_for():.0f}s")
+            queue.close()
+            await self.disconnect_user(queue.user_id, queue)
+    
+    async def broadcast(
+        self,
+        notification: NotificationData,
+        user_ids: Optional[List[int]] = None,
+        course_id: Optional[int] = None,
+        role: Optional[str] = None
+    ) -> int:
+        """
+        Send one notification to a course, a role and/or an explicit set of users.
+        
+        Recipients are resolved with a single query and the notification is
+        serialized into one SSE frame that every recipient's connections share.
+        Broadcasts are not written to the notification log, so they are not
+        replayed after a reconnect. Returns the number of recipients.
+        """
+        recipients = await asyncio.to_thread(resolve_broadcast_recipients, user_ids, course_id, role)
+        if not recipients:
+            return 0
+        
+        message = notification.to_dict()
+        message["user_id"] = None
+        message["id"] = f"broadcast_{int(notification.timestamp.timestamp())}"
+        frame = sse_frame(message)
+        self.stats["broadcasts"] += 1
+        self.stats["broadcast_recipients"] += len(recipients)
+        logger.info(f"📣 Broadcasting '{notification.title}' to {len(recipients)} users")
+        
+        await self.deliver_frame_local(recipients, frame)
+        if self.broker_started:
+            message = {"origin": WORKER_ID, "frame": frame}
+            for chunk in chunk_recipients(message, list(recipients), self.broker.max_payload_bytes):
+                await self._forward_logged({**message, "user_ids": chunk})
+        return len(recipients)
+    
+    async def deliver_frame_local(self, user_ids, frame: str):
+        """Put one serialized frame on the connections of the given users held by this worker"""
+        user_ids = set(user_ids)
+        # Walk whichever side is smaller: the recipients or the connected users
+        if len(user_ids) <= len(self.active_connections):
+            connected = [user_id for user_id in user_ids if user_id in self.active_connections]
+        else:
+            connected = [user_id for user_id in self.active_connections if user_id in user_ids]
+        for user_id in connected:
+            await self._enqueue(self.active_connections.get(user_id, ()), frame)
+    
+    async def publish(self, channel: str, data: Any):
+        """Send a message to the WebSocket subscribers of a channel on every worker"""
+        await self._forward_logged(await self.deliver_channel(channel, data))
+    
+    async def deliver_channel(self, channel: str, data: Any) -> Dict[str, Any]:
+        """Deliver a channel message on this worker; returns the broker message for ``forward``"""
+        frame = channel_frame(channel, data)
+        self.stats["channel_messages"] += 1
+        await self.deliver_channel_local(channel, frame)
+        return {"origin": WORKER_ID, "channel": channel, "frame": frame}
+    
+    async def deliver_channel_local(self, channel: str, frame: ChannelFrame):
+        """Put a channel frame on the subscribed connections held by this worker"""
+        if channel in self.channels:
+            await self._enqueue(self.channels[channel], frame)
     
     async def broadcast_notification(self, notification: NotificationData, user_ids: List[int]):
         """Broadcast a notification to multiple users"""
-        for user_id in user_ids:
-            user_notification = NotificationData(
-                notification_type=notification.notification_type,
-                user_id=user_id,
-                title=notification.title,
-                message=notification.message,
-                xp_earned=notification.xp_earned,
-                total_xp=notification.total_xp,
-                quest_data=notification.quest_data,
-                timestamp=notification.timestamp
-            )
-            await self.send_notification(user_notification)
+        await self.broadcast(notification, user_ids=user_ids)
     
     def get_connected_users(self) -> List[int]:
         """Get a list of currently connected user IDs"""
@@ -172,10 +526,90 @@ class SSENotificationService:
     def get_connection_count(self, user_id: int) -> int:
         """Get the number of active connections for a user"""
         return len(self.active_connections.get(user_id, []))
+    
+    def get_stats(self) -> dict:
+        depths = [queue.qsize() for queues in self.active_connections.values() for queue in queues]
+        return {
+            **self.stats,
+            "connected_users": len(self.active_connections),
+            "connections": len(depths),
+            "queued_notifications": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "full_queues": sum(1 for depth in depths if depth >= SSE_QUEUE_MAXSIZE),
+            "queue_maxsize": SSE_QUEUE_MAXSIZE,
+            "drop_policy": SSE_QUEUE_DROP_POLICY,
+            "broker": self.broker.get_stats(),
+            "log": notification_log.get_stats(),
+            "heartbeat": self.heartbeat.get_stats(),
+            "channels": len(self.channels),
+            "channel_subscriptions": sum(len(queues) for queues in self.channels.values()),
+        }
 
 # Global instance
 notification_service = SSENotificationService()
 
+def sse_frame(message: Dict[str, Any]) -> str:
+    """Format a notification as an SSE event, with its event ID when it was logged"""
+    data = f"data: {json.dumps(message, default=str)}\n\n"
+    event_id = message.get("event_id")
+    return f"id: {event_id}\n{data}" if event_id is not None else data
+
+def chunk_recipients(message: Dict[str, Any], user_ids: List[int], max_bytes: Optional[int]) -> List[List[int]]:
+    """
+    Split broadcast recipients so that ``message`` with each chunk as its
+    ``user_ids`` encodes to at most ``max_bytes``. Returns no chunk when the
+    frame alone does not fit; the broadcast is then only delivered locally.
+    """
+    if max_bytes is None:
+        return [user_ids]
+    # Encoded like the broker encodes it: ", " between list items
+    base = len(json.dumps({**message, "user_ids": []}, default=str).encode())
+    if user_ids and base + max(len(str(user_id)) for user_id in user_ids) > max_bytes:
+        logger.warning(f"Broadcast frame too large for the broker ({base} bytes), delivered locally only")
+        return []
+    chunks, chunk, size = [], [], base
+    for user_id in user_ids:
+        added = len(str(user_id)) + (2 if chunk else 0)
+        if size + added > max_bytes:
+            chunks.append(chunk)
+            chunk, size, added = [], base, len(str(user_id))
+        chunk.append(user_id)
+        size += added
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def resolve_broadcast_recipients(
+    user_ids: Optional[List[int]] = None,
+    course_id: Optional[int] = None,
+    role: Optional[str] = None
+) -> Set[int]:
+    """
+    Local user IDs a broadcast reaches, resolved with at most one query.
+    
+    With a course, the active enrollments of the course are used and ``role``
+    is the course role (e.g. "student"); without one, ``role`` matches the
+    user's role. ``user_ids`` alone is used as given, or narrows the others.
+    """
+    if course_id is None and role is None:
+        return set(user_ids or ())
+    
+    with SessionLocal() as db:
+        if course_id is not None:
+            query = db.query(CourseEnrollment.user_id).filter(
+                CourseEnrollment.course_id == course_id,
+                CourseEnrollment.status == "active"
+            )
+            if role is not None:
+                query = query.filter(CourseEnrollment.role == role)
+            if user_ids is not None:
+                query = query.filter(CourseEnrollment.user_id.in_(user_ids))
+        else:
+            query = db.query(User.id).filter(User.role == role)
+            if user_ids is not None:
+                query = query.filter(User.id.in_(user_ids))
+        return {user_id for (user_id,) in query.distinct()}
+
 def create_xp_notification(
     user_id: int,
     quest_title: str,
@@ -220,3 +654,20 @@ def create_quest_notification(
         message=message or f"Quest: {quest_title}",
         quest_data={"quest_title": quest_title}
     )
+
+def create_badge_notification(
+    user_id: int,
+    badge_name: str,
+    exp_bonus: int = 0,
+    badge_data: Optional[Dict[str, Any]] = None
+) -> NotificationData:
+    """Helper function to create badge award notifications"""
+    
+    return NotificationData(
+        notification_type="badge_earned",
+        user_id=user_id,
+        title=f"Badge Earned: {badge_name}! 🏆",
+        message=f'You earned the "{badge_name}" badge!',
+        xp_earned=exp_bonus,
+        quest_data=badge_data or {"badge_name": badge_name}
+    )
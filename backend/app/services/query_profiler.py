@@ -0,0 +1,252 @@
+"""
+Opt-in per-request SQL profiling and N+1 detection.
+
+With ``QUERY_PROFILER=true`` every statement executed through any engine
+(sync or async) is counted against the request that ran it, with its
+database time. Statements are reduced to their shape (whitespace, the
+select list and ``IN (...)`` lists collapsed); a shape run
+``QUERY_N_PLUS_ONE_THRESHOLD`` times or more in one request is reported as
+an N+1 candidate, such as a per-quest course lookup inside a loop.
+
+``QueryProfilerMiddleware`` adds a ``Server-Timing`` header to every
+response (``db;dur=..;desc="N queries"`` and ``total;dur=..``) and
+aggregates per-route statistics, served at ``/api/debug/queries``.
+
+For test runs, ``query_profiler.profile()`` profiles any block of code and
+works without the middleware or the environment variable::
+
+    with query_profiler.profile() as profile:
+        client.get("/api/quests/user/5")
+    assert not profile.n_plus_one(), profile.n_plus_one()
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.services.loop_monitor import route_name
+
+logger = logging.getLogger(__name__)
+
+QUERY_PROFILER = os.getenv("QUERY_PROFILER", "false").lower() == "true"
+# Executions of one statement shape in one request reported as an N+1 candidate
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", 5))
+# Statement text kept per shape in reports
+QUERY_SHAPE_MAX_LENGTH = int(os.getenv("QUERY_SHAPE_MAX_LENGTH", 300))
+
+WHITESPACE = re.compile(r"\s+")
+IN_LIST = re.compile(r"\bIN \((?:[^()]|\([^()]*\))*\)", re.IGNORECASE)
+SELECT_LIST = re.compile(r"^SELECT (?:DISTINCT )?.+? FROM ", re.IGNORECASE)
+
+_current_profile: ContextVar[Optional["QueryProfile"]] = ContextVar("query_profile", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Statement with whitespace, IN lists and the outer select list collapsed,
+    so loop iterations share a shape and its FROM/WHERE part stays readable
+    """
+    shape = IN_LIST.sub("IN (...)", WHITESPACE.sub(" ", statement).strip())
+    return SELECT_LIST.sub("SELECT ... FROM ", shape)[:QUERY_SHAPE_MAX_LENGTH]
+
+
+class QueryProfile:
+    """Statements executed during one request or profiled block."""
+
+    def __init__(self, n_plus_one_threshold: int = QUERY_N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes: Counter = Counter()
+        self.shape_seconds: Counter = Counter()
+        self.started = time.perf_counter()
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float):
+        if self.closed:
+            # A background task that outlived its request
+            return
+        shape = statement_shape(statement)
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += seconds
+            self.shapes[shape] += 1
+            self.shape_seconds[shape] += seconds
+
+    @property
+    def db_ms(self) -> float:
+        return self.db_seconds * 1000
+
+    def n_plus_one(self) -> List[Dict[str, Any]]:
+        """Statement shapes executed at least n_plus_one_threshold times, most repeated first"""
+        return [
+            {"statement": shape, "count": count, "db_ms": round(self.shape_seconds[shape] * 1000, 1)}
+            for shape, count in self.shapes.most_common()
+            if count >= self.n_plus_one_threshold
+        ]
+
+    def server_timing(self) -> str:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return f'db;dur={self.db_ms:.1f};desc="{self.queries} queries", total;dur={total_ms:.1f}'
+
+
+class RouteQueries:
+    """Query statistics aggregated over the requests of one route."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_ms = 0.0
+        self.flagged_requests = 0
+        # Statement shape -> most executions seen in one request
+        self.n_plus_one: Dict[str, int] = {}
+
+    def add(self, profile: QueryProfile, candidates: List[Dict[str, Any]]):
+        self.requests += 1
+        self.queries += profile.queries
+        self.max_queries = max(self.max_queries, profile.queries)
+        self.db_ms += profile.db_ms
+        if candidates:
+            self.flagged_requests += 1
+        for candidate in candidates:
+            shape = candidate["statement"]
+            self.n_plus_one[shape] = max(self.n_plus_one.get(shape, 0), candidate["count"])
+
+    def to_dict(self, name: str) -> Dict[str, Any]:
+        return {
+            "route": name,
+            "requests": self.requests,
+            "avg_queries": round(self.queries / self.requests, 1) if self.requests else 0,
+            "max_queries": self.max_queries,
+            "avg_db_ms": round(self.db_ms / self.requests, 1) if self.requests else 0,
+            "n_plus_one_requests": self.flagged_requests,
+            "n_plus_one": [
+                {"statement": shape, "max_count": count}
+                for shape, count in sorted(self.n_plus_one.items(), key=lambda item: item[1], reverse=True)
+            ],
+        }
+
+
+class QueryProfiler:
+    """Counts statements per request and aggregates them per route."""
+
+    def __init__(self, enabled: bool = QUERY_PROFILER, n_plus_one_threshold: int = QUERY_N_PLUS_ONE_THRESHOLD):
+        self.enabled = enabled
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.routes: Dict[str, RouteQueries] = {}
+        self._installed = False
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "queries": 0, "n_plus_one_requests": 0}
+
+    def install(self):
+        """Listen to the statements of every engine, including the async engine's sync side."""
+        if self._installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        self._installed = True
+
+    @contextmanager
+    def profile(self) -> Iterator[QueryProfile]:
+        """Profile the statements run by a block of code, including threads and tasks it starts."""
+        self.install()
+        profile = QueryProfile(self.n_plus_one_threshold)
+        token = _current_profile.set(profile)
+        try:
+            yield profile
+        finally:
+            profile.closed = True
+            _current_profile.reset(token)
+
+    def finish(self, route: str, profile: QueryProfile):
+        """Add a finished request to its route's statistics."""
+        candidates = profile.n_plus_one()
+        with self._lock:
+            self.routes.setdefault(route, RouteQueries()).add(profile, candidates)
+            self.stats["requests"] += 1
+            self.stats["queries"] += profile.queries
+            if candidates:
+                self.stats["n_plus_one_requests"] += 1
+        if candidates:
+            worst = candidates[0]
+            logger.warning(
+                f"⚠️  Possible N+1 in {route}: {worst['count']}x {worst['statement'][:120]}"
+            )
+
+    def report(self, limit: int = 20, n_plus_one_only: bool = False) -> Dict[str, Any]:
+        """Routes by total database time, worst first."""
+        with self._lock:
+            routes = [
+                (name, stats) for name, stats in self.routes.items()
+                if stats.flagged_requests or not n_plus_one_only
+            ]
+            worst = sorted(routes, key=lambda item: item[1].db_ms, reverse=True)[:limit]
+            return {
+                "enabled": self.enabled,
+                "n_plus_one_threshold": self.n_plus_one_threshold,
+                **self.stats,
+                "routes": [stats.to_dict(name) for name, stats in worst],
+            }
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+            self.stats.update({"requests": 0, "queries": 0, "n_plus_one_requests": 0})
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with it if the statement fails
+    if context is not None and _current_profile.get() is not None:
+        context.query_profiler_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    started = getattr(context, "query_profiler_started", None)
+    if started is not None:
+        profile.record(statement, time.perf_counter() - started)
+
+
+class QueryProfilerMiddleware:
+    """ASGI middleware profiling each request and adding a Server-Timing header."""
+
+    def __init__(self, app, profiler: "QueryProfiler" = None):
+        self.app = app
+        self.profiler = profiler or query_profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with self.profiler.profile() as profile:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing().encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                # Unmatched paths (404s) share one entry instead of one per path
+                route = route_name(None, scope) if "route" in scope else f"{scope['method']} (unmatched)"
+                self.profiler.finish(route, profile)
+
+
+# Global instance
+query_profiler = QueryProfiler()
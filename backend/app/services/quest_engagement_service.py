@@ -12,12 +12,15 @@ from sqlalchemy import func, and_
 from app.models.quest import Quest, QuestProgress, QuestEngagementEvent
 from app.models.user import User
 from app.models.course import Course
+from app.services.webhook_lookups import WebhookLookups
+from app.services.notification_dispatcher import notification_dispatcher
 
 logger = logging.getLogger(__name__)
 
 class QuestEngagementService:
     def __init__(self, db: Session):
         self.db = db
+        self.lookups = WebhookLookups.for_session(db)
     
     # Event to engagement stage mapping
     EVENT_STAGE_MAPPING = {
@@ -152,13 +155,19 @@ class QuestEngagementService:
         if event_type in milestones:
             qp.progress_percent = max(qp.progress_percent or 0, milestones[event_type])
     
-    def process_engagement_event(self, data: dict, event_type: str) -> bool:
-        """Process a webhook event for quest engagement tracking"""
+    def process_engagement_event(self, data: dict, event_type: str,
+                                 quest: Optional[Quest] = None, user: Optional[User] = None) -> bool:
+        """
+        Process a webhook event for quest engagement tracking.
+        
+        The quest and user are looked up from the payload unless the caller
+        already resolved them.
+        """
         try:
             logger.info(f"[ENG] event={event_type} payload={data}")
             # Find quest and user
-            quest = self.find_quest_by_activity(data)
-            user = self.find_user(data)
+            quest = quest or self.find_quest_by_activity(data)
+            user = user or self.find_user(data)
             
             if not quest or not user:
                 logger.debug(f"No quest or user found for event {event_type}")
@@ -169,6 +178,7 @@ class QuestEngagementService:
             
             # Process the engagement event
             self.update_quest_engagement(qp, data, event_type)
+            self.publish_engagement_update(quest, qp, event_type)
             
             return True
             
@@ -176,6 +186,20 @@ class QuestEngagementService:
             logger.error(f"Error processing engagement event {event_type}: {e}")
             return False
     
+    def publish_engagement_update(self, quest: Quest, qp: QuestProgress, event_type: str):
+        """Tell the course's quest analytics subscribers that a student's progress changed"""
+        if not quest.course_id:
+            return
+        notification_dispatcher.publish(f"quest_analytics:{quest.course_id}", {
+            "quest_id": quest.quest_id,
+            "user_id": qp.user_id,
+            "event_type": event_type,
+            "engagement_stage": qp.engagement_stage,
+            "progress_percent": qp.progress_percent,
+            "engagement_score": qp.engagement_score,
+            "interaction_count": qp.interaction_count
+        }, self.db)
+    
     def find_quest_by_activity(self, data: dict) -> Optional[Quest]:
         """Find quest by Moodle activity ID"""
         activity_id = (
@@ -200,16 +224,12 @@ class QuestEngagementService:
             return None
         
         # Find course
-        course = self.db.query(Course).filter(Course.moodle_course_id == course_id).first()
+        course = self.lookups.course(course_id)
         if not course:
             return None
         
         # Find quest
-        quest = self.db.query(Quest).filter(
-            Quest.course_id == course.id,
-            Quest.moodle_activity_id == activity_id,
-            Quest.is_active == True
-        ).first()
+        quest = self.lookups.quest(course.id, activity_id)
         logger.info(f"[ENG] resolved activity_id={activity_id} course_id={course_id} -> quest={(quest.quest_id if quest else None)}")
         
         return quest
@@ -220,16 +240,13 @@ class QuestEngagementService:
         if not moodle_user_id:
             return None
         
-        user = self.db.query(User).filter(User.moodle_user_id == moodle_user_id).first()
+        user = self.lookups.user(moodle_user_id)
         logger.info(f"[ENG] resolve user moodle_user_id={moodle_user_id} -> user={(user.id if user else None)}")
         return user
     
     def get_or_create_quest_progress(self, user_id: int, quest_id: int) -> QuestProgress:
         """Get or create quest progress record"""
-        qp = self.db.query(QuestProgress).filter(
-            QuestProgress.user_id == user_id,
-            QuestProgress.quest_id == quest_id
-        ).first()
+        qp = self.lookups.get_quest_progress(user_id, quest_id)
         
         if not qp:
             qp = QuestProgress(
@@ -243,7 +260,7 @@ class QuestEngagementService:
             )
             self.db.add(qp)
             self.db.commit()
-            self.db.refresh(qp)
+            self.lookups.add_quest_progress(qp)
         
         return qp
     
@@ -0,0 +1,187 @@
+"""
+Moodle ID lookups for webhook processing.
+Every session that processes webhook events resolves courses, users, quests
+and progress rows through one WebhookLookups instance, so the handler, the
+processor and the engagement tracker share each lookup. Courses, users and
+quests come from the process-wide lookup cache; a batch can preload all of
+its rows with a few IN (...) queries.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.course import Course
+from app.models.user import User
+from app.models.quest import Quest, QuestProgress, StudentProgress
+from app.services.lookup_cache import lookup_cache, moodle_id
+
+logger = logging.getLogger(__name__)
+
+# Payload keys Moodle uses for the activity/module ID, in lookup priority order
+ACTIVITY_ID_KEYS = (
+    "activity_id", "module_id", "quiz_id", "assignment_id", "lesson_id",
+    "forum_id", "file_id", "book_id", "page_id", "url_id", "feedback_id",
+    "choice_id", "wiki_id", "chat_id",
+)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class WebhookLookups:
+    """
+    Identity maps keyed by Moodle IDs, attached to a session through ``db.info``.
+
+    WebhookProcessor, QuestEngagementService and the handlers get the session's
+    instance through ``for_session``, so a row resolved once costs no further
+    round trips for the rest of the session. Courses, users and quests are
+    served from ``lookup_cache``; progress rows fall back to a single query
+    and are remembered.
+    """
+
+    SESSION_KEY = "webhook_lookups"
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.courses: Dict[int, Optional[Course]] = {}
+        self.users: Dict[int, Optional[User]] = {}
+        self.quests: Dict[Tuple[int, int], List[Quest]] = {}
+        self.quest_progress: Dict[Tuple[int, int], QuestProgress] = {}
+        self.student_progress: Dict[Tuple[int, int], StudentProgress] = {}
+
+    @classmethod
+    def for_session(cls, db: Session) -> "WebhookLookups":
+        """Return the instance attached to the session, attaching a new one if needed."""
+        lookups = db.info.get(cls.SESSION_KEY)
+        if lookups is None:
+            lookups = cls(db).attach()
+        return lookups
+
+    def attach(self):
+        self.db.info[self.SESSION_KEY] = self
+        return self
+
+    def detach(self):
+        self.db.info.pop(self.SESSION_KEY, None)
+
+    def preload(self, payloads: Iterable[dict]):
+        """Resolve every course, user, quest and progress row referenced by the payloads."""
+        moodle_course_ids, moodle_user_ids, activity_ids = set(), set(), set()
+        for data in payloads:
+            moodle_course_id = moodle_id(data.get("course_id"))
+            if moodle_course_id:
+                moodle_course_ids.add(moodle_course_id)
+            moodle_user_id = moodle_id(data.get("user_id") or data.get("student_id"))
+            if moodle_user_id:
+                moodle_user_ids.add(moodle_user_id)
+            activity_ids.update(moodle_id(data.get(key)) for key in ACTIVITY_ID_KEYS)
+        activity_ids.discard(None)
+
+        if moodle_course_ids:
+            courses = lookup_cache.get_courses(self.db, moodle_course_ids)
+            for course_id in moodle_course_ids:
+                self.courses[course_id] = courses.get(course_id)
+
+        if moodle_user_ids:
+            users = lookup_cache.get_users(self.db, moodle_user_ids)
+            for user_id in moodle_user_ids:
+                self.users[user_id] = users.get(user_id)
+
+        course_ids = {course.id for course in self.courses.values() if course}
+        user_ids = {user.id for user in self.users.values() if user}
+
+        if course_ids and activity_ids:
+            self.quests.update(lookup_cache.get_quests(self.db, course_ids, activity_ids))
+            quest_ids = {quest.quest_id for quests in self.quests.values() for quest in quests}
+            if user_ids and quest_ids:
+                for qp in self.db.query(QuestProgress).filter(
+                    QuestProgress.user_id.in_(user_ids),
+                    QuestProgress.quest_id.in_(quest_ids)
+                ).all():
+                    self.quest_progress[(qp.user_id, qp.quest_id)] = qp
+
+        if user_ids and course_ids:
+            for sp in self.db.query(StudentProgress).filter(
+                StudentProgress.user_id.in_(user_ids),
+                StudentProgress.course_id.in_(course_ids)
+            ).all():
+                self.student_progress.setdefault((sp.user_id, sp.course_id), sp)
+
+        logger.debug(
+            f"Preloaded {len(course_ids)} courses, {len(user_ids)} users, "
+            f"{sum(len(q) for q in self.quests.values())} quests for webhook batch"
+        )
+
+    def course(self, moodle_course_id: Any) -> Optional[Course]:
+        moodle_course_id = moodle_id(moodle_course_id)
+        if moodle_course_id is None:
+            return None
+        if moodle_course_id not in self.courses:
+            self.courses[moodle_course_id] = lookup_cache.get_course(self.db, moodle_course_id)
+        return self.courses[moodle_course_id]
+
+    def user(self, moodle_user_id: Any) -> Optional[User]:
+        moodle_user_id = moodle_id(moodle_user_id)
+        if moodle_user_id is None:
+            return None
+        if moodle_user_id not in self.users:
+            self.users[moodle_user_id] = lookup_cache.get_user(self.db, moodle_user_id)
+        return self.users[moodle_user_id]
+
+    def _quests_for(self, course_id: int, moodle_activity_id: Any) -> List[Quest]:
+        moodle_activity_id = moodle_id(moodle_activity_id)
+        if moodle_activity_id is None:
+            return []
+        key = (course_id, moodle_activity_id)
+        if key not in self.quests:
+            self.quests[key] = lookup_cache.get_activity_quests(self.db, course_id, moodle_activity_id)
+        return self.quests[key]
+
+    def quest(self, course_id: int, moodle_activity_id: int) -> Optional[Quest]:
+        """First active quest for the activity, regardless of its date window."""
+        quests = self._quests_for(course_id, moodle_activity_id)
+        return quests[0] if quests else None
+
+    def active_quest(self, course_id: int, moodle_activity_id: int, now: datetime) -> Optional[Quest]:
+        """First active quest for the activity whose date window contains ``now``."""
+        now = _as_utc(now)
+        for quest in self._quests_for(course_id, moodle_activity_id):
+            if quest.start_date and _as_utc(quest.start_date) > now:
+                continue
+            if quest.end_date and _as_utc(quest.end_date) < now:
+                continue
+            return quest
+        return None
+
+    def get_quest_progress(self, user_id: int, quest_id: int) -> Optional[QuestProgress]:
+        key = (user_id, quest_id)
+        if key not in self.quest_progress:
+            qp = self.db.query(QuestProgress).filter_by(user_id=user_id, quest_id=quest_id).first()
+            if not qp:
+                return None
+            self.quest_progress[key] = qp
+        return self.quest_progress[key]
+
+    def add_quest_progress(self, qp: QuestProgress):
+        self.quest_progress[(qp.user_id, qp.quest_id)] = qp
+
+    def get_student_progress(self, user_id: int, course_id: int) -> Optional[StudentProgress]:
+        key = (user_id, course_id)
+        if key not in self.student_progress:
+            sp = self.db.query(StudentProgress).filter_by(user_id=user_id, course_id=course_id).first()
+            if not sp:
+                return None
+            self.student_progress[key] = sp
+        return self.student_progress[key]
+
+    def add_student_progress(self, sp: StudentProgress):
+        self.student_progress[(sp.user_id, sp.course_id)] = sp
+
+    def discard_progress(self):
+        """Forget progress rows, e.g. after rolling back a failed event."""
+        self.quest_progress.clear()
+        self.student_progress.clear()
@@ -0,0 +1,71 @@
+"""
+Daily XP rollups and cached top-students snapshots.
+
+Every XP award is added to its (course, UTC day, user) bucket in
+``xp_daily_rollups`` in the same transaction that inserts the
+ExperiencePoints row, whichever session (sync or async) flushes it, so a
+daily, weekly or monthly leaderboard is a sum over at most 30 buckets
+instead of a scan of every award. Weekly and monthly are rolling windows of
+the last 7 and 30 UTC days, like the timeframes of configured leaderboards.
+XP must be awarded through the ORM for its bucket to be updated. Served
+top-students lists are cached for ``LEADERBOARD_SNAPSHOT_TTL_SECONDS`` per
+(course, timeframe, limit).
+"""
+
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.leaderboard import XPDailyRollup
+from app.services.leaderboard_ranking import collect_xp_awards
+from app.services.lookup_cache import TTLCache
+
+LEADERBOARD_SNAPSHOT_TTL_SECONDS = float(os.getenv("LEADERBOARD_SNAPSHOT_TTL_SECONDS", 30))
+LEADERBOARD_SNAPSHOT_CACHE_SIZE = int(os.getenv("LEADERBOARD_SNAPSHOT_CACHE_SIZE", 256))
+
+# Bucket course_id for XP awarded outside a course
+NO_COURSE = 0
+
+# (course_id or None for global, timeframe, limit) -> top students
+leaderboard_snapshots = TTLCache(LEADERBOARD_SNAPSHOT_CACHE_SIZE, LEADERBOARD_SNAPSHOT_TTL_SECONDS)
+
+
+# Days of buckets summed per timeframe, today included
+TIMEFRAME_DAYS = {"daily": 1, "weekly": 7, "monthly": 30}
+
+
+def timeframe_start_day(timeframe: str) -> Optional[date]:
+    """First UTC day of the daily, last 7 days or last 30 days window; None for all_time."""
+    days = TIMEFRAME_DAYS.get(timeframe)
+    if days is None:
+        return None
+    return datetime.utcnow().date() - timedelta(days=days - 1)
+
+
+# Registered on every session, so awards of the async webhook sessions are counted too
+@event.listens_for(Session, "after_flush")
+def _add_xp_to_rollups(session: Session, flush_context):
+    buckets: Dict[Tuple[int, date, int], int] = defaultdict(int)
+    for award in collect_xp_awards(session):
+        course_id = award.course_id if award.course_id is not None else NO_COURSE
+        buckets[(course_id, award.awarded_at.astimezone(timezone.utc).date(), award.user_id)] += award.amount
+    if not buckets:
+        return
+
+    statement = insert(XPDailyRollup).values([
+        {"course_id": course_id, "day": day, "user_id": user_id, "total_exp": amount}
+        for (course_id, day, user_id), amount in buckets.items()
+    ])
+    # Runs in the flushing transaction, so a rolled back award never reaches a bucket
+    session.connection().execute(statement.on_conflict_do_update(
+        index_elements=[XPDailyRollup.course_id, XPDailyRollup.day, XPDailyRollup.user_id],
+        set_={
+            "total_exp": XPDailyRollup.total_exp + statement.excluded.total_exp,
+            "updated_at": func.now()
+        }
+    ))
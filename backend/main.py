@@ -9,6 +9,10 @@ from app.routes import quests, auth, enrollment, webhooks, leaderboard, notifica
 from app.database.connection import engine, Base, SessionLocal
 from app.database.seed import seed_initial_data
 from app.models.auth import MoodleConfig
+from app.services.loop_monitor import loop_monitor, LoopStallMiddleware
+from app.services.query_profiler import query_profiler, QueryProfilerMiddleware
+from app.database.slow_query_log import slow_query_log, SlowQueryMiddleware
+from app.database.read_replica import read_replica
 
 # Suppress SSL warnings for localhost development
 # urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -73,6 +77,19 @@ app.add_middleware(
     max_age=600,  # Cache preflight requests for 10 minutes
 )
 
+# Attribute event-loop stalls to routes; inside the error handling
+# middleware, so it runs in the same task as the route
+if loop_monitor.enabled:
+    app.add_middleware(LoopStallMiddleware)
+
+# Count SQL statements per request, flag N+1 candidates and add Server-Timing
+if query_profiler.enabled:
+    app.add_middleware(QueryProfilerMiddleware)
+
+# Tell the slow-query log which route ran each slow statement
+if slow_query_log.enabled:
+    app.add_middleware(SlowQueryMiddleware)
+
 # Error handling middleware
 @app.middleware("http")
 async def errors_handling(request: Request, call_next):
@@ -102,6 +119,8 @@ from app.routes.profile import router as profile_router
 from app.routes.analytics import router as analytics_router
 from app.routes.progress import router as progress_router
 from app.routes.quest_analytics import router as quest_analytics_router
+from app.routes.debug import router as debug_router
+from app.routes.health import router as health_router
 
 app.include_router(quests.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
@@ -117,6 +136,53 @@ app.include_router(profile_router, prefix="/api")
 app.include_router(analytics_router, prefix="/api")
 app.include_router(progress_router, prefix="/api")
 app.include_router(quest_analytics_router, prefix="/api/quest-analytics")
+app.include_router(debug_router, prefix="/api")
+# Probes are served outside /api, e.g. /health/ready
+app.include_router(health_router)
+
+from app.routes.webhooks.queue import webhook_queue
+from app.services.badge_evaluator import badge_evaluator
+from app.services.badge_award_job import badge_award_jobs
+from app.services.leaderboard_ranking import leaderboard_ranking
+from app.services.notification_service import notification_service
+from app.services.notification_dispatcher import notification_dispatcher
+from app.services.notification_log import notification_log
+
+@app.on_event("startup")
+async def start_background_workers():
+    # Report event-loop stalls when LOOP_STALL_MONITOR is enabled
+    loop_monitor.start()
+    # Route read-only analytics and dashboard sessions to the replica while it is fresh
+    read_replica.start()
+    # Drain the durable webhook queue when running in queue ingestion mode
+    if webhook_queue.enabled:
+        webhook_queue.start()
+    # Evaluate badges off the request path
+    if badge_evaluator.enabled:
+        badge_evaluator.start()
+    # Pick up retroactive badge award jobs interrupted by the last shutdown
+    badge_award_jobs.resume_unfinished()
+    # Keep leaderboard ranks current as XP is awarded
+    leaderboard_ranking.start()
+    # Receive notifications raised by other workers for this worker's SSE connections
+    await notification_service.start()
+    # Prune the notification log replayed to reconnecting clients
+    notification_log.start()
+    # Deliver notifications handed over by webhook handlers and services
+    notification_dispatcher.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await loop_monitor.stop()
+    await read_replica.stop()
+    await webhook_queue.stop()
+    await badge_evaluator.stop()
+    await badge_award_jobs.stop()
+    await leaderboard_ranking.stop()
+    # Drain pending notifications while the broker can still publish them
+    await notification_dispatcher.stop()
+    await notification_service.stop()
+    await notification_log.stop()
 
 @app.get("/")
 async def root():
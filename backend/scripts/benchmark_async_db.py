@@ -0,0 +1,118 @@
+"""
+Compare request latency under mixed load: sync sessions vs async sessions.
+
+Serves two routes per mode from an in-process FastAPI app, driven through
+httpx's ASGI transport so no sockets or server are involved:
+
+- sync: ``async def`` routes on a ``get_db`` session, as the webhook,
+  notification, leaderboard and analytics routes were before the async
+  session; every query blocks the event loop while it waits on Postgres
+- async: the same routes on ``get_async_db``; queries wait without blocking
+
+Each mode runs slow requests (``pg_sleep``, standing in for analytics
+aggregates and webhook transactions) from several concurrent clients while
+fast requests (``SELECT 1``) are sent alongside, and prints the latency
+percentiles of both. The fast requests' p99 shows how much the slow ones
+hold up the rest of the loop.
+
+Usage (from the backend directory):
+    python -m scripts.benchmark_async_db --slow-clients 4 --slow-ms 50 --fast-clients 8 --duration 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database.connection import async_engine, get_async_db, get_db
+
+
+def build_app(slow_seconds: float) -> FastAPI:
+    app = FastAPI()
+    slow = text("SELECT pg_sleep(:seconds)").bindparams(seconds=slow_seconds)
+    fast = text("SELECT 1")
+
+    @app.get("/sync/slow")
+    async def sync_slow(db: Session = Depends(get_db)):
+        db.execute(slow)
+        return {}
+
+    @app.get("/sync/fast")
+    async def sync_fast(db: Session = Depends(get_db)):
+        return {"value": db.execute(fast).scalar()}
+
+    @app.get("/async/slow")
+    async def async_slow(db: AsyncSession = Depends(get_async_db)):
+        await db.execute(slow)
+        return {}
+
+    @app.get("/async/fast")
+    async def async_fast(db: AsyncSession = Depends(get_async_db)):
+        return {"value": await db.scalar(fast)}
+
+    return app
+
+
+async def client_loop(client: httpx.AsyncClient, path: str, deadline: float, latencies: List[float]):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    if len(latencies) < 2:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    cuts = statistics.quantiles(latencies, n=100)
+    return {"p50": round(cuts[49], 1), "p95": round(cuts[94], 1), "p99": round(cuts[98], 1)}
+
+
+async def measure(client: httpx.AsyncClient, mode: str, args) -> Dict[str, dict]:
+    # Warm up the connection pool so connects are not measured
+    await asyncio.gather(*(client.get(f"/{mode}/fast") for _ in range(args.slow_clients + args.fast_clients)))
+
+    slow: List[float] = []
+    fast: List[float] = []
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(
+        *(client_loop(client, f"/{mode}/slow", deadline, slow) for _ in range(args.slow_clients)),
+        *(client_loop(client, f"/{mode}/fast", deadline, fast) for _ in range(args.fast_clients)),
+    )
+    return {
+        "slow": {"requests": len(slow), **percentiles(slow)},
+        "fast": {"requests": len(fast), **percentiles(fast)},
+    }
+
+
+async def run(args):
+    app = build_app(args.slow_ms / 1000)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        print(f"{'mode':<7}{'route':<7}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for mode in ("sync", "async"):
+            result = await measure(client, mode, args)
+            for route in ("slow", "fast"):
+                row = result[route]
+                print(f"{mode:<7}{route:<7}{row['requests']:>9}{row['p50']:>9}{row['p95']:>9}{row['p99']:>9}")
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async database sessions under mixed load")
+    parser.add_argument("--slow-clients", type=int, default=4, help="Concurrent clients sending slow requests")
+    parser.add_argument("--slow-ms", type=float, default=50, help="Database time of a slow request")
+    parser.add_argument("--fast-clients", type=int, default=8, help="Concurrent clients sending fast requests")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run each mode")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
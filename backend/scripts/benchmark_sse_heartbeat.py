@@ -0,0 +1,110 @@
+"""
+Compare the CPU cost of SSE heartbeats: per-connection timers vs the shared wheel.
+
+Simulates idle SSE connections in one event loop, without sockets:
+
+- per-connection: every connection waits on ``asyncio.wait_for(queue.get(),
+  timeout=interval)`` and serializes its own heartbeat on each timeout (the
+  stream loop before the heartbeat wheel)
+- wheel: every connection waits on its ConnectionQueue and the shared
+  HeartbeatWheel queues one pre-serialized frame per tick
+
+and prints the process CPU time per 1,000 connections per heartbeat
+interval. A short interval is used so a run takes seconds; the cost per
+heartbeat does not depend on it.
+
+Usage (from the backend directory):
+    python -m scripts.benchmark_sse_heartbeat --connections 1000 5000 --interval 0.5 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from app.services.notification_service import ConnectionQueue, HeartbeatWheel
+
+
+async def per_connection_timers(connections: int, interval: float, duration: float) -> int:
+    heartbeats = 0
+
+    async def stream(queue: asyncio.Queue):
+        nonlocal heartbeats
+        while True:
+            try:
+                await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                json.dumps({"type": "heartbeat", "timestamp": datetime.utcnow().isoformat()})
+                heartbeats += 1
+
+    tasks = [asyncio.create_task(stream(asyncio.Queue())) for _ in range(connections)]
+    await asyncio.sleep(duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return heartbeats
+
+
+async def heartbeat_wheel(connections: int, interval: float, duration: float) -> int:
+    wheel = HeartbeatWheel(interval=interval)
+    heartbeats = 0
+
+    async def stream(queue: ConnectionQueue):
+        nonlocal heartbeats
+        while True:
+            await queue.get()
+            heartbeats += 1
+
+    async def ticker():
+        while True:
+            await asyncio.sleep(wheel.tick_seconds)
+            wheel.tick()
+
+    queues = [ConnectionQueue() for _ in range(connections)]
+    for queue in queues:
+        # Idle from the start, like the per-connection run
+        queue.last_activity -= interval
+        wheel.add(queue)
+    tasks = [asyncio.create_task(stream(queue)) for queue in queues]
+    tasks.append(asyncio.create_task(ticker()))
+    await asyncio.sleep(duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return heartbeats
+
+
+async def measure(mode, connections: int, interval: float, duration: float) -> dict:
+    cpu_started = time.process_time()
+    heartbeats = await mode(connections, interval, duration)
+    cpu_ms = (time.process_time() - cpu_started) * 1000
+    intervals = duration / interval
+    return {
+        "heartbeats": heartbeats,
+        "cpu_ms": round(cpu_ms, 1),
+        "cpu_ms_per_1k_per_interval": round(cpu_ms / (connections / 1000) / intervals, 2),
+    }
+
+
+async def run(args):
+    print(f"{'connections':>11}  {'mode':<16}{'heartbeats':>11}{'cpu ms':>10}{'ms/1k/interval':>16}")
+    for connections in args.connections:
+        for name, mode in (("per-connection", per_connection_timers), ("wheel", heartbeat_wheel)):
+            result = await measure(mode, connections, args.interval, args.duration)
+            print(
+                f"{connections:>11}  {name:<16}{result['heartbeats']:>11}"
+                f"{result['cpu_ms']:>10}{result['cpu_ms_per_1k_per_interval']:>16}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SSE heartbeat CPU cost")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--interval", type=float, default=0.5, help="Heartbeat interval in seconds")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run each mode")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
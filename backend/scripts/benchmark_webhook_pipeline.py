@@ -0,0 +1,175 @@
+"""
+Count the database round trips each webhook event type costs.
+
+Replays one synthetic payload per event type in EVENT_HANDLERS through:
+
+- two-pass: the handler, then engagement tracking in a separate session with
+  its own lookups, both on a cold lookup cache (the flow before the pipeline)
+- pipeline: the single-pass pipeline on one session, with a warm lookup cache
+
+and prints the SQL statements and commits of each. Every run happens inside a
+savepoint of one outer transaction that is rolled back, so the database is left
+unchanged.
+
+Usage (from the backend directory):
+    python -m scripts.benchmark_webhook_pipeline --course 2 --user 5 --activity 17
+
+Without arguments the first active quest with a Moodle activity and the first
+student with a Moodle user ID are used.
+"""
+
+import argparse
+import asyncio
+import inspect
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database.connection import engine, SessionLocal
+from app.models.course import Course
+from app.models.user import User
+from app.models.quest import Quest
+from app.routes.webhooks.events import EVENT_HANDLERS, EVENT_TO_TYPE
+from app.routes.webhooks.pipeline import run_pipeline
+from app.services.lookup_cache import lookup_cache
+from app.services.quest_engagement_service import QuestEngagementService
+
+
+class RoundTripCounter:
+    """Counts statements sent on a connection and commits issued by sessions."""
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.statements += 1
+
+    def on_commit(self, session):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def sample_payload(event_path: str, course_id: int, user_id: int, activity_id: int) -> dict:
+    """A payload carrying every field the handlers and engagement tracking read."""
+    activity_key = {
+        "quiz": "quiz_id", "assign": "assignment_id", "lesson": "lesson_id", "forum": "forum_id",
+        "feedback": "feedback_id", "choice": "choice_id", "wiki": "wiki_id", "chat": "chat_id",
+    }.get(event_path.split("/")[0], "activity_id")
+    return {
+        "course_id": course_id,
+        "user_id": user_id,
+        "activity_id": activity_id,
+        activity_key: activity_id,
+        "discussion_id": 1,
+        "post_id": 1,
+        "grade": 85,
+        "max_grade": 100,
+        "completion_state": 1,
+        "activity_type": event_path.split("/")[0],
+        "answer": "benchmark",
+    }
+
+
+def find_sample_ids(db: Session) -> Tuple[int, int, int]:
+    quest, course = db.query(Quest, Course).join(Course, Quest.course_id == Course.id).filter(
+        Quest.is_active == True,
+        Quest.moodle_activity_id != None,
+        Course.moodle_course_id != None
+    ).first() or (None, None)
+    user = db.query(User).filter(User.role == "student", User.moodle_user_id != None).first()
+    if not (quest and user):
+        raise SystemExit("No active quest with a Moodle activity or no student with a Moodle user ID found")
+    return course.moodle_course_id, user.moodle_user_id, quest.moodle_activity_id
+
+
+def run_two_pass(connection, counter: RoundTripCounter, event_path: str, data: dict):
+    lookup_cache.clear()
+    for pass_number in (1, 2):
+        db = SessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+        event.listen(db, "after_commit", counter.on_commit)
+        try:
+            if pass_number == 1:
+                handler = EVENT_HANDLERS[event_path]["handler"]
+                if handler:
+                    if "db" in inspect.signature(handler).parameters:
+                        handler(data, db)
+                    else:
+                        handler(data)
+            elif EVENT_TO_TYPE.get(event_path):
+                QuestEngagementService(db).process_engagement_event(data, EVENT_TO_TYPE[event_path])
+            db.commit()
+        finally:
+            db.close()
+
+
+def run_single_pass(connection, counter: RoundTripCounter, event_path: str, data: dict):
+    db = SessionLocal(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+    try:
+        run_pipeline(event_path, data, db)
+        db.commit()
+        # The unit of work commits once, whatever the stages did
+        counter.commits += 1
+    finally:
+        db.close()
+
+
+def measure(connection, counter: RoundTripCounter, runner, event_path: str, data: dict) -> Tuple[int, int]:
+    savepoint = connection.begin_nested()
+    counter.reset()
+    try:
+        runner(connection, counter, event_path, data)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"{event_path} failed under {runner.__name__}: {e}")
+    result = (counter.statements, counter.commits)
+    savepoint.rollback()
+    return result
+
+
+async def main(course_id: Optional[int], user_id: Optional[int], activity_id: Optional[int]):
+    logging.basicConfig(level=logging.WARNING)
+    with SessionLocal() as db:
+        if not (course_id and user_id and activity_id):
+            course_id, user_id, activity_id = find_sample_ids(db)
+
+    counter = RoundTripCounter()
+    rows = []
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            for event_path in EVENT_HANDLERS:
+                data = sample_payload(event_path, course_id, user_id, activity_id)
+                before = measure(connection, counter, run_two_pass, event_path, data)
+                # The first pipeline run refills the lookup cache run_two_pass cleared
+                measure(connection, counter, run_single_pass, event_path, data)
+                after = measure(connection, counter, run_single_pass, event_path, data)
+                rows.append((event_path, before, after))
+                # Let notification tasks scheduled by the handlers run
+                await asyncio.sleep(0)
+        finally:
+            transaction.rollback()
+
+    print(f"course={course_id} user={user_id} activity={activity_id}\n")
+    print(f"{'event':<28}{'two-pass stmts':>16}{'commits':>9}{'pipeline stmts':>16}{'commits':>9}{'saved':>8}")
+    total_before = total_after = 0
+    for event_path, (before_stmts, before_commits), (after_stmts, after_commits) in rows:
+        total_before += before_stmts
+        total_after += after_stmts
+        print(f"{event_path:<28}{before_stmts:>16}{before_commits:>9}{after_stmts:>16}{after_commits:>9}"
+              f"{before_stmts - after_stmts:>8}")
+    print(f"\n{'total':<28}{total_before:>16}{'':>9}{total_after:>16}{'':>9}{total_before - total_after:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--course", type=int, help="Moodle course ID")
+    parser.add_argument("--user", type=int, help="Moodle user ID")
+    parser.add_argument("--activity", type=int, help="Moodle activity ID mapped to a quest")
+    args = parser.parse_args()
+    asyncio.run(main(args.course, args.user, args.activity))
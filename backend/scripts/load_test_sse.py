@@ -0,0 +1,208 @@
+"""
+Load test: hold many idle SSE streams open and check that normal API calls stay fast.
+
+Opens ``--connections`` notification streams against a running API worker,
+ramping up at ``--ramp`` connections per second, and keeps them idle for
+``--hold`` seconds. API latency is measured on ``--probe-path`` before the
+streams are opened and again while they are all open. The run fails (exit
+code 1) when fewer streams than requested were established or the loaded
+p95/p99 latency misses its target.
+
+Run one worker with a raised file descriptor limit, for example:
+    ulimit -n 65536 && uvicorn main:app --port 8000
+
+then, from the backend directory:
+    python -m scripts.load_test_sse --user-id 4 --connections 10000
+
+Streams are opened with raw sockets rather than an HTTP client, so the load
+generator itself stays cheap at 10k connections.
+"""
+
+import argparse
+import asyncio
+import resource
+import statistics
+import sys
+import time
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+
+class StreamPool:
+    """Idle SSE connections opened with raw sockets."""
+
+    def __init__(self, host: str, port: int, path: str):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.writers: List[asyncio.StreamWriter] = []
+        self.readers: List[asyncio.Task] = []
+        self.failed = 0
+        self.closed_by_server = 0
+
+    async def open(self) -> bool:
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            writer.write(
+                f"GET {self.path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Accept: text/event-stream\r\nCache-Control: no-cache\r\n\r\n".encode()
+            )
+            await writer.drain()
+            # Established once the "connected" event arrives
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=30)
+                if not line:
+                    raise ConnectionError("closed before the connected event")
+                if line.startswith(b"data:"):
+                    break
+        except Exception:
+            self.failed += 1
+            return False
+        self.writers.append(writer)
+        self.readers.append(asyncio.create_task(self._drain(reader)))
+        return True
+
+    async def _drain(self, reader: asyncio.StreamReader):
+        # Keep reading heartbeats so the server never sees a full socket
+        while await reader.read(4096):
+            pass
+        self.closed_by_server += 1
+
+    @property
+    def open_count(self) -> int:
+        return len(self.writers) - self.closed_by_server
+
+    async def close(self):
+        for task in self.readers:
+            task.cancel()
+        for writer in self.writers:
+            writer.close()
+        await asyncio.gather(*self.readers, return_exceptions=True)
+
+
+async def ramp_up(pool: StreamPool, connections: int, per_second: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+
+    async def open_one(index: int):
+        # Pace connection attempts at the ramp rate
+        await asyncio.sleep(max(0.0, started + index / per_second - time.monotonic()))
+        async with semaphore:
+            await pool.open()
+
+    await asyncio.gather(*(open_one(index) for index in range(connections)))
+
+
+async def probe(client: httpx.AsyncClient, path: str, requests: int, concurrency: int) -> dict:
+    """Latency percentiles of ``requests`` GETs, ``concurrency`` at a time."""
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    if not latencies:
+        return {"requests": requests, "errors": errors}
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(quantiles[49], 1),
+        "p95_ms": round(quantiles[94], 1),
+        "p99_ms": round(quantiles[98], 1),
+        "max_ms": round(max(latencies), 1),
+    }
+
+
+def raise_fd_limit(connections: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = connections + 1024
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+        soft = min(wanted, hard)
+    if soft < wanted:
+        print(f"⚠️  File descriptor limit {soft} is below {wanted}; raise it with ulimit -n")
+
+
+async def run(args) -> int:
+    url = urlsplit(args.base_url)
+    host, port = url.hostname, url.port or 80
+    raise_fd_limit(args.connections)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+        baseline = await probe(client, args.probe_path, args.probe_requests, args.probe_concurrency)
+        print(f"Baseline {args.probe_path}: {baseline}")
+
+        pool = StreamPool(host, port, f"/api/notifications/events/{args.user_id}")
+        started = time.monotonic()
+        await ramp_up(pool, args.connections, args.ramp, args.ramp_concurrency)
+        print(
+            f"Opened {pool.open_count}/{args.connections} streams in {time.monotonic() - started:.1f}s "
+            f"({pool.failed} failed)"
+        )
+
+        loaded: Optional[dict] = None
+        deadline = time.monotonic() + args.hold
+        while time.monotonic() < deadline:
+            loaded = await probe(client, args.probe_path, args.probe_requests, args.probe_concurrency)
+            print(f"Under load {args.probe_path} with {pool.open_count} open streams: {loaded}")
+            await asyncio.sleep(min(5.0, max(0.0, deadline - time.monotonic())))
+
+        status = (await client.get("/api/notifications/status")).json()
+        print(f"Server reports {status.get('metrics', {}).get('connections')} connections on the probed worker")
+        still_open = pool.open_count
+        await pool.close()
+
+    failures = []
+    if still_open < args.connections:
+        failures.append(f"only {still_open}/{args.connections} streams were open at the end")
+    if loaded is None or "p95_ms" not in loaded:
+        failures.append("no successful probe requests under load")
+    else:
+        if loaded["p95_ms"] > args.p95_target_ms:
+            failures.append(f"p95 {loaded['p95_ms']}ms exceeds {args.p95_target_ms}ms")
+        if loaded["p99_ms"] > args.p99_target_ms:
+            failures.append(f"p99 {loaded['p99_ms']}ms exceeds {args.p99_target_ms}ms")
+        if loaded["errors"]:
+            failures.append(f"{loaded['errors']} probe requests failed")
+
+    if failures:
+        print("❌ " + "; ".join(failures))
+        return 1
+    print("✅ All streams held and latency targets met")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hold idle SSE streams open and measure API latency")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--user-id", type=int, required=True, help="Local or Moodle user ID the streams are opened for")
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--ramp", type=int, default=500, help="New streams per second")
+    parser.add_argument("--ramp-concurrency", type=int, default=200, help="Streams being opened at once")
+    parser.add_argument("--hold", type=float, default=60, help="Seconds to hold the streams open")
+    parser.add_argument("--probe-path", default="/api/badges/", help="Database-backed endpoint to time")
+    parser.add_argument("--probe-requests", type=int, default=200)
+    parser.add_argument("--probe-concurrency", type=int, default=10)
+    parser.add_argument("--p95-target-ms", type=float, default=200)
+    parser.add_argument("--p99-target-ms", type=float, default=500)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
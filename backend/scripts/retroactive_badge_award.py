@@ -0,0 +1,53 @@
+"""
+Retroactively award badges from the command line.
+
+Creates a retroactive badge award job, or resumes an existing one, and runs
+it chunk by chunk in this process. Progress is committed after every chunk,
+so an interrupted run can be continued with --resume.
+
+Usage (from the backend directory):
+    python -m scripts.retroactive_badge_award --dry-run     # Preview
+    python -m scripts.retroactive_badge_award               # Award badges
+    python -m scripts.retroactive_badge_award --resume 3    # Continue job 3
+"""
+
+import argparse
+import json
+import logging
+
+from app.database.connection import SessionLocal
+from app.models.badge import BadgeAwardJob
+from app.services.badge_award_job import badge_award_jobs, BADGE_AWARD_JOB_CHUNK_SIZE
+
+
+def main(dry_run: bool, user_id: int, chunk_size: int, resume: int):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with SessionLocal() as db:
+        if resume:
+            job = db.get(BadgeAwardJob, resume)
+            if not job:
+                raise SystemExit(f"Badge award job {resume} not found")
+            if job.status == "failed":
+                job.status = "running"
+                job.error = None
+                db.commit()
+            job_id = job.job_id
+        else:
+            job_id = badge_award_jobs.create_job(db, dry_run=dry_run, user_id=user_id, chunk_size=chunk_size).job_id
+
+    badge_award_jobs.run(job_id)
+
+    with SessionLocal() as db:
+        summary = badge_award_jobs.to_dict(db.get(BadgeAwardJob, job_id))
+    summary.pop("user_results")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be awarded")
+    parser.add_argument("--user", type=int, help="Only check this local user ID")
+    parser.add_argument("--chunk-size", type=int, default=BADGE_AWARD_JOB_CHUNK_SIZE, help="Users per chunk")
+    parser.add_argument("--resume", type=int, help="ID of an unfinished job to continue")
+    args = parser.parse_args()
+    main(args.dry_run, args.user, args.chunk_size, args.resume)
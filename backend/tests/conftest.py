@@ -0,0 +1,100 @@
+"""
+Shared fixtures for the backend tests.
+
+The tests run against a real Postgres migrated with ``alembic upgrade head``,
+taken from DATABASE_CONNECTION_STRING; without it they are not collected.
+Every fixture deletes the rows it created.
+"""
+
+import os
+import sys
+
+import pytest
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv()
+
+if not os.getenv("DATABASE_CONNECTION_STRING"):
+    collect_ignore_glob = ["test_*.py"]
+
+# Moodle IDs far above anything a development database holds
+MOODLE_COURSE_ID = 990001
+MOODLE_USER_ID = 990001
+MOODLE_QUIZ_ID = 990017
+MOODLE_LESSON_ID = 990018
+
+CLEANUP_STATEMENTS = (
+    "DELETE FROM experience_points WHERE user_id IN (:user_id, :teacher_id)",
+    "DELETE FROM student_progress WHERE user_id IN (:user_id, :teacher_id)",
+    "DELETE FROM leaderboard_entries WHERE user_id IN (:user_id, :teacher_id)",
+    "DELETE FROM activity_logs WHERE user_id IN (:user_id, :teacher_id)",
+    "DELETE FROM courses WHERE id = :course_id",
+    "DELETE FROM users WHERE id IN (:user_id, :teacher_id)",
+)
+
+
+@pytest.fixture
+def db():
+    from app.database.connection import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    """The webhook routes, without the app's startup services."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routes import webhooks
+
+    app = FastAPI()
+    app.include_router(webhooks.router, prefix="/api")
+    return TestClient(app)
+
+
+@pytest.fixture
+def moodle_course(db):
+    """A teacher, a student and a course with a quiz quest, all with Moodle IDs."""
+    from sqlalchemy import text
+
+    from app.models.course import Course
+    from app.models.quest import Quest
+    from app.models.user import User
+    from app.services.lookup_cache import lookup_cache
+
+    teacher = User(
+        username="test-teacher-990001", email="test-teacher-990001@example.com", password_hash="-",
+        first_name="Test", last_name="Teacher", role="teacher"
+    )
+    student = User(
+        username="test-student-990001", email="test-student-990001@example.com", password_hash="-",
+        first_name="Test", last_name="Student", role="student", moodle_user_id=MOODLE_USER_ID
+    )
+    db.add_all([teacher, student])
+    db.flush()
+    course = Course(title="Test course", teacher_id=teacher.id, moodle_course_id=MOODLE_COURSE_ID)
+    db.add(course)
+    db.flush()
+    quest = Quest(
+        title="Test quiz", creator_id=teacher.id, course_id=course.id, exp_reward=50,
+        quest_type="quiz", validation_method="auto", moodle_activity_id=MOODLE_QUIZ_ID, is_active=True
+    )
+    db.add(quest)
+    db.commit()
+    ids = {"user_id": student.id, "teacher_id": teacher.id, "course_id": course.id, "quest_id": quest.quest_id}
+
+    yield ids
+
+    db.rollback()
+    for statement in CLEANUP_STATEMENTS:
+        db.execute(text(statement), ids)
+    db.commit()
+    lookup_cache.invalidate_courses(MOODLE_COURSE_ID)
+    lookup_cache.invalidate_users(MOODLE_USER_ID)
+    lookup_cache.invalidate_quests(ids["course_id"])
@@ -0,0 +1,33 @@
+"""
+Async sessions leave parameters untyped like the sync ones, and the sync and
+async engines on a database share one pool budget.
+"""
+
+import asyncio
+
+from sqlalchemy import select
+
+from app.database import pool_metrics as pool_metrics_module
+from app.database.connection import AsyncSessionLocal, async_engine
+from app.models.user import User
+
+from conftest import MOODLE_USER_ID
+
+
+def test_string_moodle_id_matches_integer_column(moodle_course):
+    async def lookup():
+        try:
+            async with AsyncSessionLocal() as session:
+                return await session.scalar(select(User.id).where(User.moodle_user_id == str(MOODLE_USER_ID)))
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(lookup()) == moodle_course["user_id"]
+
+
+def test_sync_and_async_pools_share_the_budget(monkeypatch):
+    monkeypatch.setattr(pool_metrics_module, "DB_ASYNC_POOL_SHARE", 0.4)
+
+    for budget in (5, 10, 15):
+        assert pool_metrics_module.share(budget, False) + pool_metrics_module.share(budget, True) == budget
+    assert pool_metrics_module.share(-1, True) == -1
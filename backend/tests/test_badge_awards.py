@@ -0,0 +1,84 @@
+"""
+Only badges whose rows were actually inserted count as awarded, so a badge a
+concurrent check awarded first is neither reported nor notified twice.
+"""
+
+import pytest
+from sqlalchemy import text
+
+from app.models.activity_log import ActivityLog
+from app.models.badge import Badge, BadgeAwardJob, UserBadge
+from app.services.badge_award_job import BadgeAwardJobRunner
+from app.services.badge_criteria import BadgeCriteriaEngine
+from app.services.badge_service import BadgeService
+
+
+@pytest.fixture
+def badge(db):
+    badge = Badge(
+        name="Test badge 990001", badge_type="test", criteria={"type": "xp_earned", "target": 0}, exp_value=5
+    )
+    db.add(badge)
+    db.commit()
+    badge_id = badge.badge_id
+
+    yield badge_id
+
+    db.rollback()
+    db.execute(text("DELETE FROM badges WHERE badge_id = :id"), {"id": badge_id})
+    db.commit()
+
+
+def awarded_ids(awards):
+    return [award["badge"].badge_id for award in awards]
+
+
+def test_awards_are_returned_loaded(db, moodle_course, badge):
+    awards = BadgeService(db).check_and_award_badges(moodle_course["user_id"])
+
+    assert badge in awarded_ids(awards)
+    award = next(award for award in awards if award["badge"].badge_id == badge)
+    assert award["badge"].name == "Test badge 990001"
+    assert award["exp_bonus"] == 5
+    assert award["user_badge"].awarded_at is not None
+
+
+def test_badge_awarded_concurrently_is_skipped(db, moodle_course, badge, monkeypatch):
+    user_id = moodle_course["user_id"]
+    service = BadgeService(db)
+    # Another check awarded the badge after this one loaded the held badges
+    monkeypatch.setattr(
+        service.criteria, "load_earned_badge_ids", lambda user_ids: {held_by: set() for held_by in user_ids}
+    )
+    db.add(UserBadge(user_id=user_id, badge_id=badge))
+    db.commit()
+
+    awards = service.check_and_award_badges(user_id)
+
+    assert badge not in awarded_ids(awards)
+    assert db.query(UserBadge).filter_by(user_id=user_id, badge_id=badge).count() == 1
+
+
+def test_award_job_counts_only_inserted_badges(db, moodle_course, badge, monkeypatch):
+    user_id = moodle_course["user_id"]
+    runner = BadgeAwardJobRunner()
+    job_id = runner.create_job(db, dry_run=False, user_id=user_id).job_id
+    monkeypatch.setattr(
+        BadgeCriteriaEngine, "load_earned_badge_ids", lambda self, user_ids: {held_by: set() for held_by in user_ids}
+    )
+    db.add(UserBadge(user_id=user_id, badge_id=badge))
+    db.commit()
+
+    try:
+        runner.run(job_id)
+        db.expire_all()
+        job = db.get(BadgeAwardJob, job_id)
+        held = db.query(UserBadge).filter_by(user_id=user_id).count()
+        logged = db.query(ActivityLog).filter_by(user_id=user_id, action_type="badge_awarded").all()
+        assert job.badges_awarded == held - 1
+        assert len(logged) == job.badges_awarded
+        assert badge not in [entry.related_entity_id for entry in logged]
+    finally:
+        db.rollback()
+        db.execute(text("DELETE FROM badge_award_jobs WHERE job_id = :id"), {"id": job_id})
+        db.commit()
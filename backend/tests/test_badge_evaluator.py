@@ -0,0 +1,60 @@
+"""
+Signals are evaluated inline when no evaluation workers are running, instead
+of waiting in a queue nothing drains, and off the event loop when raised on it.
+"""
+
+import asyncio
+import threading
+
+from app.services import badge_evaluator
+from app.services.badge_evaluator import BadgeEvaluator
+
+
+def test_signal_without_workers_evaluates_inline(monkeypatch):
+    monkeypatch.setattr(badge_evaluator, "BADGE_EVALUATOR_ENABLED", True)
+    evaluator = BadgeEvaluator()
+    evaluated = []
+    monkeypatch.setattr(evaluator, "_evaluate_inline", evaluated.append)
+
+    evaluator.signal(1)
+    evaluator.signal(1)
+
+    assert evaluated == [1, 1]
+    assert evaluator._pending == {}
+
+
+def test_signal_on_event_loop_without_workers_evaluates_on_a_thread(monkeypatch):
+    monkeypatch.setattr(badge_evaluator, "BADGE_EVALUATOR_ENABLED", True)
+    evaluator = BadgeEvaluator()
+    threads = []
+    monkeypatch.setattr(evaluator, "_evaluate_inline", lambda user_id: threads.append(threading.get_ident()))
+
+    async def signal_on_loop():
+        evaluator.signal(1)
+        assert threads == []
+        await asyncio.gather(*evaluator._inline_tasks)
+
+    asyncio.run(signal_on_loop())
+
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
+
+
+def test_signal_with_workers_is_queued(monkeypatch):
+    monkeypatch.setattr(badge_evaluator, "BADGE_EVALUATOR_ENABLED", True)
+    evaluator = BadgeEvaluator(coalesce_seconds=60)
+    evaluated = []
+    monkeypatch.setattr(evaluator, "_evaluate_inline", evaluated.append)
+
+    async def signal_while_running():
+        evaluator.start()
+        try:
+            evaluator.signal(1)
+            evaluator.signal(1)
+        finally:
+            await evaluator.stop()
+
+    asyncio.run(signal_while_running())
+
+    assert evaluated == []
+    assert list(evaluator._pending) == [1]
+    assert evaluator.stats["coalesced"] == 1
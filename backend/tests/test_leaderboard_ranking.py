@@ -0,0 +1,118 @@
+"""
+Worker processes each keep their own in-memory boards; flushing them must
+not overwrite the scores persisted by another worker, and must only touch
+the entries whose score or rank changed.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app.models.leaderboard import Leaderboard, LeaderboardEntry
+from app.models.quest import ExperiencePoints
+from app.services.leaderboard_ranking import LeaderboardRankingEngine, XPAward
+
+
+@pytest.fixture
+def course_board(db, moodle_course):
+    leaderboard = Leaderboard(
+        name="Test course XP", course_id=moodle_course["course_id"], metric_type="exp", timeframe="all_time"
+    )
+    db.add(leaderboard)
+    db.commit()
+    leaderboard_id = leaderboard.leaderboard_id
+
+    yield leaderboard_id
+
+    db.rollback()
+    db.execute(text("DELETE FROM leaderboard_entries WHERE leaderboard_id = :id"), {"id": leaderboard_id})
+    db.execute(text("DELETE FROM leaderboards WHERE leaderboard_id = :id"), {"id": leaderboard_id})
+    db.commit()
+
+
+def award(db, engine: LeaderboardRankingEngine, user_id: int, course_id: int, amount: int):
+    """Commit an award and apply it to one worker's boards, as its after-commit hook would."""
+    db.add(ExperiencePoints(user_id=user_id, course_id=course_id, amount=amount, source_type="test"))
+    db.commit()
+    engine.apply_xp([XPAward(user_id, course_id, amount, datetime.now(timezone.utc))])
+
+
+def stored(db, leaderboard_id: int) -> dict:
+    db.expire_all()
+    return {
+        entry.user_id: (float(entry.score), entry.rank)
+        for entry in db.query(LeaderboardEntry).filter_by(leaderboard_id=leaderboard_id)
+    }
+
+
+def test_flushes_of_two_workers_keep_both_awards(db, moodle_course, course_board):
+    user_id, course_id = moodle_course["user_id"], moodle_course["course_id"]
+    first, second = LeaderboardRankingEngine(), LeaderboardRankingEngine()
+    first.get_board(db, course_board)
+    second.get_board(db, course_board)
+
+    award(db, first, user_id, course_id, 30)
+    award(db, second, user_id, course_id, 20)
+    first.flush(db)
+    second.flush(db)
+
+    assert stored(db, course_board) == {user_id: (50, 1)}
+    assert second.rank_of(db, course_board, user_id)["score"] == 50
+    # A worker picks up the other's flushed award with its next delta for the user
+    award(db, first, user_id, course_id, 5)
+    first.flush(db)
+    assert stored(db, course_board) == {user_id: (55, 1)}
+    assert first.rank_of(db, course_board, user_id)["score"] == 55
+
+
+def test_flush_without_changes_writes_nothing(db, moodle_course, course_board):
+    engine = LeaderboardRankingEngine()
+    engine.get_board(db, course_board)
+    award(db, engine, moodle_course["user_id"], moodle_course["course_id"], 30)
+
+    assert engine.flush(db) == 1
+    assert engine.flush(db) == 0
+    assert engine.flush(db, [course_board]) == 0
+
+
+def test_flush_reranks_only_the_range_users_moved_across(db, moodle_course, course_board, monkeypatch):
+    student, teacher, course_id = moodle_course["user_id"], moodle_course["teacher_id"], moodle_course["course_id"]
+    engine = LeaderboardRankingEngine()
+    engine.get_board(db, course_board)
+    award(db, engine, teacher, course_id, 100)
+    award(db, engine, student, course_id, 10)
+    assert engine.flush(db) == 2
+
+    def recompute(*args):
+        raise AssertionError("a regular flush must not recompute the board")
+
+    monkeypatch.setattr("app.crud.leaderboard.calculate_scores_for_leaderboard", recompute)
+
+    # Still below the teacher: only the student's entry is written
+    award(db, engine, student, course_id, 5)
+    assert engine.flush(db) == 1
+    assert stored(db, course_board) == {teacher: (100, 1), student: (15, 2)}
+
+    # Overtaking the teacher re-ranks both
+    award(db, engine, student, course_id, 200)
+    assert engine.flush(db) == 2
+    assert stored(db, course_board) == {student: (215, 1), teacher: (100, 2)}
+
+
+def test_reload_reconciles_stored_entries(db, moodle_course, course_board):
+    student, teacher, course_id = moodle_course["user_id"], moodle_course["teacher_id"], moodle_course["course_id"]
+    db.add(ExperiencePoints(
+        user_id=student, course_id=course_id, amount=40, source_type="test",
+        awarded_at=datetime.now(timezone.utc) - timedelta(hours=1)
+    ))
+    db.add_all([
+        LeaderboardEntry(leaderboard_id=course_board, user_id=student, score=999, rank=2),
+        LeaderboardEntry(leaderboard_id=course_board, user_id=teacher, score=1000, rank=1),
+    ])
+    db.commit()
+
+    engine = LeaderboardRankingEngine()
+    engine.get_board(db, course_board)
+    assert engine.flush(db) == 2
+    assert stored(db, course_board) == {student: (40, 1)}
@@ -0,0 +1,76 @@
+"""
+Cached courses and users are dropped when a commit changes them, whichever
+code path made the change. Lookups that found nothing are never cached, and
+credentials are never kept in the cache.
+"""
+
+from app.database.connection import SessionLocal
+from app.models.course import Course
+from app.models.user import User
+from app.services.lookup_cache import lookup_cache
+
+from conftest import MOODLE_COURSE_ID, MOODLE_QUIZ_ID, MOODLE_USER_ID
+
+
+def test_committed_course_update_invalidates_cache(db, moodle_course):
+    assert lookup_cache.get_course(db, MOODLE_COURSE_ID).title == "Test course"
+
+    writer = SessionLocal()
+    try:
+        writer.get(Course, moodle_course["course_id"]).title = "Renamed course"
+        writer.commit()
+    finally:
+        writer.close()
+
+    db.expunge_all()
+    assert lookup_cache.get_course(db, MOODLE_COURSE_ID).title == "Renamed course"
+
+
+def test_committed_user_update_invalidates_cache(db, moodle_course):
+    assert lookup_cache.get_user(db, MOODLE_USER_ID).id == moodle_course["user_id"]
+
+    writer = SessionLocal()
+    try:
+        writer.get(User, moodle_course["user_id"]).moodle_user_id = MOODLE_USER_ID + 1
+        writer.commit()
+    finally:
+        writer.close()
+
+    assert lookup_cache.get_user(db, MOODLE_USER_ID) is None
+
+
+def test_rolled_back_update_keeps_cache(db, moodle_course):
+    lookup_cache.get_course(db, MOODLE_COURSE_ID)
+    cached = len(lookup_cache.courses)
+
+    writer = SessionLocal()
+    try:
+        writer.get(Course, moodle_course["course_id"]).title = "Not saved"
+        writer.flush()
+        writer.rollback()
+    finally:
+        writer.close()
+
+    assert len(lookup_cache.courses) == cached
+
+
+def test_user_snapshots_leave_out_credentials(db, moodle_course):
+    lookup_cache.get_user(db, MOODLE_USER_ID)
+    db.expunge_all()
+
+    snapshot = lookup_cache.users.get(MOODLE_USER_ID)
+    assert snapshot["id"] == moodle_course["user_id"]
+    assert "password_hash" not in snapshot and "user_token" not in snapshot
+    # Columns left out of the snapshot still load on access
+    assert lookup_cache.get_user(db, MOODLE_USER_ID).password_hash == "-"
+
+
+def test_quest_lookups_finding_nothing_are_not_cached(db, moodle_course):
+    course_id = moodle_course["course_id"]
+    assert lookup_cache.get_activity_quests(db, course_id, MOODLE_QUIZ_ID + 1000) == []
+    assert lookup_cache.quests.get((course_id, MOODLE_QUIZ_ID + 1000)) is None
+
+    assert [quest.quest_id for quest in lookup_cache.get_activity_quests(db, course_id, MOODLE_QUIZ_ID)] == [
+        moodle_course["quest_id"]
+    ]
+    assert lookup_cache.quests.get((course_id, MOODLE_QUIZ_ID)) is not None
@@ -0,0 +1,47 @@
+"""
+Broadcasts reach other workers in broker messages that each fit the
+broker's payload limit, however many recipients they have.
+"""
+
+import asyncio
+import json
+
+from app.services.notification_broker import POSTGRES_MAX_PAYLOAD_BYTES, NotificationBroker
+from app.services.notification_service import NotificationData, SSENotificationService
+
+
+class RecordingBroker(NotificationBroker):
+    max_payload_bytes = POSTGRES_MAX_PAYLOAD_BYTES
+
+    def __init__(self):
+        super().__init__()
+        self.payloads = []
+
+    async def publish(self, message):
+        self.payloads.append(json.dumps(message, default=str))
+
+
+def broadcast(user_ids, message: str = "Message"):
+    broker = RecordingBroker()
+    service = SSENotificationService(broker=broker)
+    service.broker_started = True
+    recipients = asyncio.run(service.broadcast(NotificationData("info", 0, "Title", message), user_ids=user_ids))
+    return recipients, broker.payloads
+
+
+def test_broadcast_messages_fit_the_payload_limit():
+    user_ids = list(range(10_000_000, 10_003_000))
+    recipients, payloads = broadcast(user_ids, message="x" * 2000)
+
+    assert recipients == len(user_ids)
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) <= POSTGRES_MAX_PAYLOAD_BYTES for payload in payloads)
+    sent = [user_id for payload in payloads for user_id in json.loads(payload)["user_ids"]]
+    assert sorted(sent) == user_ids
+
+
+def test_frame_too_large_for_the_broker_is_not_published():
+    recipients, payloads = broadcast([1, 2], message="x" * POSTGRES_MAX_PAYLOAD_BYTES)
+
+    assert recipients == 2
+    assert payloads == []
@@ -0,0 +1,65 @@
+"""
+A notification is logged and delivered locally once; only its publication
+to the other workers is retried when the broker fails.
+"""
+
+import asyncio
+
+from app.services import notification_dispatcher as dispatcher_module
+from app.services.notification_broker import NotificationBroker
+from app.services.notification_dispatcher import NotificationDispatcher
+from app.services.notification_log import notification_log
+from app.services.notification_service import NotificationData, SSENotificationService
+
+
+class FlakyBroker(NotificationBroker):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.attempts = []
+
+    async def publish(self, message):
+        self.attempts.append(message)
+        if len(self.attempts) <= self.failures:
+            raise ConnectionError("broker unavailable")
+        await super().publish(message)
+
+
+def dispatch(monkeypatch, broker: NotificationBroker) -> NotificationDispatcher:
+    service = SSENotificationService(broker=broker)
+    service.broker_started = True
+    monkeypatch.setattr(dispatcher_module, "notification_service", service)
+    logged = []
+    monkeypatch.setattr(notification_log, "enabled", True)
+    monkeypatch.setattr(notification_log, "append", lambda user_id, message: logged.append(user_id) or len(logged))
+    dispatcher = NotificationDispatcher(retries=3)
+
+    async def run():
+        queue = service.open_connection(7)
+        service.attach_user(queue)
+        dispatcher.start()
+        dispatcher.dispatch(NotificationData("info", 7, "Title", "Message"))
+        await dispatcher.stop()
+        return queue.qsize()
+
+    delivered = asyncio.run(run())
+    assert logged == [7]
+    assert delivered == 1
+    return dispatcher
+
+
+def test_failed_publish_is_retried_without_delivering_again(monkeypatch):
+    broker = FlakyBroker(failures=1)
+    dispatcher = dispatch(monkeypatch, broker)
+
+    assert len(broker.attempts) == 2
+    assert broker.attempts[0] == broker.attempts[1]
+    assert dispatcher.stats["sent"] == 1
+
+
+def test_publish_gives_up_after_the_retries(monkeypatch):
+    broker = FlakyBroker(failures=5)
+    dispatcher = dispatch(monkeypatch, broker)
+
+    assert len(broker.attempts) == 3
+    assert dispatcher.stats["failed"] == 1
@@ -0,0 +1,85 @@
+"""
+The notification WebSocket only serves authenticated users their own
+connection, and only the channels they may see.
+"""
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from starlette.websockets import WebSocketDisconnect
+
+from app.models.user import User
+from app.routes import notifications
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Tokens are "user-<id>"; the development auth bypass would accept anything."""
+    def authenticate_token(db, token):
+        user = db.get(User, int(token.removeprefix("user-"))) if token.startswith("user-") else None
+        if user is None:
+            raise HTTPException(status_code=401, detail="Could not validate credentials")
+        return user
+
+    monkeypatch.setattr(notifications, "authenticate_token", authenticate_token)
+    monkeypatch.setattr(notifications, "WS_AUTH_TIMEOUT_SECONDS", 1)
+    app = FastAPI()
+    app.include_router(notifications.router, prefix="/api")
+    return TestClient(app)
+
+
+def closed_with(ws) -> int:
+    with pytest.raises(WebSocketDisconnect) as closed:
+        ws.receive_text()
+    return closed.value.code
+
+
+def subscribe(ws, channel: str) -> dict:
+    ws.send_json({"op": "sub", "c": channel})
+    return ws.receive_json()
+
+
+def test_socket_without_valid_token_is_closed(client, moodle_course):
+    user_id = moodle_course["user_id"]
+    with client.websocket_connect(f"/api/notifications/ws/{user_id}") as ws:
+        ws.send_json({"op": "sub", "c": "notifications"})
+        assert closed_with(ws) == 1008
+    with client.websocket_connect(f"/api/notifications/ws/{user_id}?token=forged") as ws:
+        assert closed_with(ws) == 1008
+
+
+def test_socket_of_another_user_is_closed(client, moodle_course):
+    student, teacher = moodle_course["user_id"], moodle_course["teacher_id"]
+    with client.websocket_connect(f"/api/notifications/ws/{student}?token=user-{teacher}") as ws:
+        assert closed_with(ws) == 1008
+
+
+def test_student_channels(client, db, moodle_course):
+    student, course_id = moodle_course["user_id"], moodle_course["course_id"]
+    with client.websocket_connect(f"/api/notifications/ws/{student}") as ws:
+        ws.send_json({"op": "auth", "token": f"user-{student}"})
+        assert subscribe(ws, "notifications")["op"] == "subscribed"
+        assert subscribe(ws, "leaderboard:global")["op"] == "subscribed"
+        assert subscribe(ws, f"quest_analytics:{course_id}") == {
+            "op": "error", "c": f"quest_analytics:{course_id}", "message": "Not allowed"
+        }
+        # Not enrolled yet
+        assert subscribe(ws, f"leaderboard:{course_id}")["op"] == "error"
+
+    db.execute(
+        text("INSERT INTO course_enrollments (course_id, user_id, role) VALUES (:course_id, :user_id, 'student')"),
+        {"course_id": course_id, "user_id": student}
+    )
+    db.commit()
+    with client.websocket_connect(f"/api/notifications/ws/{student}?token=user-{student}") as ws:
+        assert subscribe(ws, f"leaderboard:{course_id}")["op"] == "subscribed"
+        assert subscribe(ws, f"quest_analytics:{course_id}")["op"] == "error"
+
+
+def test_teacher_sees_course_analytics(client, moodle_course):
+    teacher, course_id = moodle_course["teacher_id"], moodle_course["course_id"]
+    with client.websocket_connect(f"/api/notifications/ws/{teacher}?token=user-{teacher}") as ws:
+        assert subscribe(ws, f"quest_analytics:{course_id}")["op"] == "subscribed"
+        assert subscribe(ws, f"leaderboard:{course_id}")["op"] == "subscribed"
+        assert subscribe(ws, "quest_analytics:999999999")["op"] == "error"
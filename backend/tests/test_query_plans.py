@@ -0,0 +1,240 @@
+"""
+The hot-path queries are served by indexes.
+
+Seeds a realistic dataset (users, courses, quests, quest progress,
+engagement events, activity logs, student progress and XP) inside a
+transaction, runs ``ANALYZE`` so the planner sees its real size, and
+EXPLAINs the lookups the webhook handlers, leaderboards and analytics run
+on every request. Each query must reach its table through an index scan
+(plain, index-only or bitmap) on one of the expected indexes; a sequential
+scan means an index is missing or not usable. Tables of at most
+``SMALL_TABLE_PAGES`` pages (e.g. courses) are skipped when scanned
+sequentially, since Postgres rightly prefers that over an index there.
+
+The transaction is rolled back afterwards.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# Offset for seeded Moodle ids and names, clear of real data and the other tests' fixtures
+SEED = 900000
+# Dataset size; the first "courses" users are the teachers
+SIZES = {"users": 1000, "courses": 10, "quests": 40, "activities": 40}
+INDEX_SCANS = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+# Tables this small are read sequentially by design; a seq scan on them is not a failure
+SMALL_TABLE_PAGES = 10
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO users (username, email, password_hash, first_name, last_name, role, moodle_user_id)
+    SELECT 'plan_check_' || i, 'plan_check_' || i || '@example.com', 'x', 'Plan', 'Check ' || i,
+           CASE WHEN i <= :courses THEN 'teacher' ELSE 'student' END, :seed + i
+    FROM generate_series(1, :users) AS i
+    """,
+    """
+    INSERT INTO courses (title, course_code, teacher_id, moodle_course_id)
+    SELECT 'Plan check course ' || i, 'PLAN-CHECK-' || i, u.id, :seed + i
+    FROM generate_series(1, :courses) AS i
+    JOIN users u ON u.moodle_user_id = :seed + i
+    """,
+    """
+    INSERT INTO quests (title, course_id, creator_id, exp_reward, quest_type, validation_method,
+                        is_active, moodle_activity_id)
+    SELECT 'Plan check quest ' || q, c.id, c.teacher_id, 50, 'assignment', 'manual',
+           q % 10 <> 0, :seed + (c.moodle_course_id - :seed) * 1000 + q
+    FROM courses c, generate_series(1, :quests) AS q
+    WHERE c.moodle_course_id > :seed
+    """,
+    # Each student takes three courses
+    """
+    INSERT INTO student_progress (user_id, course_id, total_exp, quests_completed, badges_earned,
+                                  study_hours, streak_days, last_activity)
+    SELECT u.id, c.id, (u.id * 37 + c.id) % 2000, (u.id + c.id) % 20, 0, 0, 0, now()
+    FROM users u
+    JOIN courses c ON c.moodle_course_id > :seed
+     AND (c.moodle_course_id - :seed + u.id) % :courses < 3
+    WHERE u.moodle_user_id > :seed + :courses
+    """,
+    # A third of each enrolled course's quests started, two thirds of those completed
+    """
+    INSERT INTO quest_progress (user_id, quest_id, status, progress_percent, started_at, completed_at)
+    SELECT sp.user_id, q.quest_id,
+           CASE WHEN (sp.user_id + q.quest_id) % 3 = 0 THEN 'in_progress' ELSE 'completed' END,
+           CASE WHEN (sp.user_id + q.quest_id) % 3 = 0 THEN 50 ELSE 100 END,
+           now() - ((sp.user_id + q.quest_id) % 180) * interval '1 day',
+           CASE WHEN (sp.user_id + q.quest_id) % 3 = 0 THEN NULL
+                ELSE now() - ((sp.user_id + q.quest_id) % 180) * interval '1 day' + interval '2 hours' END
+    FROM student_progress sp
+    JOIN courses c ON c.id = sp.course_id AND c.moodle_course_id > :seed
+    JOIN quests q ON q.course_id = sp.course_id
+    WHERE (sp.user_id + q.quest_id) % 3 <> 1
+      AND (sp.user_id * 2 + q.quest_id) % 3 = 0
+    """,
+    """
+    INSERT INTO quest_engagement_events (quest_progress_id, event_type, timestamp, engagement_points)
+    SELECT qp.progress_id, (ARRAY['viewed', 'started', 'submitted', 'completed'])[e],
+           qp.started_at + e * interval '10 minutes', e * 5
+    FROM quest_progress qp
+    JOIN quests q ON q.quest_id = qp.quest_id AND q.moodle_activity_id > :seed
+    CROSS JOIN generate_series(1, 4) AS e
+    WHERE e < 4 OR qp.status = 'completed'
+    """,
+    """
+    INSERT INTO experience_points (user_id, course_id, amount, source_type, source_id, awarded_at)
+    SELECT qp.user_id, q.course_id, q.exp_reward,
+           (ARRAY['completion', 'lesson', 'forum_post', 'choice'])[1 + qp.progress_id % 4],
+           q.moodle_activity_id, qp.completed_at
+    FROM quest_progress qp
+    JOIN quests q ON q.quest_id = qp.quest_id AND q.moodle_activity_id > :seed
+    WHERE qp.status = 'completed'
+    """,
+    # A year of activity, a few dozen entries per student
+    """
+    INSERT INTO activity_logs (user_id, action_type, related_entity_type, timestamp, exp_change)
+    SELECT u.id, (ARRAY['login', 'quest_started', 'quest_completed', 'lesson_viewed'])[1 + a % 4], 'quest',
+           now() - ((u.id * 13 + a * 7) % 365) * interval '1 day' - (a % 24) * interval '1 hour', a % 3 * 10
+    FROM users u
+    CROSS JOIN generate_series(1, :activities) AS a
+    WHERE u.moodle_user_id > :seed
+    """,
+]
+
+SEEDED_TABLES = [
+    "users", "courses", "quests", "student_progress", "quest_progress",
+    "quest_engagement_events", "experience_points", "activity_logs",
+]
+
+# (name, table, indexes the table must be scanned with, statement)
+CHECKS: List[Tuple[str, str, Tuple[str, ...], str]] = [
+    (
+        "user by Moodle id", "users", ("ix_users_moodle_user_id",),
+        "SELECT * FROM users WHERE moodle_user_id = :moodle_user_id",
+    ),
+    (
+        "course by Moodle id", "courses", ("courses_moodle_course_id_key",),
+        "SELECT * FROM courses WHERE moodle_course_id = :moodle_course_id",
+    ),
+    (
+        "webhook quest lookup", "quests",
+        ("ix_quests_course_id_moodle_activity_id_is_active", "ix_quests_moodle_activity_id"),
+        """
+        SELECT * FROM quests
+        WHERE course_id = :course_id AND moodle_activity_id = :moodle_activity_id AND is_active = true
+        """,
+    ),
+    (
+        "student progress of a user in a course", "student_progress", ("ix_student_progress_user_id_course_id",),
+        "SELECT * FROM student_progress WHERE user_id = :user_id AND course_id = :course_id",
+    ),
+    (
+        "student progress of a user", "student_progress", ("ix_student_progress_user_id_course_id",),
+        "SELECT * FROM student_progress WHERE user_id = :user_id",
+    ),
+    (
+        "duplicate XP check", "experience_points", ("ix_experience_points_user_course_source",),
+        """
+        SELECT * FROM experience_points
+        WHERE user_id = :user_id AND course_id = :course_id
+          AND source_type = 'completion' AND source_id = :moodle_activity_id
+        LIMIT 1
+        """,
+    ),
+    (
+        "XP history of a user", "experience_points", ("ix_experience_points_user_course_source",),
+        "SELECT sum(amount) FROM experience_points WHERE user_id = :user_id",
+    ),
+    (
+        "quest completions since a date", "quest_progress", ("ix_quest_progress_quest_id_status_completed_at",),
+        """
+        SELECT date(completed_at), count(*) FROM quest_progress
+        WHERE quest_id = :quest_id AND status = 'completed' AND completed_at >= now() - interval '30 days'
+        GROUP BY date(completed_at)
+        """,
+    ),
+    (
+        "latest engagement event of a type", "quest_engagement_events",
+        ("ix_quest_engagement_events_progress_type_id",),
+        """
+        SELECT * FROM quest_engagement_events
+        WHERE quest_progress_id = :progress_id AND event_type = 'viewed'
+        ORDER BY id DESC
+        LIMIT 1
+        """,
+    ),
+    (
+        "daily active users over a week", "activity_logs", ("ix_activity_logs_timestamp_user_id",),
+        """
+        SELECT date(timestamp), count(DISTINCT user_id) FROM activity_logs
+        WHERE timestamp >= now() - interval '7 days' AND timestamp <= now()
+        GROUP BY date(timestamp)
+        """,
+    ),
+    (
+        "recent activity of a user", "activity_logs", ("ix_activity_logs_user_id_timestamp",),
+        "SELECT * FROM activity_logs WHERE user_id = :user_id ORDER BY timestamp DESC LIMIT 10",
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    """A connection inside a transaction holding the dataset, and ids of one seeded student, course, quest and quest progress"""
+    from app.database.connection import engine
+
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            for statement in SEED_STATEMENTS:
+                conn.execute(text(statement), {"seed": SEED, **SIZES})
+            for table in SEEDED_TABLES:
+                conn.execute(text(f"ANALYZE {table}"))
+
+            row = conn.execute(text("""
+                SELECT qp.user_id, u.moodle_user_id, q.course_id, c.moodle_course_id,
+                       q.quest_id, q.moodle_activity_id, qp.progress_id
+                FROM quest_progress qp
+                JOIN users u ON u.id = qp.user_id
+                JOIN quests q ON q.quest_id = qp.quest_id
+                JOIN courses c ON c.id = q.course_id
+                WHERE u.moodle_user_id > :seed AND qp.status = 'completed'
+                ORDER BY qp.progress_id
+                LIMIT 1
+            """), {"seed": SEED}).mappings().first()
+            assert row is not None, "seeding produced no completed quest progress"
+            yield conn, dict(row)
+        finally:
+            transaction.rollback()
+
+
+def plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.parametrize("name, table, indexes, statement", CHECKS, ids=[check[0] for check in CHECKS])
+def test_query_uses_its_index(seeded, name, table, indexes, statement):
+    conn, params = seeded
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {statement}"), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(plan_nodes(plan[0]["Plan"]))
+    scans = [
+        node for node in nodes
+        if node.get("Relation Name") == table or node["Node Type"] == "Bitmap Index Scan"
+    ]
+    passed = (
+        any(node["Node Type"] in INDEX_SCANS and node.get("Index Name") in indexes for node in nodes)
+        and not any(node["Node Type"] == "Seq Scan" for node in scans)
+    )
+
+    pages = conn.execute(text("SELECT relpages FROM pg_class WHERE relname = :table"), {"table": table}).scalar()
+    if not passed and pages <= SMALL_TABLE_PAGES:
+        pytest.skip(f"{table} fits in {pages} pages")
+    text_plan = "\n".join(row[0] for row in conn.execute(text(f"EXPLAIN {statement}"), params))
+    assert passed, f"{name} does not use {' or '.join(indexes)}:\n{text_plan}"
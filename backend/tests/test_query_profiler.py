@@ -0,0 +1,27 @@
+"""
+The query profiler keeps no per-connection state for failed statements.
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+from app.database.connection import DATABASE_URL
+from app.services.query_profiler import QueryProfiler
+
+
+def test_failed_statement_leaves_no_start_time():
+    engine = create_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+    profiler = QueryProfiler(enabled=True)
+    try:
+        with profiler.profile() as profile, engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(DBAPIError):
+                    conn.execute(text("SELECT 1 / 0"))
+                conn.rollback()
+            conn.execute(text("SELECT 1"))
+            assert not any(key.startswith("query_profiler") for key in conn.info)
+    finally:
+        engine.dispose()
+
+    assert profile.queries == 1
@@ -0,0 +1,52 @@
+"""
+The slow-query log keeps no per-connection state for failed statements, is
+not served to non-admins, and does not record parameters unless asked to.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+from app.database.connection import DATABASE_URL
+from app.database.slow_query_log import SlowQueryLog
+from app.routes.debug import router as debug_router
+
+
+@pytest.fixture
+def logged_engine():
+    engine = create_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+    log = SlowQueryLog(enabled=True, threshold_ms=0, path=None)
+    log.attach(engine)
+    yield engine, log
+    engine.dispose()
+
+
+def test_failed_statement_leaves_no_start_time(logged_engine):
+    engine, log = logged_engine
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(DBAPIError):
+                conn.execute(text("SELECT 1 / 0"))
+            conn.rollback()
+        conn.execute(text("SELECT 1"))
+        assert not any(key.startswith("slow_query") for key in conn.info)
+
+    assert [record["statement"] for record in log.records] == ["SELECT 1"]
+
+
+def test_parameters_are_not_recorded_by_default():
+    log = SlowQueryLog(enabled=True, threshold_ms=0, path=None)
+    log.record("SELECT * FROM users WHERE email = %(email)s", {"email": "student@example.com"}, 1.0)
+    assert log.records[0]["parameters"] is None
+
+
+def test_debug_routes_require_an_admin():
+    app = FastAPI()
+    app.include_router(debug_router, prefix="/api")
+    client = TestClient(app)
+
+    assert client.get("/api/debug/slow-queries").status_code == 401
+    # The development auth bypass signs everyone in as a teacher
+    assert client.get("/api/debug/slow-queries", headers={"Authorization": "Bearer token"}).status_code == 403
@@ -0,0 +1,87 @@
+"""
+Duplicate suppression of webhook deliveries: keys derived from the payload
+only cover Moodle's retry window, supplied keys are kept for a day.
+"""
+
+import time
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+from app.models.quest import ExperiencePoints
+from app.services import idempotency
+from app.services.idempotency import webhook_idempotency
+
+from conftest import MOODLE_COURSE_ID, MOODLE_LESSON_ID, MOODLE_USER_ID
+
+LESSON_VIEWED = "lesson/viewed"
+PAYLOAD = {"course_id": MOODLE_COURSE_ID, "user_id": MOODLE_USER_ID, "lesson_id": MOODLE_LESSON_ID}
+
+
+@pytest.fixture
+def claimed_keys(db):
+    keys = []
+    yield keys
+    db.rollback()
+    db.execute(text("DELETE FROM webhook_idempotency_keys WHERE key = ANY(:keys)"), {"keys": keys})
+    db.commit()
+    for key in keys:
+        webhook_idempotency._recent.pop(key, None)
+
+
+def later(db, monkeypatch, keys, elapsed: timedelta):
+    """Move the claims of the keys and the awarded XP back by elapsed, as if that much time had passed."""
+    db.execute(
+        text("UPDATE webhook_idempotency_keys SET created_at = created_at - :elapsed WHERE key = ANY(:keys)"),
+        {"elapsed": elapsed, "keys": keys}
+    )
+    db.execute(
+        text("UPDATE experience_points SET awarded_at = awarded_at - :elapsed WHERE source_type = 'lesson_view'"
+             " AND source_id = :lesson_id"),
+        {"elapsed": elapsed, "lesson_id": MOODLE_LESSON_ID}
+    )
+    db.commit()
+    now = time.monotonic() + elapsed.total_seconds()
+    monkeypatch.setattr(idempotency, "time", SimpleNamespace(monotonic=lambda: now))
+
+
+def lesson_views(db, user_id: int) -> int:
+    return db.query(ExperiencePoints).filter_by(user_id=user_id, source_type="lesson_view").count()
+
+
+def test_derived_keys_are_short_lived():
+    key = webhook_idempotency.derive_key(LESSON_VIEWED, PAYLOAD)
+    assert len(key) == 64
+    assert webhook_idempotency.ttl_for(key) == webhook_idempotency.derived_ttl
+    assert webhook_idempotency.derived_ttl < timedelta(hours=1)
+
+    supplied = webhook_idempotency.derive_key(LESSON_VIEWED, PAYLOAD, "moodle-event-1")
+    assert len(supplied) == 64
+    assert webhook_idempotency.ttl_for(supplied) == webhook_idempotency.ttl
+
+
+def test_repeated_view_outside_retry_window_is_processed(client, db, moodle_course, claimed_keys, monkeypatch):
+    claimed_keys.append(webhook_idempotency.derive_key(LESSON_VIEWED, PAYLOAD))
+
+    assert client.post("/api/webhooks/lesson/viewed", json=PAYLOAD).json()["status"] == "received"
+    # A Moodle retry of the same delivery
+    assert client.post("/api/webhooks/lesson/viewed", json=PAYLOAD).json()["status"] == "duplicate"
+    assert lesson_views(db, moodle_course["user_id"]) == 1
+
+    # The same lesson viewed again after the XP re-award window
+    later(db, monkeypatch, claimed_keys, timedelta(hours=1, minutes=1))
+    assert client.post("/api/webhooks/lesson/viewed", json=PAYLOAD).json()["status"] == "received"
+    assert lesson_views(db, moodle_course["user_id"]) == 2
+
+
+def test_supplied_key_is_suppressed_for_the_full_ttl(client, db, moodle_course, claimed_keys, monkeypatch):
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    claimed_keys.append(webhook_idempotency.derive_key(LESSON_VIEWED, PAYLOAD, headers["Idempotency-Key"]))
+
+    assert client.post("/api/webhooks/lesson/viewed", json=PAYLOAD, headers=headers).json()["status"] == "received"
+    later(db, monkeypatch, claimed_keys, timedelta(hours=1, minutes=1))
+    assert client.post("/api/webhooks/lesson/viewed", json=PAYLOAD, headers=headers).json()["status"] == "duplicate"
+    assert lesson_views(db, moodle_course["user_id"]) == 1
@@ -0,0 +1,67 @@
+"""
+Moodle sends IDs as numbers or numeric strings depending on the event; both
+must resolve the same rows.
+"""
+
+import uuid
+
+from app.models.quest import ExperiencePoints, QuestProgress
+from app.services.lookup_cache import lookup_cache
+from app.services.webhook_lookups import WebhookLookups
+
+from conftest import MOODLE_COURSE_ID, MOODLE_QUIZ_ID, MOODLE_USER_ID
+
+
+def test_lookup_cache_accepts_string_ids(db, moodle_course):
+    course = lookup_cache.get_course(db, str(MOODLE_COURSE_ID))
+    assert course is not None and course.id == moodle_course["course_id"]
+    # Served from the entry cached under the int ID
+    assert lookup_cache.get_course(db, MOODLE_COURSE_ID) is course
+    assert lookup_cache.get_user(db, str(MOODLE_USER_ID)).id == moodle_course["user_id"]
+    assert lookup_cache.get_course(db, "not-an-id") is None
+    assert lookup_cache.get_user(db, None) is None
+
+
+def test_webhook_with_string_ids_completes_quest(client, db, moodle_course):
+    response = client.post(
+        "/api/webhooks/quiz/attempt-submitted",
+        json={"course_id": str(MOODLE_COURSE_ID), "user_id": str(MOODLE_USER_ID), "quiz_id": str(MOODLE_QUIZ_ID)},
+        headers={"Idempotency-Key": str(uuid.uuid4())},
+    )
+    assert response.status_code == 200
+
+    progress = db.query(QuestProgress).filter_by(
+        user_id=moodle_course["user_id"], quest_id=moodle_course["quest_id"]
+    ).one()
+    assert progress.status == "completed"
+    awarded = db.query(ExperiencePoints).filter_by(user_id=moodle_course["user_id"]).all()
+    assert sum(xp.amount for xp in awarded) == 50
+
+
+def test_preload_coerces_string_ids(db, moodle_course):
+    lookups = WebhookLookups(db)
+    lookups.preload([{"course_id": str(MOODLE_COURSE_ID), "user_id": str(MOODLE_USER_ID), "quiz_id": str(MOODLE_QUIZ_ID)}])
+    assert set(lookups.courses) == {MOODLE_COURSE_ID}
+    assert set(lookups.users) == {MOODLE_USER_ID}
+    assert set(lookups.quests) == {(moodle_course["course_id"], MOODLE_QUIZ_ID)}
+
+    # String and int IDs share the preloaded entries
+    assert lookups.course(str(MOODLE_COURSE_ID)) is lookups.course(MOODLE_COURSE_ID)
+    assert lookups.user(str(MOODLE_USER_ID)).id == moodle_course["user_id"]
+    assert lookups.quest(moodle_course["course_id"], str(MOODLE_QUIZ_ID)).quest_id == moodle_course["quest_id"]
+    assert lookups.course("abc") is None
+
+
+def test_batch_with_string_ids_completes_quest(client, db, moodle_course):
+    response = client.post("/api/webhooks/batch", json=[{
+        "event_path": "quiz/attempt-submitted",
+        "payload": {"course_id": str(MOODLE_COURSE_ID), "user_id": str(MOODLE_USER_ID), "quiz_id": str(MOODLE_QUIZ_ID)},
+        "idempotency_key": str(uuid.uuid4()),
+    }])
+    assert response.status_code == 200
+    assert response.json()[0]["status"] == "processed"
+
+    progress = db.query(QuestProgress).filter_by(
+        user_id=moodle_course["user_id"], quest_id=moodle_course["quest_id"]
+    ).one()
+    assert progress.status == "completed"
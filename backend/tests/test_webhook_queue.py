@@ -0,0 +1,73 @@
+"""
+In queue mode an event's idempotency claim is committed together with the
+queued event, and the queue's inspection routes are for administrators.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from app.models.webhook_event import WebhookEvent, WebhookIdempotencyKey
+from app.routes.webhooks import queue
+from app.services.idempotency import webhook_idempotency
+
+from conftest import MOODLE_COURSE_ID, MOODLE_LESSON_ID, MOODLE_USER_ID
+
+LESSON_VIEWED = "lesson/viewed"
+
+
+@pytest.fixture
+def queue_mode(db, monkeypatch):
+    monkeypatch.setattr(queue, "WEBHOOK_INGESTION_MODE", "queue")
+    payload = {
+        "course_id": MOODLE_COURSE_ID, "user_id": MOODLE_USER_ID, "lesson_id": MOODLE_LESSON_ID,
+        "event_id": f"test-queue-{uuid.uuid4()}"
+    }
+    key = webhook_idempotency.derive_key(LESSON_VIEWED, payload)
+
+    yield payload, key
+
+    db.rollback()
+    db.execute(text("DELETE FROM webhook_events WHERE payload->>'event_id' = :id"), {"id": payload["event_id"]})
+    db.execute(text("DELETE FROM webhook_idempotency_keys WHERE key = :key"), {"key": key})
+    db.commit()
+    webhook_idempotency._recent.pop(key, None)
+
+
+def stored(db, payload, key):
+    db.expire_all()
+    events = db.query(WebhookEvent).filter(WebhookEvent.payload["event_id"].astext == payload["event_id"]).count()
+    claims = db.query(WebhookIdempotencyKey).filter_by(key=key).count()
+    return events, claims
+
+
+def test_event_is_queued_once(client, db, queue_mode):
+    payload, key = queue_mode
+
+    response = client.post(f"/api/webhooks/{LESSON_VIEWED}", json=payload)
+    assert response.status_code == 202
+    assert client.post(f"/api/webhooks/{LESSON_VIEWED}", json=payload).json()["status"] == "duplicate"
+    assert stored(db, payload, key) == (1, 1)
+
+
+def test_failed_enqueue_leaves_no_claim(client, db, queue_mode, monkeypatch):
+    payload, key = queue_mode
+
+    def enqueue(db, event_path, data):
+        db.flush()
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(queue.webhook_queue, "enqueue", enqueue)
+    assert client.post(f"/api/webhooks/{LESSON_VIEWED}", json=payload).status_code == 500
+    assert stored(db, payload, key) == (0, 0)
+    assert not webhook_idempotency.seen(key)
+
+
+@pytest.mark.parametrize("method, path", [
+    ("get", "/api/webhooks/queue/stats"),
+    ("get", "/api/webhooks/queue/dead-letter"),
+    ("post", "/api/webhooks/queue/dead-letter/1/requeue"),
+])
+def test_queue_routes_require_authentication(client, method, path):
+    assert getattr(client, method)(path).status_code == 401
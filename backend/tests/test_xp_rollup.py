@@ -0,0 +1,43 @@
+"""
+Daily XP rollups are kept up to date by every session that awards XP, and
+weekly and monthly rankings sum the last 7 and 30 days of them.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from app.database.connection import AsyncSessionLocal, async_engine
+from app.crud.leaderboard import rank_students_by_exp
+from app.models.leaderboard import XPDailyRollup
+from app.models.quest import ExperiencePoints
+
+
+def test_async_session_awards_update_rollups(db, moodle_course):
+    user_id, course_id = moodle_course["user_id"], moodle_course["course_id"]
+
+    async def award():
+        try:
+            async with AsyncSessionLocal() as session:
+                session.add(ExperiencePoints(user_id=user_id, course_id=course_id, amount=25, source_type="test"))
+                await session.commit()
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(award())
+
+    bucket = db.get(XPDailyRollup, (course_id, datetime.utcnow().date(), user_id))
+    assert bucket is not None and bucket.total_exp == 25
+
+
+def test_weekly_and_monthly_windows_are_rolling(db, moodle_course):
+    student, teacher, course_id = moodle_course["user_id"], moodle_course["teacher_id"], moodle_course["course_id"]
+    today = datetime.utcnow().date()
+    db.add_all([
+        XPDailyRollup(course_id=course_id, day=today - timedelta(days=6), user_id=student, total_exp=10),
+        XPDailyRollup(course_id=course_id, day=today - timedelta(days=7), user_id=teacher, total_exp=20),
+        XPDailyRollup(course_id=course_id, day=today - timedelta(days=30), user_id=student, total_exp=40),
+    ])
+    db.commit()
+
+    assert rank_students_by_exp(db, course_id, 10, "weekly") == [(student, 10)]
+    assert rank_students_by_exp(db, course_id, 10, "monthly") == [(teacher, 20), (student, 10)]